@@ -1,17 +1,70 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response
+from jinja2 import FileSystemBytecodeCache
+import click
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
 from models import *
+from inventory import record_batch, sweep_expired, availability, expiry_buckets, days_until
+import bed_routing
+import bed_reservations
+from security import hash_password, needs_rehash, login_limiter
+from sessions import create_session_interface
+import assets
+import http_cache
+from http_cache import conditional
+import fragment_cache
+import schema
+import db_routing
+import archive
+import search
+import vaccination
+import sync
+import changelog
+import geo_rollup
+import daily_metrics
+import recommendations
+import telemedicine
+import encounters
+import vitals_store
+import profiler
+from db_routing import read_replica
+from maintenance import work_lists, escalate_overdue, complete_maintenance, track_health_change, critical_equipment_count
 from datetime import datetime, timedelta
 import os
+import gzip
 import json
 import random
+import sqlite3
 import string
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'sakshi-solapur-2024-secure-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sakshi.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_BINDS'] = {db_routing.REPLICA_BIND: db_routing.REPLICA_DATABASE_URI}
+app.session_interface = create_session_interface()
+
+# Compiled templates persist across restarts; `flask precompile-templates` fills the cache at deploy time
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(app.root_path, '.jinja_cache'))
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
 
 db.init_app(app)
+db_routing.init_app(app, db)
+assets.init_app(app)
+http_cache.init_app(app)
+fragment_cache.init_app(app)
+profiler.init_app(app)
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL keeps readers going while reservation writes hold the lock"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
 
 # ==================== UTILITY FUNCTIONS ====================
 
@@ -19,14 +72,24 @@ def generate_patient_qr():
     """Generate unique QR code for patient"""
     return 'SAKSHI-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
 
+def current_profile(model):
+    """Logged-in user's Patient or Doctor row, fetched by the primary key kept in the session"""
+    profile_id = session.get('profile_id')
+    if profile_id is None:
+        profile = model.query.filter_by(user_id=session['user_id']).first()
+        session['profile_id'] = profile.id if profile else None
+        return profile
+    return model.query.get(profile_id)
+
 def login_required(user_type=None):
-    """Decorator to check if user is logged in"""
+    """Decorator to check if user is logged in (user_type may be a tuple of allowed types)"""
+    allowed = (user_type,) if isinstance(user_type, str) else user_type
     def decorator(f):
         def wrapper(*args, **kwargs):
             if 'user_id' not in session:
                 flash('Please login to continue', 'warning')
                 return redirect(url_for('login_page'))
-            if user_type and session.get('user_type') != user_type:
+            if allowed and session.get('user_type') not in allowed:
                 flash('Unauthorized access', 'danger')
                 return redirect(url_for('home'))
             return f(*args, **kwargs)
@@ -61,14 +124,34 @@ def authenticate():
     username = request.form.get('username')
     password = request.form.get('password')
     user_type = request.form.get('user_type')
+    client_ip = request.remote_addr
+    
+    # Reject brute-force attempts before spending any time hashing
+    if not login_limiter.allowed(username, client_ip):
+        flash('Too many failed login attempts. Please try again in a few minutes.', 'danger')
+        return redirect(url_for('login_page', user_type=user_type))
     
     user = User.query.filter_by(username=username, user_type=user_type).first()
     
     if user and user.check_password(password):
+        login_limiter.succeeded(username)
+        
+        # Upgrade hashes made with older parameters while we have the plaintext
+        if needs_rehash(user.password_hash):
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        
+        session.clear()
+        session['_rotate'] = True
         session['user_id'] = user.id
         session['username'] = user.username
         session['user_type'] = user.user_type
         
+        profile_model = {'patient': Patient, 'doctor': Doctor}.get(user.user_type)
+        if profile_model:
+            profile = profile_model.query.filter_by(user_id=user.id).first()
+            session['profile_id'] = profile.id if profile else None
+        
         if user_type == 'patient':
             return redirect(url_for('patient_dashboard'))
         elif user_type == 'doctor':
@@ -76,6 +159,7 @@ def authenticate():
         elif user_type == 'admin':
             return redirect(url_for('admin_dashboard'))
     
+    login_limiter.failed(username, client_ip)
     flash('Invalid credentials', 'danger')
     return redirect(url_for('login_page', user_type=user_type))
 
@@ -95,7 +179,7 @@ def register_user():
         
         # Create user
         user = User(username=username, email=email, phone=phone, user_type=user_type)
-        user.set_password(password)
+        user.password_hash = hash_password(password)
         db.session.add(user)
         db.session.flush()
         
@@ -133,8 +217,7 @@ def register_user():
 @app.route('/patient/dashboard')
 @login_required('patient')
 def patient_dashboard():
-    user = User.query.get(session['user_id'])
-    patient = Patient.query.filter_by(user_id=user.id).first()
+    patient = current_profile(Patient)
     
     # Get upcoming appointments
     upcoming_appointments = Appointment.query.filter_by(
@@ -163,8 +246,7 @@ def patient_dashboard():
 @app.route('/patient/qr-code')
 @login_required('patient')
 def view_qr_code():
-    user = User.query.get(session['user_id'])
-    patient = Patient.query.filter_by(user_id=user.id).first()
+    patient = current_profile(Patient)
     qr_image = patient.generate_qr_code()
     
     return render_template('patient/qr_code.html', patient=patient, qr_image=qr_image)
@@ -174,8 +256,7 @@ def view_qr_code():
 def book_appointment():
     if request.method == 'POST':
         try:
-            user = User.query.get(session['user_id'])
-            patient = Patient.query.filter_by(user_id=user.id).first()
+            patient = current_profile(Patient)
             
             appointment = Appointment(
                 patient_id=patient.id,
@@ -188,6 +269,8 @@ def book_appointment():
             
             db.session.add(appointment)
             db.session.commit()
+            fragment_cache.invalidate('doctor-today', appointment.doctor_id)
+            recommendations.appointment_changed(appointment)
             
             flash('Appointment booked successfully!', 'success')
             return redirect(url_for('patient_dashboard'))
@@ -203,12 +286,9 @@ def book_appointment():
 @app.route('/patient/medical-history')
 @login_required('patient')
 def medical_history():
-    user = User.query.get(session['user_id'])
-    patient = Patient.query.filter_by(user_id=user.id).first()
+    patient = current_profile(Patient)
     
-    records = MedicalRecord.query.filter_by(patient_id=patient.id).order_by(
-        MedicalRecord.visit_date.desc()
-    ).all()
+    records = archive.patient_history(patient.id)
     
     return render_template('patient/medical_history.html', patient=patient, records=records)
 
@@ -216,8 +296,7 @@ def medical_history():
 @login_required('patient')
 def view_precautions():
     # Get disease outbreaks in user's zone
-    user = User.query.get(session['user_id'])
-    patient = Patient.query.filter_by(user_id=user.id).first()
+    patient = current_profile(Patient)
     
     outbreaks = DiseaseOutbreak.query.filter_by(
         zone=patient.zone,
@@ -229,51 +308,85 @@ def view_precautions():
 @app.route('/patient/vaccination-status')
 @login_required('patient')
 def vaccination_status():
-    user = User.query.get(session['user_id'])
-    patient = Patient.query.filter_by(user_id=user.id).first()
+    patient = current_profile(Patient)
     
     # Get active vaccination campaigns
     campaigns = VaccinationCampaign.query.filter_by(status='ongoing').all()
+    coverage = {c.id: vaccination.coverage(c) for c in campaigns}
     
-    return render_template('patient/vaccination.html', patient=patient, campaigns=campaigns)
+    doses = vaccination.VaccinationDose.query.filter_by(patient_id=patient.id).order_by(
+        vaccination.VaccinationDose.administered_at.desc()
+    ).all()
+    
+    return render_template('patient/vaccination.html', patient=patient, campaigns=campaigns,
+                         coverage=coverage, doses=doses)
+
+def own_telemedicine_appointment(appointment_id):
+    """The logged-in patient's appointment, or 404"""
+    patient = current_profile(Patient)
+    return Appointment.query.filter_by(id=appointment_id, patient_id=patient.id).first_or_404()
+
+@app.route('/patient/telemedicine/<int:appointment_id>/check-in', methods=['POST'])
+@login_required('patient')
+def telemedicine_check_in(appointment_id):
+    """Join the doctor's telemedicine waiting room"""
+    appointment = own_telemedicine_appointment(appointment_id)
+    if appointment.appointment_date is None:
+        return jsonify({'error': 'Appointment has no date yet'}), 400
+    try:
+        telemedicine.check_in(appointment)
+    except telemedicine.QueueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(telemedicine.status(appointment))
+
+@app.route('/patient/telemedicine/<int:appointment_id>/leave', methods=['POST'])
+@login_required('patient')
+def telemedicine_leave(appointment_id):
+    appointment = own_telemedicine_appointment(appointment_id)
+    telemedicine.leave(appointment)
+    return jsonify(telemedicine.status(appointment))
+
+@app.route('/patient/telemedicine/<int:appointment_id>/status')
+@login_required('patient')
+def telemedicine_status(appointment_id):
+    return jsonify(telemedicine.status(own_telemedicine_appointment(appointment_id)))
+
+def telemedicine_stream_appointment(appointment_id):
+    """The logged-in patient's appointment for the ASGI status stream, or None.
+
+    The stream itself is served by asgi.py, so a waiting patient holds a
+    coroutine rather than a WSGI worker thread.
+    """
+    if 'user_id' not in session or session.get('user_type') != 'patient':
+        return None
+    patient = current_profile(Patient)
+    if patient is None:
+        return None
+    return Appointment.query.filter_by(id=appointment_id, patient_id=patient.id).first()
 
 # ==================== DOCTOR ROUTES ====================
 
 @app.route('/doctor/dashboard')
 @login_required('doctor')
 def doctor_dashboard():
-    user = User.query.get(session['user_id'])
-    doctor = Doctor.query.filter_by(user_id=user.id).first()
+    doctor = current_profile(Doctor)
     
-    # Today's appointments
+    # Today's appointments, left unexecuted so a cached schedule costs no query
     today_appointments = Appointment.query.filter_by(
         doctor_id=doctor.id
     ).filter(
         db.func.date(Appointment.appointment_date) == datetime.now().date()
-    ).all()
-    
-    # Pending appointments
-    pending = Appointment.query.filter_by(
-        doctor_id=doctor.id,
-        status='scheduled'
-    ).count()
-    
-    # Total patients treated
-    total_patients = MedicalRecord.query.filter_by(doctor_id=doctor.id).distinct(
-        MedicalRecord.patient_id
-    ).count()
+    ).order_by(Appointment.appointment_date)
     
     return render_template('doctor/dashboard.html',
                          doctor=doctor,
                          today_appointments=today_appointments,
-                         pending_count=pending,
-                         total_patients=total_patients)
+                         now=datetime.now())
 
 @app.route('/doctor/appointments')
 @login_required('doctor')
 def doctor_appointments():
-    user = User.query.get(session['user_id'])
-    doctor = Doctor.query.filter_by(user_id=user.id).first()
+    doctor = current_profile(Doctor)
     
     appointments = Appointment.query.filter_by(doctor_id=doctor.id).order_by(
         Appointment.appointment_date.desc()
@@ -288,6 +401,11 @@ def treat_patient(appointment_id):
     patient = appointment.patient
     
     if request.method == 'POST':
+        # A double-submitted form must not create a second record
+        if MedicalRecord.query.filter_by(appointment_id=appointment_id).first():
+            flash('This visit has already been recorded', 'info')
+            return redirect(url_for('doctor_appointments'))
+        
         try:
             # Create medical record
             record = MedicalRecord(
@@ -306,11 +424,23 @@ def treat_patient(appointment_id):
                 lab_tests_ordered=request.form.get('lab_tests')
             )
             
-            # Update appointment status
-            appointment.status = 'completed'
+            # Update appointment status; only one of two racing submits can make this change
+            # The change key names the row, so sync and the other change-log consumers see which one changed
+            claimed = db.session.execute(update(Appointment).where(
+                Appointment.id == appointment_id,
+                Appointment.status != 'completed'
+            ).values(status='completed').execution_options(change_key=str(appointment_id))).rowcount
+            if not claimed:
+                db.session.rollback()
+                flash('This visit has already been recorded', 'info')
+                return redirect(url_for('doctor_appointments'))
             
             db.session.add(record)
+            search.index_record(record, patient)
+            telemedicine.finish(appointment)
             db.session.commit()
+            fragment_cache.invalidate('doctor-today', appointment.doctor_id)
+            recommendations.appointment_changed(appointment)
             
             flash('Treatment record saved successfully!', 'success')
             return redirect(url_for('doctor_appointments'))
@@ -320,9 +450,7 @@ def treat_patient(appointment_id):
             flash(f'Error saving record: {str(e)}', 'danger')
     
     # Get patient's medical history
-    history = MedicalRecord.query.filter_by(patient_id=patient.id).order_by(
-        MedicalRecord.visit_date.desc()
-    ).limit(5).all()
+    history = archive.patient_history(patient.id, limit=5)
     
     return render_template('doctor/treat_patient.html',
                          appointment=appointment,
@@ -343,9 +471,7 @@ def scan_patient_qr():
             return jsonify({'error': 'Patient not found'}), 404
         
         # Get medical history
-        records = MedicalRecord.query.filter_by(patient_id=patient.id).order_by(
-            MedicalRecord.visit_date.desc()
-        ).limit(10).all()
+        records = archive.patient_history(patient.id, limit=10)
         
         return jsonify({
             'patient': {
@@ -367,11 +493,88 @@ def scan_patient_qr():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@app.route('/doctor/telemedicine/queue')
+@login_required('doctor')
+def doctor_telemedicine_queue():
+    """The doctor's waiting room: consultation in progress and who is waiting"""
+    doctor = current_profile(Doctor)
+    queue = telemedicine.doctor_queue(doctor.id)
+    current = queue['current']
+    
+    return jsonify({
+        'current': {'appointment_id': current[0], 'started_at': current[1].isoformat()} if current else None,
+        'waiting': queue['waiting'],
+        'average_consultation_minutes': telemedicine.average_minutes(doctor.id)
+    })
+
+@app.route('/doctor/telemedicine/next', methods=['POST'])
+@login_required('doctor')
+def doctor_telemedicine_next():
+    """Finish the current teleconsultation and start the next patient"""
+    doctor = current_profile(Doctor)
+    appointment_id = telemedicine.call_next(doctor.id)
+    
+    if appointment_id is None:
+        return jsonify({'appointment_id': None, 'message': 'Nobody is waiting'})
+    return jsonify({
+        'appointment_id': appointment_id,
+        'treat_url': url_for('treat_patient', appointment_id=appointment_id)
+    })
+
+@app.route('/doctor/search')
+@login_required('doctor')
+def search_records():
+    """Ranked full-text search over the doctor's patients' clinical notes"""
+    doctor = current_profile(Doctor)
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    
+    return jsonify({
+        'query': query,
+        'results': search.search(query, doctor.id, limit=limit)
+    })
+
+@app.route('/api/clinical/encounters', methods=['POST'])
+@login_required('doctor')
+def api_write_encounters():
+    """Store a batch of records and vitals, each with its own idempotency key"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+        return jsonify({'error': 'Expected {"items": [...]}'}), 400
+    
+    doctor = current_profile(Doctor)
+    
+    def on_record(record, appointment):
+        search.index_record(record)
+        if appointment is not None:
+            telemedicine.finish(appointment)
+    
+    try:
+        results = encounters.write_batch(items, doctor, session['user_id'], on_record=on_record)
+    except encounters.ItemRejected as e:
+        return jsonify({'error': str(e)}), 413
+    except IntegrityError:
+        # The same keys are being written by a concurrent retry; this one can simply be retried
+        db.session.rollback()
+        return jsonify({'error': 'Batch is already being processed, please retry'}), 409
+    
+    created = [r for r in results if r['status'] == 'created']
+    if created:
+        fragment_cache.invalidate('doctor-today', doctor.id)
+        for appointment in Appointment.query.filter(
+            Appointment.id.in_([i.get('appointment_id') for i in items if i.get('appointment_id')])
+        ).all():
+            recommendations.appointment_changed(appointment)
+    
+    return jsonify({'created': len(created), 'results': results})
+
 @app.route('/doctor/analytics')
 @login_required('doctor')
+@read_replica
+@conditional(MedicalRecord, Patient)
 def healthcare_analytics():
-    user = User.query.get(session['user_id'])
-    doctor = Doctor.query.filter_by(user_id=user.id).first()
+    doctor = current_profile(Doctor)
     
     # Get analytics data
     # Disease distribution
@@ -402,6 +605,8 @@ def healthcare_analytics():
 
 @app.route('/admin/dashboard')
 @login_required('admin')
+@read_replica
+@conditional(Hospital, Equipment, MedicineStock, DiseaseOutbreak)
 def admin_dashboard():
     # Overall statistics
     total_hospitals = Hospital.query.count()
@@ -409,7 +614,7 @@ def admin_dashboard():
     available_beds = db.session.query(db.func.sum(Hospital.available_beds)).scalar() or 0
     
     # Equipment status
-    critical_equipment = Equipment.query.filter_by(health_status='critical').count()
+    critical_equipment = critical_equipment_count()
     
     # Medicine stock alerts
     low_stock_medicines = MedicineStock.query.filter(
@@ -419,8 +624,8 @@ def admin_dashboard():
     # Active disease outbreaks
     active_outbreaks = DiseaseOutbreak.query.filter_by(outbreak_status='active').count()
     
-    # Recent alerts
-    hospitals = Hospital.query.all()
+    # Hospital cards, queried only when the cached fragment is stale
+    hospitals = Hospital.query.order_by(Hospital.id)
     
     return render_template('admin/dashboard.html',
                          total_hospitals=total_hospitals,
@@ -434,6 +639,7 @@ def admin_dashboard():
 
 @app.route('/admin/beds')
 @login_required('admin')
+@conditional(Hospital)
 def manage_beds():
     hospitals = Hospital.query.all()
     return render_template('admin/beds.html', hospitals=hospitals)
@@ -441,16 +647,24 @@ def manage_beds():
 @app.route('/admin/update-beds/<int:hospital_id>', methods=['POST'])
 @login_required('admin')
 def update_beds(hospital_id):
+    hospital = Hospital.query.get_or_404(hospital_id)
+    
     try:
-        hospital = Hospital.query.get_or_404(hospital_id)
+        fields = {'bed': 'available_beds', 'icu': 'available_icu_beds', 'ventilator': 'available_ventilators'}
+        values = {resource: request.form.get(field, type=int) for resource, field in fields.items()}
+        expected = {resource: request.form.get(f'original_{field}', type=int) for resource, field in fields.items()}
         
-        hospital.available_beds = request.form.get('available_beds', type=int)
-        hospital.available_icu_beds = request.form.get('available_icu_beds', type=int)
-        hospital.available_ventilators = request.form.get('available_ventilators', type=int)
+        bed_reservations.set_available(hospital, values, expected, actor_id=session['user_id'])
         
         db.session.commit()
+        bed_routing.update_hospital(hospital)
+        fragment_cache.invalidate('admin-hospital-cards')
         flash('Bed availability updated successfully!', 'success')
         
+    except bed_reservations.ReservationConflict as e:
+        # The page the admin edited is stale; show current numbers instead of overwriting them
+        return render_template('admin/beds.html', hospitals=Hospital.query.all(), conflict=str(e)), 409
+        
     except Exception as e:
         db.session.rollback()
         flash(f'Error updating beds: {str(e)}', 'danger')
@@ -460,9 +674,29 @@ def update_beds(hospital_id):
 @app.route('/admin/equipment')
 @login_required('admin')
 def manage_equipment():
-    equipment = Equipment.query.all()
+    hospital_id = request.args.get('hospital_id', type=int)
+    maintenance_queue = work_lists(hospital_id)
     hospitals = Hospital.query.all()
-    return render_template('admin/equipment.html', equipment=equipment, hospitals=hospitals)
+    return render_template('admin/equipment.html',
+                         work_lists=maintenance_queue,
+                         hospitals=hospitals,
+                         now=datetime.now())
+
+@app.route('/admin/equipment/<int:equipment_id>/maintenance-done', methods=['POST'])
+@login_required('admin')
+def equipment_maintenance_done(equipment_id):
+    try:
+        equipment = Equipment.query.get_or_404(equipment_id)
+        complete_maintenance(equipment)
+        
+        db.session.commit()
+        flash('Maintenance recorded successfully!', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error recording maintenance: {str(e)}', 'danger')
+    
+    return redirect(url_for('manage_equipment'))
 
 @app.route('/admin/add-equipment', methods=['POST'])
 @login_required('admin')
@@ -477,6 +711,7 @@ def add_equipment():
             health_status=request.form.get('health_status')
         )
         
+        track_health_change(None, equipment.health_status)
         db.session.add(equipment)
         db.session.commit()
         flash('Equipment added successfully!', 'success')
@@ -490,9 +725,14 @@ def add_equipment():
 @app.route('/admin/medicine')
 @login_required('admin')
 def manage_medicine():
-    medicines = MedicineStock.query.all()
+    hospital_id = request.args.get('hospital_id', type=int)
     hospitals = Hospital.query.all()
-    return render_template('admin/medicine.html', medicines=medicines, hospitals=hospitals)
+    return render_template('admin/medicine.html',
+                         expiring=expiry_buckets(hospital_id),
+                         availability=availability(hospital_id),
+                         hospital_names={h.id: h.name for h in hospitals},
+                         days_until=days_until,
+                         now=datetime.now())
 
 @app.route('/admin/add-medicine', methods=['POST'])
 @login_required('admin')
@@ -523,6 +763,7 @@ def add_medicine():
         )
         
         db.session.add(medicine)
+        record_batch(medicine)
         db.session.commit()
         flash('Medicine added to inventory!', 'success')
         
@@ -532,8 +773,35 @@ def add_medicine():
     
     return redirect(url_for('manage_medicine'))
 
+@app.route('/admin/profiles')
+@login_required('admin')
+def admin_profiles():
+    """Stored request profiles, slowest routes first; ?endpoint= narrows the list"""
+    query = profiler.RequestProfile.query
+    if request.args.get('endpoint'):
+        query = query.filter_by(endpoint=request.args['endpoint'])
+    profiles = query.order_by(profiler.RequestProfile.created_at.desc()).limit(100).all()
+    
+    return render_template('admin/profiles.html',
+                         enabled=profiler.enabled(),
+                         slow_ms=profiler.SLOW_MS,
+                         sample_rate=profiler.SAMPLE_RATE,
+                         routes=profiler.route_summary(),
+                         profiles=profiles)
+
+@app.route('/admin/profiles/<int:profile_id>')
+@login_required('admin')
+def admin_profile(profile_id):
+    """Flame graph and top functions for one request; ?format=folded for flamegraph.pl / speedscope"""
+    profile = profiler.RequestProfile.query.get_or_404(profile_id)
+    if request.args.get('format') == 'folded':
+        return Response(profiler.folded(profile), mimetype='text/plain')
+    return render_template('admin/profile.html', **profiler.report(profile))
+
 @app.route('/admin/disease-surveillance')
 @login_required('admin')
+@read_replica
+@conditional(DiseaseOutbreak)
 def disease_surveillance():
     outbreaks = DiseaseOutbreak.query.order_by(DiseaseOutbreak.last_updated.desc()).all()
     
@@ -550,6 +818,7 @@ def disease_surveillance():
 
 @app.route('/admin/health-alerts')
 @login_required('admin')
+@conditional(HealthAlert)
 def health_alerts():
     alerts = HealthAlert.query.order_by(HealthAlert.created_at.desc()).all()
     return render_template('admin/health_alerts.html', alerts=alerts)
@@ -581,11 +850,16 @@ def create_alert():
 # ==================== API ENDPOINTS ====================
 
 @app.route('/api/bed-availability')
+@conditional(Hospital)
 def api_bed_availability():
     """Real-time bed availability API"""
+    return jsonify(bed_availability_data())
+
+def bed_availability_data():
+    """Payload for /api/bed-availability, shared with the ASGI server"""
     hospitals = Hospital.query.all()
     
-    data = [{
+    return [{
         'hospital_id': h.id,
         'name': h.name,
         'zone': h.zone,
@@ -596,23 +870,352 @@ def api_bed_availability():
         'ventilators': h.ventilators,
         'available_ventilators': h.available_ventilators
     } for h in hospitals]
+
+@app.route('/api/route-bed')
+def api_route_bed():
+    """Nearest hospitals with a free bed, ICU bed or ventilator for an ambulance"""
+    started = datetime.now()
+    need = request.args.get('need', 'bed')
+    ward = request.args.get('ward', type=int)
+    zone = request.args.get('zone')
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    limit = min(request.args.get('limit', 5, type=int), 20)
+    
+    if need not in bed_routing.NEEDS:
+        return jsonify({'error': f'need must be one of {", ".join(bed_routing.NEEDS)}'}), 400
+    
+    if ward is None and lat is not None and lon is not None:
+        ward = bed_routing.nearest_ward(lat, lon)
+    
+    if ward is None and not zone:
+        return jsonify({'error': 'Provide ward, zone or lat/lon'}), 400
+    
+    results = bed_routing.route(need=need, ward=ward, zone=zone, limit=limit)
+    
+    return jsonify({
+        'need': need,
+        'ward': ward,
+        'zone': zone,
+        'hospitals': results,
+        'took_ms': round((datetime.now() - started).total_seconds() * 1000, 2)
+    })
+
+@app.route('/api/beds/reserve', methods=['POST'])
+@login_required('admin')
+def api_reserve_bed():
+    """Hold one bed, ICU bed or ventilator for an incoming patient"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        reservation = bed_reservations.reserve(
+            hospital_id=int(data['hospital_id']),
+            resource=data.get('resource', 'bed'),
+            patient_reference=data.get('patient_reference'),
+            actor_id=session['user_id'],
+            hold_minutes=int(data.get('hold_minutes', bed_reservations.DEFAULT_HOLD_MINUTES))
+        )
+    except (KeyError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Invalid request: {e}'}), 400
+    except bed_reservations.HospitalNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except bed_reservations.NoCapacity as e:
+        return jsonify({'error': str(e)}), 409
     
-    return jsonify(data)
+    bed_routing.update_hospital(Hospital.query.get(reservation.hospital_id))
+    fragment_cache.invalidate('admin-hospital-cards')
+    return jsonify(reservation.to_dict()), 201
+
+@app.route('/api/beds/reservations/<int:reservation_id>/<action>', methods=['POST'])
+@login_required('admin')
+def api_resolve_reservation(reservation_id, action):
+    """Confirm arrival of, or release, a held reservation"""
+    handlers = {'confirm': bed_reservations.confirm, 'release': bed_reservations.release}
+    if action not in handlers:
+        return jsonify({'error': 'action must be confirm or release'}), 404
+    
+    try:
+        reservation = handlers[action](reservation_id, actor_id=session['user_id'])
+    except bed_reservations.ReservationConflict as e:
+        return jsonify({'error': str(e)}), 409
+    
+    bed_routing.update_hospital(Hospital.query.get(reservation.hospital_id))
+    fragment_cache.invalidate('admin-hospital-cards')
+    return jsonify(reservation.to_dict())
+
+@app.route('/api/beds/movements/<int:hospital_id>')
+@login_required('admin')
+def api_bed_movements(hospital_id):
+    """Audit trail of bed counter changes, newest first"""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    movements = bed_reservations.BedMovement.query.filter_by(hospital_id=hospital_id).order_by(
+        bed_reservations.BedMovement.created_at.desc()
+    ).limit(limit).all()
+    
+    return jsonify([{
+        'resource': m.resource,
+        'delta': m.delta,
+        'reason': m.reason,
+        'reservation_id': m.reservation_id,
+        'actor_id': m.actor_id,
+        'created_at': m.created_at.isoformat()
+    } for m in movements])
+
+@app.route('/api/vaccinations', methods=['POST'])
+@login_required(('doctor', 'admin'))
+def api_record_vaccinations():
+    """Record one dose, or a batch as {"doses": [...]} from a camp laptop"""
+    data = request.get_json(silent=True)
+    entries = data.get('doses') if isinstance(data, dict) and 'doses' in data else [data]
+    
+    if not isinstance(entries, list) or not entries or not all(isinstance(e, dict) for e in entries):
+        return jsonify({'error': 'Expected a dose object or {"doses": [...]}'}), 400
+    
+    try:
+        results = vaccination.record_doses(entries, recorded_by=session['user_id'])
+    except vaccination.DoseRejected as e:
+        return jsonify({'error': str(e)}), 413
+    except IntegrityError:
+        # A concurrent upload recorded some of the same doses; retrying reports them as duplicates
+        db.session.rollback()
+        return jsonify({'error': 'Conflicting concurrent upload, please retry'}), 409
+    
+    recorded = sum(1 for r in results if r['status'] == 'recorded')
+    return jsonify({'recorded': recorded, 'results': results}), 201 if recorded else 200
+
+@app.route('/api/vaccinations/coverage')
+@login_required()
+def api_vaccination_coverage():
+    """Live coverage per zone for one campaign, or every ongoing campaign"""
+    campaign_id = request.args.get('campaign_id', type=int)
+    if campaign_id:
+        campaigns = [VaccinationCampaign.query.get_or_404(campaign_id)]
+    else:
+        campaigns = VaccinationCampaign.query.filter_by(status='ongoing').all()
+    
+    return jsonify([vaccination.coverage(c) for c in campaigns])
+
+def sync_hospital(hospital_id):
+    """Hospital a sync request is for; doctors may only sync their own"""
+    hospital = Hospital.query.get_or_404(hospital_id)
+    if session.get('user_type') == 'doctor' and current_profile(Doctor).hospital_id != hospital.id:
+        return None
+    return hospital
+
+@app.route('/api/sync/<int:hospital_id>/snapshot')
+@login_required(('doctor', 'admin'))
+def api_sync_snapshot(hospital_id):
+    """Full download for a new field device"""
+    hospital = sync_hospital(hospital_id)
+    if hospital is None:
+        return jsonify({'error': 'Not your hospital'}), 403
+    
+    tables = [t for t in request.args.get('tables', '').split(',') if t] or None
+    if tables and not set(tables) <= set(sync.SYNCED):
+        return jsonify({'error': f'tables must be among {", ".join(sync.SYNCED)}'}), 400
+    
+    return jsonify(sync.snapshot(hospital, tables))
+
+@app.route('/api/sync/<int:hospital_id>/changes')
+@login_required(('doctor', 'admin'))
+def api_sync_pull(hospital_id):
+    """Row changes after the device's cursor, in batches"""
+    hospital = sync_hospital(hospital_id)
+    if hospital is None:
+        return jsonify({'error': 'Not your hospital'}), 403
+    
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', sync.PULL_LIMIT, type=int), sync.PULL_LIMIT)
+    return jsonify(sync.pull(hospital, since, limit))
+
+@app.route('/api/sync/<int:hospital_id>/push', methods=['POST'])
+@login_required(('doctor', 'admin'))
+def api_sync_push(hospital_id):
+    """Apply writes a field device queued while offline"""
+    hospital = sync_hospital(hospital_id)
+    if hospital is None:
+        return jsonify({'error': 'Not your hospital'}), 403
+    
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        data = json.loads(body)
+        device_id, changes = str(data['device_id']), data['changes']
+        if not isinstance(changes, list) or not all(isinstance(c, dict) for c in changes):
+            raise ValueError('changes must be a list of objects')
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': f'Invalid push: {e}'}), 400
+    
+    try:
+        results = sync.push(device_id, hospital, changes)
+    except sync.SyncRejected as e:
+        return jsonify({'error': str(e)}), 413
+    except IntegrityError as e:
+        db.session.rollback()
+        if sync.is_receipt_conflict(e):
+            return jsonify({'error': 'Push already in progress for this device, please retry'}), 409
+        return jsonify({'error': f'Push rejected: {e.orig}'}), 400
+    
+    applied = [(c.get('table'), r['id']) for c, r in zip(changes, results) if r['status'] == 'applied']
+    if any(table == Patient.__tablename__ for table, _ in applied):
+        # Patient names show on every doctor's schedule
+        fragment_cache.invalidate('doctor-today')
+    else:
+        appointment_ids = [row_id for table, row_id in applied if table == Appointment.__tablename__]
+        for (doctor_id,) in db.session.query(Appointment.doctor_id).filter(
+            Appointment.id.in_(appointment_ids)
+        ).distinct():
+            fragment_cache.invalidate('doctor-today', doctor_id)
+    return jsonify({'results': results})
+
+@app.route('/api/changes')
+@login_required('admin')
+def api_changes():
+    """Page through the change log from a cursor, or from a named consumer's saved cursor"""
+    consumer = request.args.get('consumer')
+    since = changelog.get_cursor(consumer) if consumer else request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', changelog.READ_LIMIT, type=int), changelog.READ_LIMIT)
+    tables = [t for t in request.args.get('tables', '').split(',') if t] or None
+    
+    changes = changelog.read_changes(since, limit, tables)
+    return jsonify({
+        'since': since,
+        'cursor': changes[-1].seq if changes else since,
+        'more': len(changes) == limit,
+        'changes': [c.to_dict() for c in changes]
+    })
+
+@app.route('/api/changes/consumers/<name>/ack', methods=['POST'])
+@login_required('admin')
+def api_ack_changes(name):
+    """Save how far a consumer has processed"""
+    data = request.get_json(silent=True) or {}
+    try:
+        seq = int(data['cursor'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'cursor is required'}), 400
+    
+    changelog.ack(name, seq)
+    db.session.commit()
+    return jsonify({'consumer': name, 'cursor': changelog.get_cursor(name)})
+
+@app.route('/api/geo/metrics')
+@login_required('admin')
+@read_replica
+@conditional(geo_rollup.MetricRollup)
+def api_geo_metrics():
+    """Zone and ward choropleth data for ?window=30|90|365 days, or ?start=&end= (YYYY-MM-DD)"""
+    try:
+        if request.args.get('start'):
+            start = geo_rollup.parse_day(request.args['start'])
+            end = geo_rollup.parse_day(request.args.get('end', datetime.now().strftime('%Y-%m-%d')))
+        else:
+            start, end = geo_rollup.window_bounds(request.args.get('window', geo_rollup.WINDOWS[0], type=int))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    if start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+    
+    return jsonify(geo_rollup.geo_summary(start, end))
+
+@app.route('/api/booking/recommendations')
+@login_required('patient')
+def api_booking_recommendations():
+    """Suggested doctors for ?when=YYYY-MM-DDTHH:MM (optional) and ?specialization="""
+    patient = current_profile(Patient)
+    when = request.args.get('when')
+    
+    try:
+        when = datetime.strptime(when, '%Y-%m-%dT%H:%M') if when else None
+    except ValueError:
+        return jsonify({'error': 'when must be YYYY-MM-DDTHH:MM'}), 400
+    
+    return jsonify(recommendations.recommend(
+        zone=patient.zone,
+        ward=patient.ward_number,
+        when=when,
+        specialization=request.args.get('specialization'),
+        limit=min(request.args.get('limit', 5, type=int), 20)
+    ))
+
+def can_view_patient(patient_id):
+    """Patients see their own data, doctors that of patients they have appointments with"""
+    if session.get('user_type') == 'patient':
+        return current_profile(Patient).id == patient_id
+    if session.get('user_type') == 'doctor':
+        doctor = current_profile(Doctor)
+        return Appointment.query.filter_by(doctor_id=doctor.id, patient_id=patient_id).first() is not None
+    return True
+
+@app.route('/api/patients/<int:patient_id>/vitals')
+@login_required(('patient', 'doctor', 'admin'))
+@read_replica
+def api_patient_vitals(patient_id):
+    """Vitals series for ?start=&end= (YYYY-MM-DD), downsampled to ?points= buckets"""
+    if not can_view_patient(patient_id):
+        return jsonify({'error': 'Patient not found'}), 404
+    
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    points = max(min(request.args.get('points', 200, type=int), 1000), 10)
+    return jsonify(vitals_store.series(patient_id, start, end, points=points))
+
+@app.route('/api/vitals/flags')
+@login_required(('doctor', 'admin'))
+@read_replica
+@conditional(vitals_store.VitalsTrendFlag, Appointment)
+def api_vitals_flags():
+    """Abnormal vitals trends from the latest nightly run, limited to the doctor's patients"""
+    patient_ids = None
+    if session.get('user_type') == 'doctor':
+        doctor = current_profile(Doctor)
+        patient_ids = db.session.query(Appointment.patient_id).filter(Appointment.doctor_id == doctor.id).distinct()
+    return jsonify(vitals_store.latest_flags(patient_ids))
 
 @app.route('/api/disease-stats')
+@conditional(DiseaseOutbreak)
 def api_disease_stats():
     """Disease outbreak statistics"""
+    return jsonify(disease_stats_data())
+
+def disease_stats_data():
+    """Payload for /api/disease-stats, shared with the ASGI server"""
     outbreaks = DiseaseOutbreak.query.filter_by(outbreak_status='active').all()
     
-    data = [{
+    return [{
         'disease_name': o.disease_name,
         'zone': o.zone,
         'total_cases': o.total_cases,
         'active_cases': o.active_cases,
         'alert_level': o.alert_level
     } for o in outbreaks]
+
+# ==================== HEALTH CHECKS ====================
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: the database answers and its schema matches the models"""
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        if not schema.is_current():
+            return jsonify({'status': 'initializing'}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
     
-    return jsonify(data)
+    return jsonify({'status': 'ready'})
 
 # ==================== LOGOUT ====================
 
@@ -622,20 +1225,130 @@ def logout():
     flash('Logged out successfully', 'info')
     return redirect(url_for('home'))
 
+# ==================== SCHEDULED JOBS ====================
+
+@app.cli.command('sweep-expired-medicine')
+def sweep_expired_medicine_command():
+    """Quarantine expired medicine batches (run daily from cron)"""
+    count = sweep_expired()
+    print(f"Quarantined {count} expired medicine batches")
+
+@app.cli.command('escalate-equipment-maintenance')
+def escalate_equipment_maintenance_command():
+    """Flag overdue critical-care equipment (run hourly from cron)"""
+    count = escalate_overdue()
+    print(f"Escalated {count} overdue equipment items to critical")
+
+@app.cli.command('expire-bed-reservations')
+def expire_bed_reservations_command():
+    """Return beds from unconfirmed holds (run every minute from cron)"""
+    count = bed_reservations.expire_stale()
+    print(f"Expired {count} bed reservations")
+
+@app.cli.command('purge-sessions')
+def purge_sessions_command():
+    """Delete expired server-side sessions (run daily from cron)"""
+    store = app.session_interface.store
+    if hasattr(store, 'purge_expired'):
+        print(f"Purged {store.purge_expired()} expired sessions")
+
+@app.cli.command('purge-idempotency-keys')
+def purge_idempotency_keys_command():
+    """Forget encounter idempotency keys past their retention (run daily from cron)"""
+    print(f"Purged {encounters.purge_expired()} idempotency keys")
+
+@app.cli.command('refresh-replica')
+def refresh_replica_command():
+    """Copy the primary database into the read replica (run every minute from cron)"""
+    db_routing.refresh_replica(db)
+    print("Read replica refreshed")
+
+@app.cli.command('archive-history')
+@click.option('--horizon-days', default=archive.ARCHIVE_HORIZON_DAYS, show_default=True,
+              help='Archive medical records and appointments older than this')
+def archive_history_command(horizon_days):
+    """Move old MedicalRecord/Appointment rows into per-year archive files"""
+    report = archive.archive_old_rows(horizon_days)
+    print(f"Archived rows older than {report['cutoff']}:")
+    for table, moved in report['moved'].items():
+        print(f"  {table}: moved {moved}, hot rows {report['hot_rows_before'][table]} -> {report['hot_rows_after'][table]}")
+    if report['query_ms_before'] is not None:
+        print(f"  patient history query: {report['query_ms_before']:.2f} ms -> {report['query_ms_after']:.2f} ms")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Reindex all medical records for full-text search"""
+    print(f"Indexed {search.rebuild_index()} medical records")
+
+@app.cli.command('rebuild-vaccination-counters')
+def rebuild_vaccination_counters_command():
+    """Recompute campaign, zone and dose vaccination counters from dose rows"""
+    vaccination.rebuild_counters()
+    print("Vaccination counters rebuilt")
+
+@app.cli.command('compute-health-metrics')
+@click.option('--start', help='Backfill from this day (YYYY-MM-DD) instead of only changed days')
+@click.option('--end', help='Last day of the backfill (default today)')
+@click.option('--all', 'backfill_all', is_flag=True, help='Backfill from the earliest visit on record')
+def compute_health_metrics_command(start, end, backfill_all):
+    """Derive HealthMetrics from visits, appointments and doses (run every 15 minutes from cron)"""
+    end_day = geo_rollup.parse_day(end) if end else datetime.now().date()
+    first = daily_metrics.first_computable_day()
+    if first and (backfill_all or start):
+        print(f"Days before {first.isoformat()} are archived and keep their stored metrics")
+    if backfill_all:
+        print(f"Computed health metrics for {daily_metrics.backfill(end_day)} days")
+    elif start:
+        print(f"Computed health metrics for {daily_metrics.compute_range(geo_rollup.parse_day(start), end_day)} days")
+    else:
+        days = daily_metrics.run()
+        print(f"Computed health metrics for {len(days)} changed days")
+
+@app.cli.command('refresh-geo-rollups')
+@click.option('--full', is_flag=True, help='Rebuild every rollup instead of only changed days')
+def refresh_geo_rollups_command(full):
+    """Update the map dashboard rollups (run every few minutes from cron)"""
+    geo_rollup.refresh(full=full)
+    print("Geo rollups refreshed")
+
+@app.cli.command('refresh-vitals')
+@click.option('--full', is_flag=True, help='Re-merge every medical record instead of only changed ones')
+def refresh_vitals_command(full):
+    """Merge new and edited visit vitals into the columnar store (run every few minutes from cron)"""
+    vitals_store.refresh(full=full)
+    print("Vitals store refreshed")
+
+@app.cli.command('flag-vitals-trends')
+def flag_vitals_trends_command():
+    """Catch up the vitals store and flag abnormal trends across all patients (run nightly)"""
+    vitals_store.refresh()
+    print(f"Raised {vitals_store.flag_trends()} vitals trend flags")
+
+@app.cli.command('precompile-templates')
+def precompile_templates_command():
+    """Fill the Jinja bytecode cache (run at deploy time)"""
+    warm_templates()
+    print(f"Precompiled {len(app.jinja_env.list_templates(extensions=['html']))} templates into {TEMPLATE_CACHE_DIR}")
+
 # ==================== INITIALIZATION ====================
 
 def init_db():
     """Initialize database with sample data"""
     with app.app_context():
+        # Fast path: schema matches the models and seeding already ran
+        if schema.is_current():
+            return
+        
         db.create_all()
         
         # Check if data already exists
         if User.query.first():
+            schema.stamp()
             return
         
         # Create sample admin
         admin_user = User(username='admin', email='admin@solapur.gov.in', user_type='admin', phone='9876543210')
-        admin_user.set_password('admin123')
+        admin_user.password_hash = hash_password('admin123')
         db.session.add(admin_user)
         
         # Create sample hospitals
@@ -683,8 +1396,14 @@ def init_db():
             db.session.add(hospital)
         
         db.session.commit()
+        schema.stamp()
         print("Database initialized with sample data!")
 
+def warm_templates():
+    """Compile every template now (and into the bytecode cache) instead of on first hit"""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
 if __name__ == '__main__':
     init_db()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
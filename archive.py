@@ -0,0 +1,224 @@
+"""
+SAKSHI History Archive
+Moves MedicalRecord and Appointment rows older than a horizon into per-year
+SQLite archive files, and reads patient history across hot and archived rows
+
+    flask archive-history --horizon-days 730
+"""
+
+from models import db, MedicalRecord, Appointment
+from changelog import ChangeLog
+from counters import StatCounter
+from http_cache import VERSION_PREFIX
+from search import FTS_TABLE
+from sqlalchemy import create_engine, select, desc
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable
+from datetime import datetime, timedelta
+import glob
+import os
+import re
+import sqlite3
+import time
+
+ARCHIVE_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS', 730))
+ARCHIVE_FILE_PATTERN = 'sakshi_archive_{year}.db'
+
+# Table -> column that decides which year partition a row belongs to
+ARCHIVED = (
+    (MedicalRecord, 'visit_date'),
+    (Appointment, 'appointment_date')
+)
+
+_engines = {}
+
+
+class ArchivedDiagnosis(db.Model):
+    """Diagnoses a patient has on archived records, so hot-only queries can still tell a first case"""
+    __tablename__ = 'archived_diagnosis'
+
+    patient_id = db.Column(db.Integer, primary_key=True)
+    diagnosis = db.Column(db.Text, primary_key=True)
+
+
+def archive_dir():
+    primary = db.engine.url.database
+    path = os.path.join(os.path.dirname(os.path.abspath(primary)), 'archive')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def archive_files():
+    """{year: path} for every archive partition on disk, newest first"""
+    files = {}
+    for path in glob.glob(os.path.join(archive_dir(), ARCHIVE_FILE_PATTERN.format(year='*'))):
+        match = re.search(r'(\d{4})\.db$', path)
+        if match:
+            files[int(match.group(1))] = path
+    return dict(sorted(files.items(), reverse=True))
+
+
+def _archive_engine(path):
+    if path not in _engines:
+        _engines[path] = create_engine(f'sqlite:///{path}')
+    return _engines[path]
+
+
+def _create_archive_table(conn, alias, table):
+    ddl = str(CreateTable(table).compile(dialect=sqlite.dialect()))
+    ddl = ddl.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE IF NOT EXISTS {alias}.{table.name} ', 1)
+    conn.execute(ddl)
+    for column in ('patient_id', 'doctor_id'):
+        if column in table.c:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {alias}.ix_{table.name}_{column} ON {table.name} ({column})')
+
+
+def _hot_counts():
+    return {model.__tablename__: model.query.count() for model, _ in ARCHIVED}
+
+
+def _sample_query_ms(patient_id):
+    started = time.perf_counter()
+    for _ in range(20):
+        MedicalRecord.query.filter_by(patient_id=patient_id).order_by(MedicalRecord.visit_date.desc()).all()
+        Appointment.query.filter_by(patient_id=patient_id).order_by(Appointment.appointment_date.desc()).all()
+    return (time.perf_counter() - started) / 20 * 1000
+
+
+def _log_archived(conn, table_name, where, params):
+    """Record the moved rows as deletes and bump the table's version, as a session write would"""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+    conn.execute(
+        f"INSERT INTO main.{ChangeLog.__tablename__} (table_name, row_key, op, changed_columns, actor_id, changed_at) "
+        f"SELECT ?, CAST(id AS TEXT), 'delete', '[]', NULL, ? FROM main.{table_name} WHERE {where}",
+        (table_name, now) + tuple(params)
+    )
+    conn.execute(
+        f'INSERT INTO main.{StatCounter.__tablename__} (name, value, updated_at) VALUES (?, 1, ?) '
+        f'ON CONFLICT(name) DO UPDATE SET value = value + 1, updated_at = excluded.updated_at',
+        (VERSION_PREFIX + table_name, now)
+    )
+
+
+def archive_old_rows(horizon_days=ARCHIVE_HORIZON_DAYS, now=None):
+    """Move rows older than the horizon into per-year archive files; returns a report dict"""
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=horizon_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    sample = db.session.query(MedicalRecord.patient_id).group_by(MedicalRecord.patient_id).order_by(
+        db.func.count(MedicalRecord.id).desc()
+    ).first()
+    sample_patient = sample[0] if sample else None
+
+    report = {
+        'cutoff': cutoff,
+        'hot_rows_before': _hot_counts(),
+        'query_ms_before': _sample_query_ms(sample_patient) if sample_patient else None,
+        'moved': {}
+    }
+    db.session.remove()
+
+    conn = sqlite3.connect(db.engine.url.database, timeout=30, isolation_level=None)
+    try:
+        for model, column in ARCHIVED:
+            table = model.__table__
+            years = [row[0] for row in conn.execute(
+                f"SELECT DISTINCT strftime('%Y', {column}) FROM {table.name} WHERE {column} < ?", (cutoff,)
+            ) if row[0]]
+
+            moved = 0
+            for year in years:
+                alias = f'archive_{year}'
+                path = os.path.join(archive_dir(), ARCHIVE_FILE_PATTERN.format(year=year))
+                conn.execute('ATTACH DATABASE ? AS ' + alias, (path,))
+                try:
+                    _create_archive_table(conn, alias, table)
+                    # The highest id always stays hot: SQLite hands out max(rowid) + 1, so new rows
+                    # can never reuse an archived id and be dropped by INSERT OR IGNORE later
+                    where = (f"{column} < ? AND strftime('%Y', {column}) = ? "
+                             f"AND id < (SELECT MAX(id) FROM main.{table.name})")
+
+                    # In WAL mode a transaction spanning attached files is atomic per file only,
+                    # so the copy is committed first and only rows the archive holds are deleted.
+                    # A run cut short in between leaves duplicates that the next run skips.
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.execute(f'INSERT OR IGNORE INTO {alias}.{table.name} '
+                                 f'SELECT * FROM main.{table.name} WHERE {where}', (cutoff, year))
+                    conn.execute('COMMIT')
+
+                    archived = f'{where} AND id IN (SELECT id FROM {alias}.{table.name})'
+                    conn.execute('BEGIN IMMEDIATE')
+                    _log_archived(conn, table.name, archived, (cutoff, year))
+                    if table is MedicalRecord.__table__:
+                        # Search covers hot records only
+                        conn.execute(f'DELETE FROM main.{FTS_TABLE} WHERE rowid IN '
+                                     f'(SELECT id FROM main.{table.name} WHERE {archived})', (cutoff, year))
+                        conn.execute(f'INSERT OR IGNORE INTO main.{ArchivedDiagnosis.__tablename__} '
+                                     f'SELECT DISTINCT patient_id, diagnosis FROM main.{table.name} '
+                                     f"WHERE {archived} AND COALESCE(diagnosis, '') != ''", (cutoff, year))
+                    moved += conn.execute(f'DELETE FROM main.{table.name} WHERE {archived}', (cutoff, year)).rowcount
+                    conn.execute('COMMIT')
+                except Exception:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    raise
+                finally:
+                    conn.execute('DETACH DATABASE ' + alias)
+
+            report['moved'][table.name] = moved
+    finally:
+        conn.close()
+
+    report['hot_rows_after'] = _hot_counts()
+    report['query_ms_after'] = _sample_query_ms(sample_patient) if sample_patient else None
+    return report
+
+
+def archived_through():
+    """Last day any archived row falls on, or None; days up to it are no longer complete in the hot tables"""
+    for year, path in archive_files().items():
+        latest = []
+        with _archive_engine(path).connect() as conn:
+            for model, column in ARCHIVED:
+                table = model.__table__
+                if conn.dialect.has_table(conn, table.name):
+                    latest.append(conn.execute(select(db.func.max(table.c[column]))).scalar())
+        latest = [value for value in latest if value is not None]
+        # Files are newest first, so the first one holding rows has the latest day
+        if latest:
+            return max(latest).date()
+    return None
+
+
+def _archived_rows(model, column, filters, limit):
+    table = model.__table__
+    date_column = table.c[column]
+    rows = []
+
+    for year, path in archive_files().items():
+        if limit is not None and len(rows) >= limit:
+            break
+        with _archive_engine(path).connect() as conn:
+            if not conn.dialect.has_table(conn, table.name):
+                continue
+            query = select(table).where(*[table.c[k] == v for k, v in filters.items()]).order_by(desc(date_column))
+            if limit is not None:
+                query = query.limit(limit - len(rows))
+            rows.extend(conn.execute(query).mappings().all())
+
+    # Plain transient objects: archived rows are not in the hot table, so they must not enter the session
+    return [model(**row) for row in rows]
+
+
+def patient_history(patient_id, limit=None):
+    """A patient's medical records, newest first, from the hot table then the archives"""
+    query = MedicalRecord.query.filter_by(patient_id=patient_id).order_by(MedicalRecord.visit_date.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    records = query.all()
+
+    # Archived rows are all older than any hot row, so only look when the hot table ran short
+    if limit is None or len(records) < limit:
+        remaining = None if limit is None else limit - len(records)
+        records += _archived_rows(MedicalRecord, 'visit_date', {'patient_id': patient_id}, remaining)
+    return records
@@ -0,0 +1,193 @@
+"""
+SAKSHI ASGI Entry Point
+Serves the read-only public APIs, a live bed-availability stream and each
+telemedicine patient's queue-position stream from an event loop, and hands
+every other request to the Flask app
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+Slow or long-lived clients (the SSE stream, rural links) then cost a
+coroutine rather than a whole WSGI worker.
+"""
+
+from app import app, bed_availability_data, disease_stats_data, telemedicine_stream_appointment
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+import telemedicine
+import asyncio
+import json
+import re
+import time
+
+# Public data changes at most every few seconds; one DB read serves everyone
+SNAPSHOT_TTL_SECONDS = 2.0
+STREAM_INTERVAL_SECONDS = 5.0
+
+# Queue status is one version-counter read per poll while nothing moves
+TELEMEDICINE_POLL_SECONDS = 1.0
+KEEP_ALIVE_SECONDS = 15.0
+
+TELEMEDICINE_STREAM_PATH = re.compile(r'^/patient/telemedicine/(\d+)/stream$')
+
+
+class Snapshot:
+    """TTL-cached JSON body rebuilt in a worker thread, one rebuild at a time"""
+
+    def __init__(self, build, ttl=SNAPSHOT_TTL_SECONDS):
+        self.build = build
+        self.ttl = ttl
+        self.body = None
+        self.built_at = 0.0
+        self._lock = None
+
+    def _build_sync(self):
+        with app.app_context():
+            return json.dumps(self.build()).encode()
+
+    async def get(self):
+        if self.body is not None and time.monotonic() - self.built_at < self.ttl:
+            return self.body
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self.body is None or time.monotonic() - self.built_at >= self.ttl:
+                self.body = await asyncio.to_thread(self._build_sync)
+                self.built_at = time.monotonic()
+        return self.body
+
+
+SNAPSHOTS = {
+    '/api/bed-availability': Snapshot(bed_availability_data),
+    '/api/disease-stats': Snapshot(disease_stats_data)
+}
+
+_flask = WsgiToAsgi(app)
+
+
+async def _send_json(send, body, status=200, cache_control=f'public, max-age={int(SNAPSHOT_TTL_SECONDS)}'):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'cache-control', cache_control.encode())
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _wait_for_disconnect(receive):
+    """A GET's receive() first yields its (empty) http.request; only http.disconnect means the client left"""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def _stream_bed_availability(receive, send):
+    """Server-sent events: push the availability snapshot whenever it changes"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]
+    })
+
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    last = None
+    try:
+        while not disconnected.done():
+            body = await SNAPSHOTS['/api/bed-availability'].get()
+            payload = b'data: ' + body + b'\n\n' if body != last else b': keep-alive\n\n'
+            last = body
+            await send({'type': 'http.response.body', 'body': payload, 'more_body': True})
+            await asyncio.wait([disconnected], timeout=STREAM_INTERVAL_SECONDS)
+    finally:
+        disconnected.cancel()
+        # Always end the response; servers ignore this once the client has gone
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+def _telemedicine_appointment(scope, appointment_id):
+    """Load the Flask session from the request's cookie and check the patient owns the appointment"""
+    environ = WsgiToAsgiInstance(app).build_environ(scope, b'')
+    with app.request_context(environ):
+        return telemedicine_stream_appointment(appointment_id)
+
+
+def _telemedicine_status(appointment):
+    with app.app_context():
+        return telemedicine.status(appointment)
+
+
+async def _stream_telemedicine(scope, receive, send, appointment_id):
+    """Server-sent events with the patient's position and ETA whenever they change"""
+    appointment = await asyncio.to_thread(_telemedicine_appointment, scope, appointment_id)
+    if appointment is None:
+        return await _send_json(send, b'{"error": "Appointment not found"}', status=404, cache_control='no-store')
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]
+    })
+
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    last, last_sent = None, time.monotonic()
+    try:
+        await send({'type': 'http.response.body', 'body': b'retry: 2000\n\n', 'more_body': True})
+        while not disconnected.done():
+            current = await asyncio.to_thread(_telemedicine_status, appointment)
+            # Keep ETA ticking down even when nobody moves
+            if current != last:
+                payload = b'data: ' + json.dumps(current).encode() + b'\n\n'
+                last, last_sent = current, time.monotonic()
+            elif time.monotonic() - last_sent > KEEP_ALIVE_SECONDS:
+                payload = b': keep-alive\n\n'
+                last_sent = time.monotonic()
+            else:
+                payload = None
+            if payload:
+                await send({'type': 'http.response.body', 'body': payload, 'more_body': True})
+            if current['status'] in ('done', 'left'):
+                break
+            await asyncio.wait([disconnected], timeout=TELEMEDICINE_POLL_SECONDS)
+    finally:
+        disconnected.cancel()
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        path = scope['path']
+        if path in SNAPSHOTS:
+            return await _send_json(send, await SNAPSHOTS[path].get())
+        if path == '/api/stream/bed-availability':
+            return await _stream_bed_availability(receive, send)
+        match = TELEMEDICINE_STREAM_PATH.match(path)
+        if match:
+            return await _stream_telemedicine(scope, receive, send, int(match.group(1)))
+
+    return await _flask(scope, receive, send)
@@ -0,0 +1,51 @@
+"""
+SAKSHI Asset Helper
+Resolves logical asset names to the content-hashed files built by
+build_assets.py and serves them precompressed with immutable cache headers
+"""
+
+from flask import send_from_directory, url_for
+from http_cache import preferred_encoding
+import json
+import mimetypes
+import os
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+def init_app(app):
+    dist_dir = os.path.join(app.static_folder, 'dist')
+    manifest_path = os.path.join(dist_dir, 'manifest.json')
+
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    def asset_url(name, fallback=None):
+        """Hashed URL when built; otherwise the plain static file or the given CDN fallback"""
+        if name in manifest:
+            return url_for('dist_asset', filename=manifest[name])
+        if fallback and not os.path.exists(os.path.join(app.static_folder, name)):
+            return fallback
+        return url_for('static', filename=name)
+
+    @app.route('/static/dist/<path:filename>')
+    def dist_asset(filename):
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        suffixes = {'br': '.br', 'gzip': '.gz'}
+        encoding = preferred_encoding([e for e, suffix in suffixes.items()
+                                       if os.path.exists(os.path.join(dist_dir, filename + suffix))])
+        if encoding:
+            response = send_from_directory(dist_dir, filename + suffixes[encoding], mimetype=mimetype, max_age=ONE_YEAR)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(dist_dir, filename, mimetype=mimetype, max_age=ONE_YEAR)
+
+        response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.globals['asset_built'] = lambda name: name in manifest
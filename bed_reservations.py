@@ -0,0 +1,211 @@
+"""
+SAKSHI Bed Reservations
+Short-lived holds on beds, ICU beds and ventilators with conditional
+(compare-and-decrement) counter updates and an audit log of every movement
+"""
+
+from models import db, Hospital
+from bed_routing import NEEDS
+from sqlalchemy import update
+from datetime import datetime, timedelta
+
+DEFAULT_HOLD_MINUTES = 20
+MAX_HOLD_MINUTES = 120
+
+
+class NoCapacity(Exception):
+    pass
+
+
+class ReservationConflict(Exception):
+    pass
+
+
+class HospitalNotFound(Exception):
+    pass
+
+
+class BedReservation(db.Model):
+    __tablename__ = 'bed_reservation'
+    __table_args__ = (db.Index('ix_bed_reservation_status_expires', 'status', 'expires_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    hospital_id = db.Column(db.Integer, db.ForeignKey(Hospital.__table__.c.id), nullable=False, index=True)
+    resource = db.Column(db.String(20), nullable=False)  # bed, icu, ventilator
+    status = db.Column(db.String(20), default='held', nullable=False)  # held, confirmed, released, expired
+    patient_reference = db.Column(db.String(100))
+    held_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    resolved_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'hospital_id': self.hospital_id,
+            'resource': self.resource,
+            'status': self.status,
+            'patient_reference': self.patient_reference,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+
+class BedMovement(db.Model):
+    """Append-only audit of every change to a hospital's available counters"""
+    __tablename__ = 'bed_movement'
+    __table_args__ = (db.Index('ix_bed_movement_hospital_created', 'hospital_id', 'created_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    hospital_id = db.Column(db.Integer, db.ForeignKey(Hospital.__table__.c.id), nullable=False)
+    resource = db.Column(db.String(20), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(30), nullable=False)  # reserve, release, expire, admin_update
+    reservation_id = db.Column(db.Integer, db.ForeignKey('bed_reservation.id'))
+    actor_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+
+def _column(resource):
+    if resource not in NEEDS:
+        raise ValueError(f'Unknown resource: {resource}')
+    return getattr(Hospital, NEEDS[resource])
+
+
+def _adjust(hospital_id, resource, delta):
+    """Apply delta in a single UPDATE that refuses to go below zero"""
+    column = _column(resource)
+    statement = update(Hospital).where(Hospital.id == hospital_id)
+    if delta < 0:
+        statement = statement.where(column >= -delta)
+    result = db.session.execute(statement.values({column: column + delta}))
+    return result.rowcount == 1
+
+
+def _log(hospital_id, resource, delta, reason, reservation_id=None, actor_id=None):
+    db.session.add(BedMovement(
+        hospital_id=hospital_id,
+        resource=resource,
+        delta=delta,
+        reason=reason,
+        reservation_id=reservation_id,
+        actor_id=actor_id
+    ))
+
+
+def _transition(reservation_id, from_statuses, to_status, now):
+    """Move a reservation between states only if nobody else got there first"""
+    result = db.session.execute(
+        update(BedReservation).where(
+            BedReservation.id == reservation_id,
+            BedReservation.status.in_(from_statuses)
+        ).values(status=to_status, resolved_at=now)
+    )
+    return result.rowcount == 1
+
+
+def reserve(hospital_id, resource, patient_reference=None, actor_id=None,
+            hold_minutes=DEFAULT_HOLD_MINUTES, now=None):
+    """Take one unit of `resource` at a hospital and hold it until confirmed or expired"""
+    now = now or datetime.now()
+    hold_minutes = max(1, min(hold_minutes, MAX_HOLD_MINUTES))
+
+    expire_stale(now, hospital_id=hospital_id, commit=False)
+
+    if not _adjust(hospital_id, resource, -1):
+        db.session.rollback()
+        if Hospital.query.get(hospital_id) is None:
+            raise HospitalNotFound(f'Hospital {hospital_id} not found')
+        raise NoCapacity(f'No {resource} available at hospital {hospital_id}')
+
+    reservation = BedReservation(
+        hospital_id=hospital_id,
+        resource=resource,
+        patient_reference=patient_reference,
+        held_by=actor_id,
+        created_at=now,
+        expires_at=now + timedelta(minutes=hold_minutes)
+    )
+    db.session.add(reservation)
+    db.session.flush()
+
+    _log(hospital_id, resource, -1, 'reserve', reservation.id, actor_id)
+    db.session.commit()
+    return reservation
+
+
+def confirm(reservation_id, actor_id=None, now=None):
+    """Patient arrived: the unit stays taken and the hold no longer expires"""
+    now = now or datetime.now()
+    if not _transition(reservation_id, ('held',), 'confirmed', now):
+        db.session.rollback()
+        raise ReservationConflict('Reservation is no longer held')
+    db.session.commit()
+    return BedReservation.query.get(reservation_id)
+
+
+def release(reservation_id, actor_id=None, now=None):
+    """Cancel a hold or discharge a confirmed patient, returning the unit"""
+    now = now or datetime.now()
+    if not _transition(reservation_id, ('held', 'confirmed'), 'released', now):
+        db.session.rollback()
+        raise ReservationConflict('Reservation was already released or expired')
+
+    reservation = BedReservation.query.get(reservation_id)
+    _adjust(reservation.hospital_id, reservation.resource, 1)
+    _log(reservation.hospital_id, reservation.resource, 1, 'release', reservation.id, actor_id)
+    db.session.commit()
+    return reservation
+
+
+def expire_stale(now=None, hospital_id=None, commit=True):
+    """Return units from holds that were never confirmed"""
+    now = now or datetime.now()
+
+    query = BedReservation.query.with_entities(
+        BedReservation.id, BedReservation.hospital_id, BedReservation.resource
+    ).filter(
+        BedReservation.status == 'held',
+        BedReservation.expires_at < now
+    )
+    if hospital_id:
+        query = query.filter(BedReservation.hospital_id == hospital_id)
+
+    expired = 0
+    for reservation_id, h_id, resource in query.all():
+        if _transition(reservation_id, ('held',), 'expired', now):
+            _adjust(h_id, resource, 1)
+            _log(h_id, resource, 1, 'expire', reservation_id)
+            expired += 1
+
+    if commit:
+        db.session.commit()
+    return expired
+
+
+def set_available(hospital, values, expected=None, actor_id=None):
+    """Admin overwrite of availability, guarded by the values the admin last saw.
+
+    `values` and `expected` map resource -> count. A resource is only written
+    if its current value still equals the expected one, so a reservation that
+    landed in between is not silently lost. A value without an expected one
+    is refused too: the form it came from did not say what the admin saw.
+    """
+    for resource, value in values.items():
+        if value is None:
+            continue
+        column = _column(resource)
+        seen = (expected or {}).get(resource)
+        if seen is None:
+            db.session.rollback()
+            raise ReservationConflict(f'{resource} availability was submitted without the value it replaces; reload and retry')
+
+        result = db.session.execute(
+            update(Hospital).where(Hospital.id == hospital.id, db.func.coalesce(column, 0) == seen).values({column: value})
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            raise ReservationConflict(f'{resource} availability changed since it was loaded; reload and retry')
+
+        if value != seen:
+            _log(hospital.id, resource, value - seen, 'admin_update', actor_id=actor_id)
@@ -0,0 +1,195 @@
+"""
+SAKSHI Bed Routing
+Ranks hospitals for an ambulance by distance from the patient's ward and live
+bed availability, using a precomputed ward-to-hospital distance matrix and an
+in-memory availability table
+"""
+
+from models import Hospital
+import json
+import math
+import os
+import threading
+import time
+
+# Optional {"<ward_number>": [lat, lon], ...} file with ward centroids.
+# Without it, hospitals are ranked by same ward, then same zone.
+WARD_CENTROIDS_PATH = os.environ.get('WARD_CENTROIDS_PATH', 'ward_centroids.json')
+
+# Other workers update beds too; re-read availability at most this often
+AVAILABILITY_TTL_SECONDS = 5
+
+NEEDS = {
+    'bed': 'available_beds',
+    'icu': 'available_icu_beds',
+    'ventilator': 'available_ventilators'
+}
+
+_lock = threading.Lock()
+_hospitals = {}       # hospital_id -> static details
+_availability = {}    # hospital_id -> {need: count}
+_centroids = {}       # ward_number -> (lat, lon)
+_matrix = {}          # ward_number -> [(distance_km, hospital_id), ...] nearest first
+_loaded_at = 0.0
+
+
+def haversine_km(a, b):
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(h))
+
+
+def _load_centroids():
+    if not os.path.exists(WARD_CENTROIDS_PATH):
+        return {}
+    with open(WARD_CENTROIDS_PATH) as f:
+        return {int(ward): tuple(point) for ward, point in json.load(f).items()}
+
+
+def _availability_of(hospital):
+    return {need: getattr(hospital, column) or 0 for need, column in NEEDS.items()}
+
+
+def _build_matrix(hospitals, centroids):
+    """Distance from every known ward centroid to every hospital, sorted once"""
+    matrix = {}
+    for ward, origin in centroids.items():
+        row = []
+        for h in hospitals.values():
+            location = centroids.get(h['ward_number'])
+            if location:
+                row.append((round(haversine_km(origin, location), 2), h['id']))
+        matrix[ward] = sorted(row)
+    return matrix
+
+
+def load():
+    """(Re)build hospital details, availability and the distance matrix from the database"""
+    global _hospitals, _availability, _centroids, _matrix, _loaded_at
+
+    hospitals = Hospital.query.all()
+    details = {h.id: {
+        'id': h.id,
+        'name': h.name,
+        'zone': h.zone,
+        'ward_number': int(h.ward_number) if h.ward_number is not None else None,
+        'total_beds': h.total_beds or 0
+    } for h in hospitals}
+    centroids = _load_centroids()
+
+    with _lock:
+        _hospitals = details
+        _availability = {h.id: _availability_of(h) for h in hospitals}
+        _centroids = centroids
+        _matrix = _build_matrix(details, centroids)
+        _loaded_at = time.monotonic()
+
+
+def _refresh_availability():
+    global _loaded_at
+
+    rows = Hospital.query.with_entities(
+        Hospital.id, *[getattr(Hospital, column) for column in NEEDS.values()]
+    ).all()
+
+    with _lock:
+        for row in rows:
+            _availability[row[0]] = {need: value or 0 for need, value in zip(NEEDS, row[1:])}
+        _loaded_at = time.monotonic()
+
+
+def _ensure_fresh():
+    if not _hospitals:
+        load()
+    elif time.monotonic() - _loaded_at > AVAILABILITY_TTL_SECONDS:
+        _refresh_availability()
+
+
+def update_hospital(hospital):
+    """Called after a bed update commits so this worker routes on the new numbers"""
+    with _lock:
+        if hospital.id not in _hospitals:
+            _hospitals.clear()
+            return
+        _availability[hospital.id] = _availability_of(hospital)
+
+
+def occupancy(hospital_id):
+    """Share of general beds in use, 0.0-1.0 (1.0 when unknown)"""
+    _ensure_fresh()
+    with _lock:
+        total = _hospitals.get(hospital_id, {}).get('total_beds')
+        if not total:
+            return 1.0
+        available = _availability.get(hospital_id, {}).get('bed', 0)
+    return min(max(1 - available / total, 0.0), 1.0)
+
+
+def distance_km(ward, hospital_id):
+    """Ward centroid to hospital distance, or None without centroids for both"""
+    _ensure_fresh()
+    with _lock:
+        for distance, candidate in _matrix.get(ward, ()):
+            if candidate == hospital_id:
+                return distance
+    return None
+
+
+def nearest_ward(lat, lon):
+    _ensure_fresh()
+    if not _centroids:
+        return None
+    return min(_centroids, key=lambda ward: haversine_km((lat, lon), _centroids[ward]))
+
+
+def _fallback_tier(h, ward, zone):
+    if ward is not None and h['ward_number'] == ward:
+        return 0
+    if zone and h['zone'] == zone:
+        return 1
+    return 2
+
+
+def _candidates(ward, zone):
+    """Yield (distance_km, tier, hospital) nearest first"""
+    if ward in _matrix:
+        located = set()
+        for distance, hospital_id in _matrix[ward]:
+            located.add(hospital_id)
+            yield distance, 0, _hospitals[hospital_id]
+
+        # Hospitals in wards without a centroid still count, ranked after every located one
+        for h in _hospitals.values():
+            if h['id'] not in located:
+                yield None, 1 + _fallback_tier(h, ward, zone), h
+        return
+
+    for h in _hospitals.values():
+        yield None, _fallback_tier(h, ward, zone), h
+
+
+def route(need='bed', ward=None, zone=None, limit=5):
+    """Hospitals with at least one free `need`, nearest first, most availability breaking ties"""
+    if need not in NEEDS:
+        raise ValueError(f'Unknown need: {need}')
+
+    _ensure_fresh()
+
+    with _lock:
+        ranked = []
+        for distance, tier, h in _candidates(ward, zone):
+            available = _availability.get(h['id'], {}).get(need, 0)
+            if available > 0:
+                ranked.append((tier, distance if distance is not None else 0, -available, h, distance, available))
+
+    ranked.sort(key=lambda r: r[:3])
+
+    return [{
+        'hospital_id': h['id'],
+        'name': h['name'],
+        'zone': h['zone'],
+        'ward_number': h['ward_number'],
+        'distance_km': distance,
+        'available': available
+    } for _, _, _, h, distance, available in ranked[:limit]]
@@ -0,0 +1,52 @@
+"""
+SAKSHI HTTP Cache Benchmark
+Measures bytes on the wire and server time for full, compressed and
+revalidated (304) responses on the cached routes
+
+    python init_db.py
+    python benchmarks/bench_http_cache.py --rounds 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+
+PUBLIC_URLS = ['/api/bed-availability', '/api/disease-stats']
+ADMIN_URLS = ['/admin/dashboard', '/admin/beds', '/admin/disease-surveillance']
+
+
+def timed(client, url, rounds, headers):
+    response = None
+    started = time.perf_counter()
+    for _ in range(rounds):
+        response = client.get(url, headers=headers)
+    return response, (time.perf_counter() - started) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    client.post('/authenticate', data={'username': 'admin', 'password': 'admin123', 'user_type': 'admin'})
+
+    print(f'{"url":<30}{"plain B":>10}{"gzip B":>10}{"304 B":>8}{"plain ms":>10}{"gzip ms":>10}{"304 ms":>9}')
+    for url in PUBLIC_URLS + ADMIN_URLS:
+        plain, plain_ms = timed(client, url, args.rounds, {})
+        gz, gz_ms = timed(client, url, args.rounds, {'Accept-Encoding': 'gzip'})
+        etag = plain.headers.get('ETag', '')
+        cached, cached_ms = timed(client, url, args.rounds, {'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+
+        print(f'{url:<30}{len(plain.get_data()):>10}{len(gz.get_data()):>10}{len(cached.get_data()):>8}'
+              f'{plain_ms:>10.2f}{gz_ms:>10.2f}{cached_ms:>9.2f}'
+              + ('' if cached.status_code == 304 else f'  (status {cached.status_code})'))
+
+
+if __name__ == '__main__':
+    main()
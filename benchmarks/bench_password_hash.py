@@ -0,0 +1,50 @@
+"""
+SAKSHI Password Hash Benchmark
+Times werkzeug hash methods so PASSWORD_HASH_METHOD can be picked for the
+login peak: aim for a cost that keeps one verification well under the
+request budget while staying as slow as possible for an attacker
+
+    python benchmarks/bench_password_hash.py
+    python benchmarks/bench_password_hash.py --method pbkdf2:sha256:300000 --rounds 20
+"""
+
+from werkzeug.security import generate_password_hash, check_password_hash
+import argparse
+import os
+import time
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:150000',
+    'pbkdf2:sha256:300000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1'
+]
+
+
+def bench(method, rounds):
+    password = 'patient123'
+    pwhash = generate_password_hash(password, method=method)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        check_password_hash(pwhash, password)
+    per_hash = (time.perf_counter() - started) / rounds
+    return per_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', action='append', help='werkzeug method string (repeatable)')
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f'{"method":<26}{"ms/verify":>12}{"logins/s/core":>16}{"logins/s (" + str(cores) + " cores)":>22}')
+    for method in args.method or DEFAULT_METHODS:
+        per_hash = bench(method, args.rounds)
+        print(f'{method:<26}{per_hash * 1000:>12.1f}{1 / per_hash:>16.1f}{cores / per_hash:>22.0f}')
+
+
+if __name__ == '__main__':
+    main()
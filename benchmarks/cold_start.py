@@ -0,0 +1,80 @@
+"""
+SAKSHI Cold Start Benchmark
+Starts fresh interpreters and times import, init_db() and the first request
+to a few template-heavy pages, with an empty and a warm template bytecode cache
+
+    flask --app app precompile-templates
+    python benchmarks/cold_start.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds from interpreter start to the first dashboard response
+COLD_START_TARGET_SECONDS = 1.5
+
+PROBE = r'''
+import json, time
+t0 = time.perf_counter()
+import app as sakshi
+t1 = time.perf_counter()
+sakshi.init_db()
+t2 = time.perf_counter()
+client = sakshi.app.test_client()
+client.get('/')
+client.post('/authenticate', data={'username': 'admin', 'password': 'admin123', 'user_type': 'admin'})
+client.get('/admin/dashboard')
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'init_db': t2 - t1, 'first_requests': t3 - t2, 'total': t3 - t0}))
+'''
+
+
+def run_once(cache_dir):
+    env = dict(os.environ, TEMPLATE_CACHE_DIR=cache_dir)
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(label, runs):
+    keys = ['import', 'init_db', 'first_requests', 'total']
+    medians = {k: statistics.median(r[k] for r in runs) for k in keys}
+    print(f'{label:<14}' + ''.join(f'{k}={medians[k] * 1000:>7.0f} ms  ' for k in keys))
+    return medians['total']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    cold_dir = tempfile.mkdtemp()
+    warm_dir = tempfile.mkdtemp()
+    try:
+        cold = []
+        for _ in range(args.runs):
+            shutil.rmtree(cold_dir)
+            os.makedirs(cold_dir)
+            cold.append(run_once(cold_dir))
+        run_once(warm_dir)
+        warm = [run_once(warm_dir) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(cold_dir, ignore_errors=True)
+        shutil.rmtree(warm_dir, ignore_errors=True)
+
+    report('empty cache', cold)
+    total = report('warm cache', warm)
+    print(f'target {COLD_START_TARGET_SECONDS * 1000:.0f} ms: {"met" if total <= COLD_START_TARGET_SECONDS else "MISSED"}')
+    sys.exit(0 if total <= COLD_START_TARGET_SECONDS else 1)
+
+
+if __name__ == '__main__':
+    main()
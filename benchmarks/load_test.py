@@ -0,0 +1,124 @@
+"""
+SAKSHI HTTP Load Test
+Opens many concurrent keep-alive connections against a running server and
+reports throughput, latency percentiles and how many connections it held
+
+Compare the WSGI dev server with the ASGI entry point:
+
+    python app.py                                         # :5000
+    uvicorn asgi:application --port 8000 --workers 4      # :8000
+
+    python benchmarks/load_test.py --port 5000 --connections 200
+    python benchmarks/load_test.py --port 8000 --connections 200
+    python benchmarks/load_test.py --port 8000 --connections 1000 --path /api/stream/bed-availability --stream
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+
+async def _request(reader, writer, host, path):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode())
+    await writer.drain()
+
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def _client(args, deadline, latencies, errors):
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    except OSError:
+        errors.append('connect')
+        return
+
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            status = await _request(reader, writer, args.host, args.path)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+    except (OSError, asyncio.IncompleteReadError, IndexError, ValueError):
+        errors.append('dropped')
+    finally:
+        writer.close()
+
+
+async def _stream_client(args, deadline, held, errors):
+    """Hold one SSE connection open; count it only if events keep arriving until the deadline.
+
+    The server sends an event or keep-alive every interval, so a gap of two
+    intervals, or the server ending the response, means the stream was lost.
+    """
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        writer.write(f'GET {args.path} HTTP/1.1\r\nHost: {args.host}\r\n\r\n'.encode())
+        await writer.drain()
+        await asyncio.wait_for(reader.readuntil(b'\n\n'), timeout=max(deadline - time.monotonic(), 1))
+        events = 1
+        while time.monotonic() < deadline:
+            await asyncio.wait_for(reader.readuntil(b'\n\n'), timeout=args.stream_interval * 2)
+            events += 1
+        writer.close()
+        if events >= 2:
+            held.append(events)
+        else:
+            errors.append('stream too short to check; raise --duration')
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        errors.append('stream')
+
+
+async def run(args):
+    deadline = time.monotonic() + args.duration
+    latencies, errors, held = [], [], []
+
+    if args.stream:
+        clients = [_stream_client(args, deadline, held, errors) for _ in range(args.connections)]
+    else:
+        clients = [_client(args, deadline, latencies, errors) for _ in range(args.connections)]
+
+    started = time.monotonic()
+    await asyncio.gather(*clients)
+    elapsed = time.monotonic() - started
+
+    print(f'{args.host}:{args.port}{args.path}  connections={args.connections}  duration={elapsed:.1f}s')
+    if args.stream:
+        print(f'  streams held: {len(held)}/{args.connections}  errors: {len(errors)}')
+        return
+
+    if latencies:
+        latencies.sort()
+        print(f'  requests: {len(latencies)}  throughput: {len(latencies) / elapsed:.0f} req/s')
+        print(f'  latency p50: {statistics.median(latencies) * 1000:.1f} ms  '
+              f'p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms')
+    print(f'  errors: {len(errors)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--path', default='/api/bed-availability')
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--stream', action='store_true', help='hold SSE connections open instead of polling')
+    parser.add_argument('--stream-interval', type=float, default=5.0,
+                        help='server keep-alive interval; a stream silent for twice this is counted as dropped')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
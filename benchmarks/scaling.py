@@ -0,0 +1,56 @@
+"""
+SAKSHI Worker Scaling Test
+Starts gunicorn with an increasing number of workers and runs the load test
+against each, to show throughput scaling across cores
+
+    python benchmarks/scaling.py --workers 1 2 4 8 --path /api/bed-availability
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/readyz', timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not become ready')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--path', default='/api/bed-availability')
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    for count in args.workers:
+        env = dict(os.environ, WEB_WORKERS=str(count), BIND=f'127.0.0.1:{args.port}')
+        server = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', '/dev/null',
+                                   'wsgi:create_app()'], cwd=ROOT, env=env)
+        try:
+            wait_ready(args.port)
+            print(f'--- {count} worker(s) ---', flush=True)
+            subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'load_test.py'),
+                            '--port', str(args.port), '--path', args.path,
+                            '--connections', str(args.connections), '--duration', str(args.duration)], check=True)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
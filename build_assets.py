@@ -0,0 +1,228 @@
+"""
+SAKSHI Static Asset Build
+Vendors CDN libraries, minifies and content-hashes CSS/JS into static/dist,
+precompresses every file (gzip, plus brotli when the module is installed)
+and writes the manifest read by asset_url()
+
+    python build_assets.py --vendor   # first time / after bumping a library version
+    python build_assets.py
+"""
+
+from urllib.request import urlopen
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Pinned copies of the CDN libraries, so PHCs keep working offline
+VENDOR = {
+    'vendor/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
+    'vendor/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+    'vendor/chart.umd.min.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js',
+    'vendor/qrcode.min.js': 'https://cdnjs.cloudflare.com/ajax/libs/qrcodejs/1.0.0/qrcode.min.js',
+    'vendor/bootstrap-icons/bootstrap-icons.css': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/fonts/bootstrap-icons.woff2',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/fonts/bootstrap-icons.woff'
+}
+
+# Logical name -> sources concatenated in order
+BUNDLES = {
+    'js/cure_code.bundle.js': ['vendor/qrcode.min.js', 'js/cure_code_creation.js']
+}
+
+TEXT_TYPES = ('.css', '.js')
+BINARY_TYPES = ('.woff', '.woff2', '.png', '.jpg', '.svg', '.ico')
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")?#]+)([?#][^\'")]*)?\1\s*\)')
+
+
+def vendor():
+    for name, url in VENDOR.items():
+        path = os.path.join(STATIC_DIR, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urlopen(url, timeout=30) as response, open(path, 'wb') as f:
+            shutil.copyfileobj(response, f)
+        print(f'  vendored {name}')
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def _in_template_after(line, inside):
+    """Whether a template literal is still open at the end of `line`.
+
+    Tracks quotes and escapes well enough for hand-written scripts; quotes
+    inside ${...} expressions and regex literals are not special-cased.
+    """
+    quote = '`' if inside else None
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+        elif line.startswith('//', i):
+            break
+        i += 1
+    return quote == '`'
+
+
+def minify_js(text):
+    """Conservative: drops indentation, blank lines and whole-line // comments only.
+
+    Lines inside a multi-line template literal are part of the string and are
+    kept exactly as written.
+    """
+    lines = []
+    inside = False
+    for raw in text.splitlines():
+        if inside:
+            lines.append(raw)
+            inside = _in_template_after(raw, True)
+            continue
+
+        line = raw.strip()
+        if not line or line.startswith('//'):
+            continue
+        inside = _in_template_after(line, False)
+        # Trailing whitespace of a line that opens a literal belongs to the string
+        lines.append(raw.lstrip() if inside else line)
+    return '\n'.join(lines) + '\n'
+
+
+def hashed_name(name, content):
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def collect_sources():
+    sources = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        if os.path.abspath(root).startswith(DIST_DIR):
+            continue
+        for filename in files:
+            if filename.endswith(TEXT_TYPES + BINARY_TYPES):
+                path = os.path.join(root, filename)
+                sources.append(os.path.relpath(path, STATIC_DIR).replace(os.sep, '/'))
+    return sorted(sources)
+
+
+def rewrite_css_urls(name, text, manifest):
+    """Point relative url() references at the hashed copies"""
+    base = posixpath.dirname(name)
+
+    def replace(match):
+        quote, ref, suffix = match.group(1), match.group(2), match.group(3) or ''
+        if ref.startswith(('data:', 'http:', 'https:', '/')):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(base, ref))
+        if target not in manifest:
+            return match.group(0)
+        relative = posixpath.relpath(manifest[target], base or '.')
+        return f'url({quote}{relative}{suffix}{quote})'
+
+    return CSS_URL.sub(replace, text)
+
+
+def build():
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    manifest, outputs, original_bytes = {}, {}, {}
+    sources = collect_sources()
+
+    # Binaries first so CSS can reference their hashed names
+    for name in sorted(sources, key=lambda n: n.endswith(TEXT_TYPES)):
+        with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+            raw = f.read()
+        original_bytes[name] = len(raw)
+
+        content = raw
+        if name.endswith('.css'):
+            text = raw.decode('utf-8')
+            if '.min.' not in name:
+                text = minify_css(text)
+            content = rewrite_css_urls(name, text, manifest).encode('utf-8')
+        elif name.endswith('.js') and '.min.' not in name:
+            content = minify_js(raw.decode('utf-8')).encode('utf-8')
+
+        manifest[name] = hashed_name(name, content)
+        outputs[manifest[name]] = content
+
+    for name, parts in BUNDLES.items():
+        if not all(part in manifest for part in parts):
+            print(f'  skipped bundle {name} (missing sources; run with --vendor)')
+            continue
+        content = b'\n;\n'.join(outputs[manifest[part]] for part in parts)
+        original_bytes[name] = sum(original_bytes[part] for part in parts)
+        manifest[name] = hashed_name(name, content)
+        outputs[manifest[name]] = content
+
+    totals = {'original': 0, 'minified': 0, 'gzip': 0, 'brotli': 0}
+    for name, built in sorted(manifest.items()):
+        content = outputs[built]
+        path = os.path.join(DIST_DIR, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+        gz_size = br_size = len(content)
+        if built.endswith(COMPRESSIBLE):
+            gz = gzip.compress(content, compresslevel=9, mtime=0)
+            with open(path + '.gz', 'wb') as f:
+                f.write(gz)
+            gz_size = br_size = len(gz)
+            if brotli:
+                br = brotli.compress(content, quality=11)
+                with open(path + '.br', 'wb') as f:
+                    f.write(br)
+                br_size = len(br)
+
+        totals['original'] += original_bytes[name]
+        totals['minified'] += len(content)
+        totals['gzip'] += gz_size
+        totals['brotli'] += br_size
+        print(f'  {name:<48} {original_bytes[name]:>9} -> {len(content):>9} min  {gz_size:>8} gz'
+              + (f'  {br_size:>8} br' if brotli else ''))
+
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    print(f'\n  total bytes: {totals["original"]} original, {totals["minified"]} minified, '
+          f'{totals["gzip"]} gzip' + (f', {totals["brotli"]} brotli' if brotli else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vendor', action='store_true', help='download pinned CDN libraries into static/vendor first')
+    args = parser.parse_args()
+
+    print('🏗️  SAKSHI Static Asset Build')
+    print('=' * 50)
+    if args.vendor:
+        vendor()
+    build()
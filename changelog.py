@@ -0,0 +1,185 @@
+"""
+SAKSHI Change Log
+Append-only change-data-capture log of every model write, filled from
+session events inside the writer's transaction, with named consumer cursors
+
+Sequence numbers are AUTOINCREMENT and SQLite allows one writer at a time, so
+the order of seq is the commit order: a consumer that has read up to seq N
+will never later find a committed change below N.
+
+Bulk query.update()/update()/delete() statements do not say which rows they
+touched; they are logged once, with the columns they set, even if they end
+up matching no rows. Their row_key is NULL unless the caller describes the
+rows with execution_options(change_key='date=2026-01-31').
+
+    changes = changelog.read_changes(since=cursor, tables=['hospital'])
+    changelog.consume('bed-alerts', handle_batch)
+"""
+
+from flask import has_request_context, session
+from models import db
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.orm import Session
+from datetime import datetime
+import json
+
+READ_LIMIT = 1000
+
+# Bookkeeping tables whose writes are not interesting to consumers
+UNLOGGED = {'change_log', 'change_consumer', 'stat_counter'}
+
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_table_row', 'table_name', 'row_key', 'seq'),
+        db.Index('ix_change_log_table_seq', 'table_name', 'seq'),
+        {'sqlite_autoincrement': True}
+    )
+
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_key = db.Column(db.String(64))
+    op = db.Column(db.String(12), nullable=False)  # insert, update, delete, bulk_update, bulk_delete, bulk_insert
+    changed_columns = db.Column(db.Text)  # JSON list
+    actor_id = db.Column(db.Integer)
+    changed_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'table': self.table_name,
+            'row_key': self.row_key,
+            'op': self.op,
+            'changed_columns': json.loads(self.changed_columns or '[]'),
+            'actor_id': self.actor_id,
+            'changed_at': self.changed_at.isoformat()
+        }
+
+
+class ChangeConsumer(db.Model):
+    """Where each named downstream reader has got to"""
+    __tablename__ = 'change_consumer'
+
+    name = db.Column(db.String(100), primary_key=True)
+    cursor = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+def _actor():
+    if has_request_context():
+        return session.get('user_id')
+    return None
+
+
+def _row_key(obj):
+    """Primary key as text; read from the columns since new rows get their identity key after after_flush"""
+    key = inspect(obj).mapper.primary_key_from_instance(obj)
+    return '/'.join(str(part) for part in key)
+
+
+def _changed_columns(obj):
+    """Attribute history is still intact during after_flush"""
+    state = inspect(obj)
+    return [attr.key for attr in state.mapper.column_attrs if state.attrs[attr.key].history.has_changes()]
+
+
+@event.listens_for(Session, 'after_flush')
+def _log_flushed_changes(db_session, flush_context):
+    now = datetime.now()
+    actor = _actor()
+    rows = []
+
+    def add(obj, op, columns):
+        table = getattr(obj, '__tablename__', None)
+        if table and table not in UNLOGGED:
+            rows.append({'table_name': table, 'row_key': _row_key(obj), 'op': op,
+                         'changed_columns': json.dumps(columns), 'actor_id': actor, 'changed_at': now})
+
+    for obj in db_session.new:
+        add(obj, 'insert', [attr.key for attr in inspect(obj).mapper.column_attrs])
+    for obj in db_session.dirty:
+        columns = _changed_columns(obj)
+        if columns:
+            add(obj, 'update', columns)
+    for obj in db_session.deleted:
+        add(obj, 'delete', [])
+
+    if rows:
+        statement = insert(ChangeLog.__table__)
+        db_session.connection(bind_arguments={'clause': statement}).execute(statement, rows)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _log_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    statement = orm_execute_state.statement
+    table = getattr(statement, 'table', None)
+    if table is None or table.name in UNLOGGED:
+        return
+
+    op = 'bulk_update' if orm_execute_state.is_update else 'bulk_delete' if orm_execute_state.is_delete else 'bulk_insert'
+    values = getattr(statement, '_values', None) or {}
+    columns = sorted(getattr(key, 'key', str(key)) for key in values)
+    # Passing the insert as the clause pins the write to the primary, even in a @read_replica handler
+    log = insert(ChangeLog.__table__)
+    orm_execute_state.session.connection(bind_arguments={'clause': log}).execute(log, {
+        'table_name': table.name, 'row_key': orm_execute_state.execution_options.get('change_key'), 'op': op, 'changed_columns': json.dumps(columns),
+        'actor_id': _actor(), 'changed_at': datetime.now()
+    })
+
+
+def latest_seq():
+    return db.session.query(db.func.max(ChangeLog.seq)).scalar() or 0
+
+
+def read_changes(since=0, limit=READ_LIMIT, tables=None):
+    """Changes after `since`, oldest first"""
+    query = ChangeLog.query.filter(ChangeLog.seq > since)
+    if tables:
+        query = query.filter(ChangeLog.table_name.in_(list(tables)))
+    return query.order_by(ChangeLog.seq).limit(limit).all()
+
+
+def row_seqs(table, row_keys):
+    """Latest change sequence per row, keyed like row_keys"""
+    keys = {str(k): k for k in row_keys}
+    rows = db.session.query(ChangeLog.row_key, db.func.max(ChangeLog.seq)).filter(
+        ChangeLog.table_name == table,
+        ChangeLog.row_key.in_(list(keys))
+    ).group_by(ChangeLog.row_key).all()
+    return {keys[key]: seq for key, seq in rows}
+
+
+def get_cursor(name):
+    consumer = ChangeConsumer.query.get(name)
+    return consumer.cursor if consumer else 0
+
+
+def ack(name, seq):
+    """Move a consumer's cursor forward (never back)"""
+    consumer = ChangeConsumer.query.get(name)
+    if consumer is None:
+        db.session.add(ChangeConsumer(name=name, cursor=seq))
+    elif seq > consumer.cursor:
+        consumer.cursor = seq
+
+
+def consume(name, handler, tables=None, limit=READ_LIMIT):
+    """Feed unread changes to handler(changes) in batches, committing the cursor after each.
+
+    Delivery is at-least-once: if handler fails, the batch is offered again
+    next time, so handlers should be idempotent. Returns how many changes were read.
+    """
+    total = 0
+    while True:
+        changes = read_changes(get_cursor(name), limit, tables)
+        if not changes:
+            return total
+        handler(changes)
+        ack(name, changes[-1].seq)
+        db.session.commit()
+        total += len(changes)
+        if len(changes) < limit:
+            return total
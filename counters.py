@@ -0,0 +1,56 @@
+"""
+SAKSHI Stat Counters
+Named integer counters maintained incrementally so dashboards read one row
+instead of re-counting whole tables
+"""
+
+from models import db
+from sqlalchemy.dialects.sqlite import insert
+from datetime import datetime
+
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counter'
+
+    name = db.Column(db.String(120), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+def get_counter(name, default=None):
+    counter = StatCounter.query.get(name)
+    return counter.value if counter else default
+
+
+def get_counters(names):
+    """Fetch several counters in one query; missing names map to 0"""
+    rows = StatCounter.query.filter(StatCounter.name.in_(list(names))).all()
+    values = {name: 0 for name in names}
+    values.update({row.name: row.value for row in rows})
+    return values
+
+
+def set_counter(name, value):
+    counter = StatCounter.query.get(name)
+    if counter:
+        counter.value = value
+    else:
+        db.session.add(StatCounter(name=name, value=value))
+
+
+def seed_counter(name, value):
+    """Create the counter with value unless another worker already has; runs in the caller's transaction"""
+    db.session.execute(insert(StatCounter.__table__).values(
+        name=name, value=value, updated_at=datetime.now()
+    ).on_conflict_do_nothing(index_elements=['name']))
+
+
+def increment_counter(name, delta=1):
+    """Atomically add delta; the UPDATE runs in the caller's transaction"""
+    updated = StatCounter.query.filter_by(name=name).update({
+        StatCounter.value: StatCounter.value + delta,
+        StatCounter.updated_at: datetime.now()
+    }, synchronize_session=False)
+
+    if not updated:
+        db.session.add(StatCounter(name=name, value=delta))
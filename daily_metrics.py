@@ -0,0 +1,230 @@
+"""
+SAKSHI Daily Health Metrics
+Derives HealthMetrics rows (per day, zone and ward) from medical records,
+appointments and vaccination doses instead of entering them by hand
+
+Each day is recomputed with one set-based INSERT ... SELECT after deleting
+that day's rows, so reruns are idempotent. Regular runs only touch days that
+the change log says were written to, plus today, yesterday and the days rows
+were moved or deleted away from (noted at flush time, as the change log only
+has the new state); backfills walk any date range in committed chunks. Days
+the history archive has moved rows out of are left as they are: their source
+rows are no longer in the hot tables.
+
+    flask compute-health-metrics                                  # every 15 minutes from cron
+    flask compute-health-metrics --start 2022-01-01 --end 2025-12-31
+"""
+
+from models import db, HealthMetrics, MedicalRecord, Appointment, Patient
+from vaccination import VaccinationDose
+from archive import ArchivedDiagnosis, archived_through
+from changelog import consume
+from sqlalchemy import event, inspect, insert, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+
+CONSUMER = 'daily-metrics'
+
+# Deletes and bulk writes don't say which day they hit; recompute this many recent days instead
+RECENT_DAYS = 7
+
+BACKFILL_CHUNK_DAYS = 31
+
+# Case-insensitive substrings of MedicalRecord.diagnosis
+COMMUNICABLE = ('fever', 'cold', 'gastroenteritis', 'infection', 'dengue', 'malaria', 'typhoid',
+                'tuberculosis', 'covid', 'cholera', 'hepatitis', 'influenza', 'chikungunya', 'measles')
+NON_COMMUNICABLE = ('hypertension', 'diabetes', 'arthritis', 'migraine', 'asthma', 'cancer',
+                    'heart', 'copd', 'thyroid', 'kidney', 'stroke')
+
+# Source table -> the column that decides which day a row counts toward
+SOURCES = {
+    MedicalRecord.__tablename__: (MedicalRecord, 'visit_date'),
+    Appointment.__tablename__: (Appointment, 'appointment_date'),
+    VaccinationDose.__tablename__: (VaccinationDose, 'administered_at')
+}
+
+# Lets the per-day aggregation and the new-case check seek instead of scan
+db.Index('ix_medical_record_visit_date', MedicalRecord.visit_date)
+db.Index('ix_medical_record_patient_diagnosis', MedicalRecord.patient_id, MedicalRecord.diagnosis, MedicalRecord.visit_date)
+db.Index('ix_appointment_date_type', Appointment.appointment_date, Appointment.appointment_type)
+db.Index('ix_vaccination_dose_administered', VaccinationDose.administered_at)
+
+
+class VacatedDay(db.Model):
+    """A day a source row was moved or deleted away from, waiting for the next run"""
+    __tablename__ = 'metrics_vacated_day'
+
+    day = db.Column(db.Date, primary_key=True)
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_vacated_days(db_session, flush_context):
+    """Old days of moved and deleted source rows; attribute history is still intact during after_flush"""
+    days = set()
+    for obj in list(db_session.dirty) + list(db_session.deleted):
+        source = SOURCES.get(getattr(obj, '__tablename__', None))
+        if source is None:
+            continue
+        history = inspect(obj).attrs[source[1]].history
+        if obj in db_session.deleted:
+            days.update(history.unchanged or history.deleted or ())
+        else:
+            days.update(history.deleted or ())
+
+    days = {_day(d) for d in days if d is not None}
+    if days:
+        statement = sqlite_insert(VacatedDay.__table__).on_conflict_do_nothing()
+        db_session.connection(bind_arguments={'clause': statement}).execute(
+            statement, [{'day': day} for day in sorted(days)]
+        )
+
+
+def _matches_any(column, words):
+    return '(' + ' OR '.join(f"lower({column}) LIKE '%{w}%'" for w in words) + ')'
+
+
+_records = MedicalRecord.__tablename__
+_appointments = Appointment.__tablename__
+_patients = Patient.__tablename__
+_doses = VaccinationDose.__tablename__
+_archived_diagnoses = ArchivedDiagnosis.__tablename__
+
+_METRIC_COLUMNS = ('date', 'zone', 'ward_number', 'total_consultations', 'emergency_visits',
+                   'new_disease_cases', 'vaccinations_given', 'communicable_diseases', 'non_communicable_diseases')
+
+_DAY_AGGREGATE = text(f"""
+    SELECT :day, zone, ward_number, SUM(consultations), SUM(emergencies), SUM(new_cases),
+        SUM(vaccinations), SUM(communicable), SUM(non_communicable)
+    FROM (
+        SELECT p.zone, p.ward_number, 1 AS consultations, 0 AS emergencies,
+            CASE WHEN COALESCE(r.diagnosis, '') != '' AND NOT EXISTS (
+                SELECT 1 FROM {_records} e
+                WHERE e.patient_id = r.patient_id AND e.diagnosis = r.diagnosis AND e.visit_date < r.visit_date
+            ) AND NOT EXISTS (
+                SELECT 1 FROM {_archived_diagnoses} x
+                WHERE x.patient_id = r.patient_id AND x.diagnosis = r.diagnosis
+            ) THEN 1 ELSE 0 END AS new_cases,
+            0 AS vaccinations,
+            CASE WHEN {_matches_any('r.diagnosis', COMMUNICABLE)} THEN 1 ELSE 0 END AS communicable,
+            CASE WHEN {_matches_any('r.diagnosis', NON_COMMUNICABLE)} THEN 1 ELSE 0 END AS non_communicable
+        FROM {_records} r JOIN {_patients} p ON p.id = r.patient_id
+        WHERE r.visit_date >= :day AND r.visit_date < :next_day
+
+        UNION ALL
+        SELECT p.zone, p.ward_number, 0, 1, 0, 0, 0, 0
+        FROM {_appointments} a JOIN {_patients} p ON p.id = a.patient_id
+        WHERE a.appointment_date >= :day AND a.appointment_date < :next_day
+            AND lower(a.appointment_type) = 'emergency'
+
+        UNION ALL
+        SELECT v.zone, v.ward_number, 0, 0, 0, 1, 0, 0
+        FROM {_doses} v
+        WHERE v.administered_at >= :day AND v.administered_at < :next_day
+    )
+    WHERE zone IS NOT NULL
+    GROUP BY zone, ward_number
+""").columns(*[db.column(name) for name in _METRIC_COLUMNS])
+
+
+def compute_day(day):
+    """Replace one day's HealthMetrics rows, in the caller's transaction"""
+    params = {'day': day.isoformat(), 'next_day': (day + timedelta(days=1)).isoformat()}
+
+    # The change key tells the geo rollups which day these bulk writes touched
+    options = {'change_key': f'date={day.isoformat()}'}
+    db.session.execute(
+        HealthMetrics.__table__.delete().where(HealthMetrics.date == day),
+        execution_options=options
+    )
+    db.session.execute(
+        insert(HealthMetrics.__table__).from_select(_METRIC_COLUMNS, _DAY_AGGREGATE),
+        params,
+        execution_options=options
+    )
+
+
+def first_computable_day():
+    """Earliest day whose source rows are all still hot, or None when nothing is archived"""
+    archived = archived_through()
+    return archived + timedelta(days=1) if archived else None
+
+
+def compute_range(start, end):
+    """Recompute every day in [start, end] that is not archived, committing each chunk; returns days computed"""
+    first = first_computable_day()
+    day, computed = max(start, first) if first else start, 0
+    while day <= end:
+        chunk_end = min(day + timedelta(days=BACKFILL_CHUNK_DAYS - 1), end)
+        while day <= chunk_end:
+            compute_day(day)
+            day += timedelta(days=1)
+            computed += 1
+        db.session.commit()
+    return computed
+
+
+def earliest_day():
+    """First day any source table has data for"""
+    firsts = [db.session.query(db.func.min(getattr(model, column))).scalar() for model, column in SOURCES.values()]
+    firsts = [f.date() if isinstance(f, datetime) else f for f in firsts if f]
+    return min(firsts) if firsts else None
+
+
+def backfill(end=None):
+    """Recompute everything from the earliest source row through `end` (default today)"""
+    start = earliest_day()
+    return compute_range(start, end or date.today()) if start else 0
+
+
+def _row_days(changes):
+    """Days touched by a batch of source-table changes"""
+    today = date.today()
+    days = set()
+    ids = {}
+    for change in changes:
+        model, column = SOURCES[change.table_name]
+        if change.row_key is None or change.op == 'delete' or f'"{column}"' in (change.changed_columns or ''):
+            days.update(today - timedelta(days=n) for n in range(RECENT_DAYS))
+            if change.row_key is None or change.op == 'delete':
+                continue
+        ids.setdefault(change.table_name, set()).add(int(change.row_key))
+
+    for table, row_ids in ids.items():
+        model, column = SOURCES[table]
+        row_ids = sorted(row_ids)
+        for start in range(0, len(row_ids), 500):
+            values = db.session.query(getattr(model, column)).filter(model.id.in_(row_ids[start:start + 500])).all()
+            days.update(v.date() if isinstance(v, datetime) else v for (v,) in values if v)
+    return days
+
+
+def run():
+    """Recompute today, yesterday and every day the source tables changed on since the last run"""
+    today = date.today()
+    dirty = {today, today - timedelta(days=1)}
+    first = first_computable_day()
+
+    def compute(days):
+        # Archived days only have part of their rows left; recomputing would zero them
+        days = {d for d in days if first is None or d >= first} - dirty
+        for day in sorted(days):
+            compute_day(day)
+        dirty.update(days)
+
+    consume(CONSUMER, lambda changes: compute(_row_days(changes)), tables=list(SOURCES), limit=500)
+
+    vacated = [day for (day,) in db.session.query(VacatedDay.day).all()]
+    if vacated:
+        compute(vacated)
+        # Through the connection, so the bookkeeping delete is not itself logged as a change
+        db.session.connection().execute(VacatedDay.__table__.delete().where(VacatedDay.day.in_(vacated)))
+
+    for day in (today - timedelta(days=1), today):
+        compute_day(day)
+    db.session.commit()
+    return sorted(dirty)
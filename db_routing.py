@@ -0,0 +1,110 @@
+"""
+SAKSHI Read-Replica Routing
+Sends reads from @read_replica handlers to a replica database and everything
+else to the primary, with read-your-writes stickiness after a user commits
+
+The replica is a second SQLite file refreshed from the primary with the
+SQLite online backup API (`flask refresh-replica`, e.g. every minute from
+cron); any engine URL can be configured instead via REPLICA_DATABASE_URI.
+"""
+
+from flask import g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.orm import Session as BaseSession
+from functools import wraps
+import os
+import sqlite3
+import time
+
+REPLICA_BIND = 'replica'
+REPLICA_DATABASE_URI = os.environ.get('REPLICA_DATABASE_URI', 'sqlite:///sakshi_replica.db')
+
+# After a user's own commit, their reads stay on the primary this long
+STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 120))
+
+# Until the first refresh creates the replica file, everything reads the primary
+REPLICA_CHECK_SECONDS = 30
+
+_replica_path = None
+_replica_ready = False
+_replica_checked_at = float('-inf')
+
+
+def _replica_available():
+    global _replica_ready, _replica_checked_at
+
+    if not _replica_ready and time.monotonic() - _replica_checked_at > REPLICA_CHECK_SECONDS:
+        _replica_checked_at = time.monotonic()
+        _replica_ready = _replica_path is None or (
+            os.path.exists(_replica_path) and os.path.getsize(_replica_path) > 0
+        )
+    return _replica_ready
+
+
+def _use_replica():
+    if not has_request_context() or not g.get('read_replica'):
+        return False
+    if session.get('primary_until', 0) > time.time():
+        return False
+    return _replica_available()
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _use_replica():
+            if not (self._flushing or getattr(clause, 'is_dml', False)
+                    or self.new or self.dirty or self.deleted):
+                return self._db.engines[REPLICA_BIND]
+            # A write from a read-only handler goes to the primary, and so does
+            # the rest of the request, so it never reads behind its own write
+            g.read_replica = False
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(f):
+    """Mark a read-only handler whose queries may be served by the replica"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return f(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(BaseSession, 'after_commit')
+def _stick_to_primary(db_session):
+    if has_request_context() and 'user_id' in session:
+        session['primary_until'] = time.time() + STICKY_SECONDS
+
+
+def _sqlite_path(engine):
+    return engine.url.database if engine.url.get_backend_name() == 'sqlite' else None
+
+
+def refresh_replica(db):
+    """Copy the primary into the replica file with the online backup API"""
+    global _replica_ready
+
+    primary_path = _sqlite_path(db.engines[None])
+    replica_path = _sqlite_path(db.engines[REPLICA_BIND])
+    if not primary_path or not replica_path:
+        raise RuntimeError('refresh_replica only handles SQLite primaries and replicas')
+
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path, timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    _replica_ready = True
+
+
+def init_app(app, db):
+    global _replica_path
+
+    db.session.session_factory.class_ = RoutingSession
+
+    with app.app_context():
+        _replica_path = _sqlite_path(db.engines[REPLICA_BIND])
@@ -0,0 +1,271 @@
+"""
+SAKSHI Encounter Batches
+Batched, idempotent writes of medical records and vitals for camp and OPD
+tablets that queue encounters and flush them in one request
+
+Every item carries a client-generated idempotency key. A replayed key gets
+the stored result back instead of a second record. Reusing a key for
+different content is rejected. Valid items in a batch are written in one
+transaction; invalid ones are reported without affecting the rest.
+
+A 'record' item is a consultation and becomes a MedicalRecord. A 'vitals'
+item is a reading taken outside one (screening, triage) and is stored as a
+VitalsReading, so it never shows up as a visit in histories, search or the
+consultation metrics.
+"""
+
+from models import db, MedicalRecord, Appointment, Patient
+from sqlalchemy import update
+from datetime import datetime, timedelta
+import hashlib
+import json
+import re
+
+MAX_BATCH_SIZE = 200
+
+# Stored results are kept this long; tablets must flush queued items sooner
+IDEMPOTENCY_TTL_DAYS = 30
+
+RECORD_FIELDS = ('chief_complaint', 'diagnosis', 'symptoms', 'prescription', 'treatment_plan', 'lab_tests_ordered')
+VITAL_FIELDS = ('temperature', 'blood_pressure', 'pulse_rate', 'oxygen_saturation')
+
+# Plausible ranges; anything outside is a typo, not a reading (temperature in degrees F)
+VITAL_RANGES = {
+    'temperature': (90.0, 110.0),
+    'pulse_rate': (20, 250),
+    'oxygen_saturation': (50.0, 100.0),
+    'systolic': (60, 260),
+    'diastolic': (30, 160)
+}
+
+_BLOOD_PRESSURE = re.compile(r'^\s*(\d{2,3})\s*/\s*(\d{2,3})\s*$')
+
+
+class ItemRejected(Exception):
+    pass
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    result = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+
+
+class VitalsReading(db.Model):
+    __tablename__ = 'vitals_reading'
+    __table_args__ = (db.Index('ix_vitals_reading_patient', 'patient_id', 'taken_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey(Patient.__table__.c.id), nullable=False)
+    doctor_id = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    temperature = db.Column(db.Float)
+    blood_pressure = db.Column(db.String(10))
+    pulse_rate = db.Column(db.Integer)
+    oxygen_saturation = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+
+def parse_blood_pressure(value):
+    """'120/80' -> (120, 80); None when missing or malformed"""
+    match = _BLOOD_PRESSURE.match(value or '')
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def _in_range(name, value):
+    low, high = VITAL_RANGES[name]
+    if not low <= value <= high:
+        raise ItemRejected(f'{name} {value} is outside {low}-{high}')
+    return value
+
+
+def validate_vitals(item):
+    """Parsed vitals from an item, raising ItemRejected on anything implausible"""
+    vitals = {}
+    if item.get('temperature') not in (None, ''):
+        vitals['temperature'] = _in_range('temperature', float(item['temperature']))
+    if item.get('pulse_rate') not in (None, ''):
+        vitals['pulse_rate'] = _in_range('pulse_rate', int(item['pulse_rate']))
+    if item.get('oxygen_saturation') not in (None, ''):
+        vitals['oxygen_saturation'] = _in_range('oxygen_saturation', float(item['oxygen_saturation']))
+    if item.get('blood_pressure') not in (None, ''):
+        parsed = parse_blood_pressure(item['blood_pressure'])
+        if not parsed:
+            raise ItemRejected('blood_pressure must look like 120/80')
+        systolic, diastolic = _in_range('systolic', parsed[0]), _in_range('diastolic', parsed[1])
+        if systolic <= diastolic:
+            raise ItemRejected('systolic must be above diastolic')
+        vitals['blood_pressure'] = f'{systolic}/{diastolic}'
+    return vitals
+
+
+def _text(value):
+    """Structured fields (symptom lists, prescriptions) are stored as JSON text like the form does"""
+    return value if value is None or isinstance(value, str) else json.dumps(value)
+
+
+def _request_hash(item):
+    content = {k: v for k, v in item.items() if k != 'idempotency_key'}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _build(item, doctor, appointments, patients, claimed):
+    """Validate one item and return the record or reading to insert (or an existing record for a duplicate).
+
+    `patients` holds the ids of patients booked with the doctor; an item
+    without an appointment may only be for one of them.
+    """
+    kind = item.get('type', 'record')
+    if kind not in ('record', 'vitals'):
+        raise ItemRejected("type must be 'record' or 'vitals'")
+
+    vitals = validate_vitals(item)
+    if kind == 'vitals' and not vitals:
+        raise ItemRejected('A vitals item needs at least one reading')
+
+    appointment = None
+    if item.get('appointment_id'):
+        appointment = appointments.get(int(item['appointment_id']))
+        if appointment is None or appointment.doctor_id != doctor.id:
+            raise ItemRejected('Unknown appointment')
+        patient_id = appointment.patient_id
+    else:
+        patient_id = int(item['patient_id'])
+        if patient_id not in patients:
+            raise ItemRejected('Unknown patient')
+
+    visit_date = datetime.fromisoformat(item['visit_date']) if item.get('visit_date') else datetime.now()
+    if kind == 'vitals':
+        return VitalsReading(patient_id=patient_id, doctor_id=doctor.id, taken_at=visit_date, **vitals), 'created'
+
+    if appointment is not None:
+        existing = claimed.get(appointment.id)
+        if existing is not None:
+            return existing, 'duplicate'
+
+    record = MedicalRecord(
+        patient_id=patient_id,
+        doctor_id=doctor.id,
+        appointment_id=appointment.id if appointment is not None else None,
+        visit_date=visit_date,
+        **{f: _text(item.get(f)) for f in RECORD_FIELDS},
+        **vitals
+    )
+    if appointment is not None:
+        claimed[appointment.id] = record
+    return record, 'created'
+
+
+def _claim(appointment_id):
+    """Mark the appointment completed unless something else already did; True if this call did"""
+    return db.session.execute(update(Appointment).where(
+        Appointment.id == appointment_id,
+        Appointment.status != 'completed'
+    ).values(status='completed').execution_options(change_key=str(appointment_id))).rowcount == 1
+
+
+def write_batch(items, doctor, user_id, on_record=None):
+    """Validate and store a batch in one transaction; returns one result per item, in order.
+
+    on_record(record, appointment) runs for each new medical record (not for
+    vitals readings) before the commit, for work that must land in the same
+    transaction (search indexing, queues).
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise ItemRejected(f'At most {MAX_BATCH_SIZE} items per batch')
+
+    keys = [str(item.get('idempotency_key') or '') for item in items]
+    stored = {row.key: row for row in IdempotencyKey.query.filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key.in_([k for k in keys if k])
+    ).all()}
+
+    appointment_ids = {int(i['appointment_id']) for i in items if str(i.get('appointment_id') or '').isdigit()}
+    appointments = {a.id: a for a in Appointment.query.filter(Appointment.id.in_(appointment_ids)).all()}
+    # Items without an appointment are only accepted for the doctor's own patients
+    patient_ids = {int(i['patient_id']) for i in items if str(i.get('patient_id') or '').isdigit()}
+    patients = {p for (p,) in db.session.query(Appointment.patient_id).filter(
+        Appointment.doctor_id == doctor.id,
+        Appointment.patient_id.in_(patient_ids)
+    ).distinct()}
+
+    # Appointments that already have a record: a second submit must not create another
+    claimed = {r.appointment_id: r for r in MedicalRecord.query.filter(
+        MedicalRecord.appointment_id.in_(list(appointments))
+    ).all()}
+
+    results, pending, seen = [], [], set()
+    for key, item in zip(keys, items):
+        if not key:
+            results.append({'status': 'rejected', 'error': 'idempotency_key is required'})
+            continue
+        request_hash = _request_hash(item)
+        if key in stored:
+            if stored[key].request_hash != request_hash:
+                results.append({'idempotency_key': key, 'status': 'rejected',
+                                'error': 'idempotency_key was already used for different content'})
+            else:
+                results.append(dict(json.loads(stored[key].result), replayed=True))
+            continue
+        if key in seen:
+            results.append({'idempotency_key': key, 'status': 'rejected', 'error': 'idempotency_key repeated in batch'})
+            continue
+        seen.add(key)
+
+        try:
+            record, outcome = _build(item, doctor, appointments, patients, claimed)
+        except (ItemRejected, KeyError, ValueError, TypeError) as e:
+            results.append({'idempotency_key': key, 'status': 'rejected', 'error': str(e)})
+            continue
+
+        result = {'idempotency_key': key, 'status': outcome}
+        results.append(result)
+        pending.append((key, request_hash, record, outcome, result))
+
+    # Claim each appointment with a conditional update, as treat_patient does, so a concurrent
+    # batch or form submit with other keys cannot record the same visit twice
+    claimed_pending = []
+    for key, request_hash, record, outcome, result in pending:
+        if outcome == 'created' and getattr(record, 'appointment_id', None) is not None:
+            if not _claim(record.appointment_id):
+                existing = MedicalRecord.query.filter_by(appointment_id=record.appointment_id).first()
+                if existing is None:
+                    result.update(status='rejected', error='Appointment is already completed')
+                    continue
+                record, outcome = existing, 'duplicate'
+                result['status'] = outcome
+        claimed_pending.append((key, request_hash, record, outcome, result))
+    pending = claimed_pending
+
+    for key, request_hash, record, outcome, result in pending:
+        if outcome == 'created':
+            db.session.add(record)
+    db.session.flush()
+
+    for key, request_hash, record, outcome, result in pending:
+        if isinstance(record, VitalsReading):
+            result['reading_id'] = record.id
+        else:
+            appointment = appointments.get(record.appointment_id)
+            if outcome == 'created' and on_record:
+                on_record(record, appointment)
+            result['record_id'] = record.id
+        db.session.add(IdempotencyKey(user_id=user_id, key=key, request_hash=request_hash, result=json.dumps(result)))
+
+    db.session.commit()
+    return results
+
+
+def purge_expired(now=None):
+    cutoff = (now or datetime.now()) - timedelta(days=IDEMPOTENCY_TTL_DAYS)
+    count = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return count
@@ -0,0 +1,112 @@
+"""
+SAKSHI Fragment Cache
+A {% cache %} template tag that stores rendered blocks in a bounded LRU,
+keyed by the block name plus version stamps of the data it shows
+
+    {% cache 'admin-hospital-cards', model_version('Hospital') %}
+        ... expensive loop ...
+    {% endcache %}
+
+Version stamps change whenever any worker commits to the table, so stale
+fragments are never served; write routes also call invalidate() to free the
+memory held by superseded entries right away, passing the leading key parts
+(e.g. the doctor id) so other users' fragments stay cached
+
+    invalidate('doctor-today', appointment.doctor_id)
+
+Routes pass unexecuted queries for the data inside a block, so a cache hit
+does not run them.
+"""
+
+from flask import g
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from models import db
+from http_cache import data_versions
+from collections import OrderedDict
+import threading
+
+MAX_FRAGMENT_BYTES = 8 * 1024 * 1024
+
+
+class FragmentCache:
+
+    def __init__(self, max_bytes=MAX_FRAGMENT_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self, name, *parts):
+        """Drop the fragments of a block, or only those whose key starts with parts"""
+        prefix = (str(name),) + tuple(str(part) for part in parts)
+        with self._lock:
+            for key in [k for k in self._entries if k[:len(prefix)] == prefix]:
+                self.size -= len(self._entries.pop(key))
+
+
+fragments = FragmentCache()
+
+
+def invalidate(name, *parts):
+    fragments.invalidate(name, *parts)
+
+
+def model_version(model_name):
+    """Version stamp of a model's table, read once per request"""
+    table = db.Model.registry._class_registry[model_name].__tablename__
+    if '_data_versions' not in g:
+        g._data_versions = {}
+    if table not in g._data_versions:
+        value = data_versions([table]).get('version.' + table)
+        g._data_versions[table] = value[0] if value else 0
+    return g._data_versions[table]
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [nodes.List(parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        key = tuple(str(part) for part in parts)
+        html = fragments.get(key)
+        if html is None:
+            html = str(caller())
+            fragments.set(key, html)
+        return Markup(html)
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['model_version'] = model_version
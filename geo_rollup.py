@@ -0,0 +1,239 @@
+"""
+SAKSHI Geo Rollups
+Precomputed zone x ward x day x metric cube behind the map dashboard
+
+Daily HealthMetrics totals are stored at day grain and summed again at month
+grain, so a 365-day window reads about a dozen month rows plus the partial
+months at either end per cell instead of every day. Hospital capacity and
+active outbreaks are gauges: snapshotted once per day, and a window shows
+the latest snapshot inside it.
+
+    flask refresh-geo-rollups          # every few minutes from cron
+    flask refresh-geo-rollups --full   # after bulk imports
+"""
+
+from models import db, HealthMetrics, DiseaseOutbreak, Hospital
+from changelog import consume
+from sqlalchemy import insert, literal, select
+from datetime import date, datetime, timedelta
+
+CONSUMER = 'geo-rollup'
+WINDOWS = (30, 90, 365)
+
+# Additive metrics and the HealthMetrics column each comes from
+SUM_METRICS = {
+    'consultations': HealthMetrics.total_consultations,
+    'emergency_visits': HealthMetrics.emergency_visits,
+    'new_disease_cases': HealthMetrics.new_disease_cases,
+    'vaccinations': HealthMetrics.vaccinations_given,
+    'communicable': HealthMetrics.communicable_diseases,
+    'non_communicable': HealthMetrics.non_communicable_diseases
+}
+
+GAUGE_METRICS = ('beds_total', 'beds_available', 'icu_available', 'ventilators_available',
+                 'active_outbreaks', 'active_cases')
+
+METRICS = tuple(SUM_METRICS) + GAUGE_METRICS
+
+
+class MetricRollup(db.Model):
+    __tablename__ = 'metric_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('grain', 'metric', 'day', 'zone', 'ward_number', name='uq_metric_rollup_cell'),
+        db.Index('ix_metric_rollup_grain_day', 'grain', 'day')
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    grain = db.Column(db.String(5), nullable=False)  # day, month
+    day = db.Column(db.Date, nullable=False)  # first of the month at month grain
+    zone = db.Column(db.String(50), nullable=False)
+    ward_number = db.Column(db.Integer)
+    metric = db.Column(db.String(30), nullable=False)
+    value = db.Column(db.Float, nullable=False)
+
+
+_columns = ('grain', 'day', 'zone', 'ward_number', 'metric', 'value')
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _rebuild_days(days=None):
+    """Recompute day-grain sums from HealthMetrics, for the given days or all of them"""
+    table = MetricRollup.__table__
+    delete = table.delete().where(table.c.grain == 'day', table.c.metric.in_(SUM_METRICS))
+    if days is not None:
+        delete = delete.where(table.c.day.in_(days))
+    db.session.execute(delete)
+
+    for metric, column in SUM_METRICS.items():
+        query = select(
+            literal('day'), HealthMetrics.date, HealthMetrics.zone, HealthMetrics.ward_number,
+            literal(metric), db.func.sum(column)
+        ).group_by(HealthMetrics.date, HealthMetrics.zone, HealthMetrics.ward_number)
+        if days is not None:
+            query = query.where(HealthMetrics.date.in_(days))
+        db.session.execute(insert(table).from_select(_columns, query))
+
+
+def _rebuild_months(months=None):
+    """Re-sum month rows from day rows, for the given month starts or all of them"""
+    table = MetricRollup.__table__
+    delete = table.delete().where(table.c.grain == 'month')
+    day_rows = select(
+        literal('month'), db.func.date(table.c.day, 'start of month').label('month'),
+        table.c.zone, table.c.ward_number, table.c.metric, db.func.sum(table.c.value)
+    ).where(table.c.grain == 'day', table.c.metric.in_(SUM_METRICS))
+
+    if months is not None:
+        delete = delete.where(table.c.day.in_(months))
+        day_rows = day_rows.where(db.or_(*[
+            db.and_(table.c.day >= m, table.c.day < _next_month(m)) for m in months
+        ]))
+
+    db.session.execute(delete)
+    db.session.execute(insert(table).from_select(
+        _columns, day_rows.group_by('month', table.c.zone, table.c.ward_number, table.c.metric)
+    ))
+
+
+def snapshot_gauges(today=None):
+    """Record today's capacity and outbreak gauges per zone and ward"""
+    today = today or date.today()
+    table = MetricRollup.__table__
+    db.session.execute(table.delete().where(
+        table.c.grain == 'day', table.c.day == today, table.c.metric.in_(GAUGE_METRICS)
+    ))
+
+    capacity = {
+        'beds_total': Hospital.total_beds,
+        'beds_available': Hospital.available_beds,
+        'icu_available': Hospital.available_icu_beds,
+        'ventilators_available': Hospital.available_ventilators
+    }
+    for metric, column in capacity.items():
+        db.session.execute(insert(table).from_select(_columns, select(
+            literal('day'), literal(today), Hospital.zone, Hospital.ward_number,
+            literal(metric), db.func.sum(column)
+        ).group_by(Hospital.zone, Hospital.ward_number)))
+
+    active = DiseaseOutbreak.outbreak_status == 'active'
+    for metric, aggregate in (('active_outbreaks', db.func.count(DiseaseOutbreak.id)),
+                              ('active_cases', db.func.sum(DiseaseOutbreak.active_cases))):
+        db.session.execute(insert(table).from_select(_columns, select(
+            literal('day'), literal(today), DiseaseOutbreak.zone, DiseaseOutbreak.ward_number,
+            literal(metric), aggregate
+        ).where(active).group_by(DiseaseOutbreak.zone, DiseaseOutbreak.ward_number)))
+
+
+def refresh_days(days):
+    """Recompute the rollups for specific days (and their months) in the caller's transaction"""
+    days = sorted(set(days))
+    if days:
+        _rebuild_days(days)
+        _rebuild_months(sorted({_month_start(d) for d in days}))
+
+
+def rebuild_all():
+    """Recompute every rollup in the caller's transaction"""
+    _rebuild_days()
+    _rebuild_months()
+    snapshot_gauges()
+
+
+def _refresh_batch(changes):
+    """Apply one batch of HealthMetrics changes; runs in the same transaction that saves the cursor"""
+    ids, days = set(), set()
+    for change in changes:
+        # Bulk writes scoped to one day say so (see daily_metrics)
+        if change.row_key and change.row_key.startswith('date='):
+            days.add(parse_day(change.row_key[5:]))
+            continue
+        # Deletes, other bulk writes and moved dates hide which day the row used to be on
+        if change.row_key is None or change.op == 'delete' or '"date"' in (change.changed_columns or ''):
+            rebuild_all()
+            return
+        ids.add(int(change.row_key))
+
+    if ids:
+        days.update(d for (d,) in db.session.query(HealthMetrics.date).filter(HealthMetrics.id.in_(ids)).distinct())
+    refresh_days(days)
+
+
+def refresh(full=False):
+    """Bring rollups up to date with HealthMetrics changes since the last run"""
+    tables = [HealthMetrics.__tablename__]
+    if full:
+        # Move the cursor first, so changes made during the rebuild are picked up next run
+        consume(CONSUMER, lambda changes: None, tables=tables)
+        rebuild_all()
+    else:
+        consume(CONSUMER, _refresh_batch, tables=tables, limit=500)
+        snapshot_gauges()
+    db.session.commit()
+
+
+def _window_filter(table, start, end):
+    """Month rows for whole months inside [start, end], day rows for the ragged ends"""
+    first_full = start if start.day == 1 else _next_month(start)
+    after_full = _month_start(end + timedelta(days=1))
+
+    in_days = db.and_(table.c.grain == 'day', table.c.day >= start, table.c.day <= end)
+    if first_full >= after_full:
+        return in_days
+    return db.or_(
+        db.and_(table.c.grain == 'month', table.c.day >= first_full, table.c.day < after_full),
+        db.and_(in_days, db.or_(table.c.day < first_full, table.c.day >= after_full))
+    )
+
+
+def geo_summary(start, end):
+    """Per-zone and per-ward metric values for a date window, as compact value arrays"""
+    table = MetricRollup.__table__
+
+    sums = db.session.execute(select(
+        table.c.zone, table.c.ward_number, table.c.metric, db.func.sum(table.c.value)
+    ).where(
+        table.c.metric.in_(SUM_METRICS), _window_filter(table, start, end)
+    ).group_by(table.c.zone, table.c.ward_number, table.c.metric)).all()
+
+    # The latest snapshot inside the window; a window before the first snapshot has no gauges
+    gauge_day = db.session.execute(select(db.func.max(table.c.day)).where(
+        table.c.grain == 'day', table.c.metric.in_(GAUGE_METRICS), table.c.day >= start, table.c.day <= end
+    )).scalar()
+    gauges = db.session.execute(select(
+        table.c.zone, table.c.ward_number, table.c.metric, table.c.value
+    ).where(
+        table.c.grain == 'day', table.c.day == gauge_day, table.c.metric.in_(GAUGE_METRICS)
+    )).all() if gauge_day else []
+
+    index = {metric: i for i, metric in enumerate(METRICS)}
+    zones = {}
+    for zone, ward, metric, value in list(sums) + list(gauges):
+        entry = zones.setdefault(zone, {'values': [0] * len(METRICS), 'wards': {}})
+        entry['values'][index[metric]] += value or 0
+        if ward is not None:
+            ward_values = entry['wards'].setdefault(str(ward), [0] * len(METRICS))
+            ward_values[index[metric]] += value or 0
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'gauges_as_of': gauge_day.isoformat() if isinstance(gauge_day, date) else gauge_day,
+        'metrics': list(METRICS),
+        'zones': zones
+    }
+
+
+def window_bounds(days, end=None):
+    end = end or date.today()
+    return end - timedelta(days=days - 1), end
+
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
@@ -0,0 +1,27 @@
+"""
+SAKSHI Gunicorn Profile
+Threaded workers sized to the host; override any value with the matching
+environment variable
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+# Each worker runs the lock-guarded initialization itself
+preload_app = False
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to cap memory growth from in-process caches
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,181 @@
+"""
+SAKSHI HTTP Caching
+Per-table data version counters, conditional GET (weak ETag / Last-Modified
+-> 304) for views that declare which tables they read, and response
+compression above a size threshold
+"""
+
+from flask import request, session, make_response
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from counters import StatCounter
+from datetime import datetime, timezone
+from functools import wraps
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_TYPES = ('text/html', 'application/json', 'text/css', 'application/javascript', 'text/plain')
+
+VERSION_PREFIX = 'version.'
+
+# Deploy identity mixed into every ETag, so new templates or view code invalidate cached pages.
+# Set BUILD_ID (e.g. the git sha) to skip hashing the source tree at startup.
+BUILD_ID = os.environ.get('BUILD_ID')
+_build = {'id': BUILD_ID or '', 'time': None}
+_UNVERSIONED = {StatCounter.__tablename__}
+
+
+def _table_names(model_or_name):
+    return model_or_name if isinstance(model_or_name, str) else model_or_name.__tablename__
+
+
+def _bump_versions(db_session, tables):
+    """Increment version counters inside the writer's own transaction"""
+    now = datetime.now()
+    # A DML clause makes the routing session hand out the primary's connection
+    connection = db_session.connection(bind_arguments={'clause': insert(StatCounter.__table__)})
+    for table in sorted(tables - _UNVERSIONED):
+        statement = insert(StatCounter.__table__).values(name=VERSION_PREFIX + table, value=1, updated_at=now)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'value': StatCounter.__table__.c.value + 1, 'updated_at': now}
+        ))
+
+
+@event.listens_for(Session, 'after_flush')
+def _version_flushed_tables(db_session, flush_context):
+    changed = list(db_session.new) + list(db_session.deleted)
+    changed += [obj for obj in db_session.dirty if db_session.is_modified(obj)]
+    tables = {obj.__table__.name for obj in changed if hasattr(obj, '__table__')}
+    if tables:
+        _bump_versions(db_session, tables)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _version_bulk_writes(orm_execute_state):
+    """query.update()/update() statements bypass flush, so catch them here"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            _bump_versions(orm_execute_state.session, {table.name})
+
+
+def data_versions(tables):
+    names = [VERSION_PREFIX + table for table in tables]
+    rows = StatCounter.query.filter(StatCounter.name.in_(names)).all()
+    return {row.name: (row.value, row.updated_at) for row in rows}
+
+
+def conditional(*models):
+    """Answer 304 when none of the tables the view reads have changed.
+
+    The ETag is built from the tables' version counters plus the user and
+    URL, so no body needs to be rendered or hashed to validate a request.
+    """
+    tables = sorted(_table_names(m) for m in models)
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages are rendered once; never serve them from cache
+            if request.method != 'GET' or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            versions = data_versions(tables)
+            stamp = '|'.join(f'{t}={versions.get(VERSION_PREFIX + t, (0, None))[0]}' for t in tables)
+            key = f'{_build["id"]}|{stamp}|{session.get("user_id")}|{request.full_path}'
+            etag = hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+            updated = [u for _, u in versions.values() if u]
+            if _build['time']:
+                updated.append(_build['time'])
+            last_modified = max(updated).replace(microsecond=0).astimezone(timezone.utc) if updated else None
+
+            if request.if_none_match.contains_weak(etag):
+                not_modified = True
+            elif not request.if_none_match and last_modified and request.if_modified_since:
+                not_modified = last_modified <= request.if_modified_since
+            else:
+                not_modified = False
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def preferred_encoding(available):
+    """Best of the available encodings the client accepts with q > 0 (None for identity)
+
+    Ties keep the order of `available`, so list the better codec first.
+    """
+    accepted = request.accept_encodings
+    ranked = [(accepted.quality(encoding), -i, encoding) for i, encoding in enumerate(available)]
+    ranked = [r for r in ranked if r[0] > 0]
+    return max(ranked)[2] if ranked else None
+
+
+def _compress(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = preferred_encoding(('br', 'gzip') if brotli else ('gzip',))
+    if encoding == 'br':
+        body = brotli.compress(data, quality=5)
+    elif encoding == 'gzip':
+        body = gzip.compress(data, compresslevel=6)
+    else:
+        response.vary.add('Accept-Encoding')
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def build_fingerprint(app):
+    """(hash, newest mtime) of the app's Python modules, templates and asset manifest"""
+    paths = [os.path.join(app.root_path, name) for name in os.listdir(app.root_path) if name.endswith('.py')]
+    for root, dirs, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        paths.extend(os.path.join(root, name) for name in files)
+    manifest = os.path.join(app.static_folder, 'dist', 'manifest.json')
+    if os.path.exists(manifest):
+        paths.append(manifest)
+
+    digest, newest = hashlib.blake2b(digest_size=8), 0.0
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            digest.update(os.path.relpath(path, app.root_path).encode() + b'\0' + f.read())
+        newest = max(newest, os.path.getmtime(path))
+    return digest.hexdigest(), datetime.fromtimestamp(newest)
+
+
+def init_app(app):
+    if BUILD_ID:
+        _build['id'], _build['time'] = BUILD_ID, datetime.now()
+    else:
+        _build['id'], _build['time'] = build_fingerprint(app)
+    app.after_request(_compress)
@@ -5,6 +5,15 @@ Creates database schema and populates with realistic sample data
 
 from app import app, db
 from models import *
+from inventory import rebuild_availability
+from security import hash_password
+import search
+import vaccination
+import geo_rollup
+import daily_metrics
+import vitals_store
+import schema
+from functools import lru_cache
 from datetime import datetime, timedelta
 import random
 import json
@@ -14,6 +23,7 @@ def init_database():
     
     with app.app_context():
         # Drop all tables and recreate
+        db.session.execute(db.text('DROP TABLE IF EXISTS schema_version'))
         db.drop_all()
         db.create_all()
         
@@ -46,6 +56,7 @@ def init_database():
         # 7. Create Medicine Stock
         medicines = create_medicine_stock(hospitals)
         print(f"✓ Created {len(medicines)} medicine stock entries")
+        rebuild_availability()
         
         # 8. Create Vaccination Campaigns
         campaigns = create_vaccination_campaigns()
@@ -55,11 +66,16 @@ def init_database():
         alerts = create_health_alerts()
         print(f"✓ Created {len(alerts)} health alerts")
         
-        # 10. Create Health Metrics
-        metrics = create_health_metrics()
-        print(f"✓ Created {len(metrics)} health metric entries")
-        
         db.session.commit()
+        
+        # 10. Derive Health Metrics from the visits above
+        print(f"✓ Computed health metrics for {daily_metrics.backfill()} days")
+        
+        print(f"✓ Indexed {search.rebuild_index()} medical records for search")
+        vaccination.rebuild_counters()
+        geo_rollup.refresh(full=True)
+        vitals_store.refresh(full=True)
+        schema.stamp()
         print("\n✅ Database initialization completed successfully!")
         print(f"\n🔑 Admin Login Credentials:")
         print(f"   Username: admin")
@@ -165,6 +181,11 @@ def create_hospitals():
     db.session.flush()
     return hospitals
 
+@lru_cache(maxsize=None)
+def seed_password_hash(password):
+    """Hash each sample password once; synthetic accounts sharing it share the hash"""
+    return hash_password(password)
+
 def create_users(hospitals):
     """Create admin, doctors, and patients"""
     
@@ -175,7 +196,7 @@ def create_users(hospitals):
         user_type='admin',
         phone='9876543210'
     )
-    admin.set_password('admin123')
+    admin.password_hash = seed_password_hash('admin123')
     db.session.add(admin)
     
     # Doctors
@@ -240,7 +261,7 @@ def create_users(hospitals):
             user_type='doctor',
             phone=d_data['phone']
         )
-        user.set_password('doctor123')
+        user.password_hash = seed_password_hash('doctor123')
         db.session.add(user)
         db.session.flush()
         
@@ -269,7 +290,7 @@ def create_users(hospitals):
             user_type='patient',
             phone=f'98765432{16+i}'
         )
-        user.set_password('patient123')
+        user.password_hash = seed_password_hash('patient123')
         db.session.add(user)
         db.session.flush()
         
@@ -637,32 +658,6 @@ def create_health_alerts():
     db.session.flush()
     return alerts
 
-def create_health_metrics():
-    """Create daily health metrics"""
-    zones = ['Zone A', 'Zone B', 'Zone C', 'Zone D', 'Zone E']
-    metrics = []
-    
-    for days_ago in range(30):  # Last 30 days
-        date = datetime.now().date() - timedelta(days=days_ago)
-        
-        for zone in zones:
-            metric = HealthMetrics(
-                date=date,
-                zone=zone,
-                ward_number=random.randint(1, 10),
-                total_consultations=random.randint(50, 200),
-                emergency_visits=random.randint(5, 30),
-                new_disease_cases=random.randint(0, 10),
-                vaccinations_given=random.randint(10, 100),
-                communicable_diseases=random.randint(0, 5),
-                non_communicable_diseases=random.randint(2, 15)
-            )
-            db.session.add(metric)
-            metrics.append(metric)
-    
-    db.session.flush()
-    return metrics
-
 if __name__ == '__main__':
     print("🏥 SAKSHI Database Initialization")
     print("=" * 50)
@@ -0,0 +1,157 @@
+"""
+SAKSHI Medicine Inventory
+Expiry tracking, quarantine sweep and aggregate stock for MedicineStock batches
+"""
+
+from models import db, Hospital, MedicineStock
+from datetime import datetime, timedelta
+
+# Near-expiry bands shown on the admin medicine page (days from today)
+EXPIRY_WINDOWS = (30, 60, 90)
+
+# Lets near-expiry and sweep queries seek on (hospital, expiry) instead of scanning
+db.Index('ix_medicine_stock_hospital_expiry', MedicineStock.hospital_id, MedicineStock.expiry_date)
+db.Index('ix_medicine_stock_status_expiry', MedicineStock.stock_status, MedicineStock.expiry_date)
+
+
+class MedicineAvailability(db.Model):
+    """Usable (non-expired) quantity per hospital and medicine, kept incrementally"""
+    __tablename__ = 'medicine_availability'
+    __table_args__ = (db.UniqueConstraint('hospital_id', 'medicine_name'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    hospital_id = db.Column(db.Integer, db.ForeignKey(Hospital.__table__.c.id), nullable=False, index=True)
+    medicine_name = db.Column(db.String(200), nullable=False)
+    available_quantity = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+def _adjust_availability(hospital_id, medicine_name, delta):
+    """Add delta to the aggregate row, creating it on first use"""
+    updated = MedicineAvailability.query.filter_by(
+        hospital_id=hospital_id,
+        medicine_name=medicine_name
+    ).update({
+        MedicineAvailability.available_quantity: MedicineAvailability.available_quantity + delta,
+        MedicineAvailability.updated_at: datetime.now()
+    }, synchronize_session=False)
+
+    if not updated:
+        db.session.add(MedicineAvailability(
+            hospital_id=hospital_id,
+            medicine_name=medicine_name,
+            available_quantity=delta
+        ))
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.min.time())
+
+
+def days_until(expiry, now=None):
+    """Whole days from now to an expiry given as a date or datetime"""
+    return (_as_datetime(expiry) - (now or datetime.now())).days
+
+
+def is_expired(medicine, now=None):
+    now = now or datetime.now()
+    return medicine.expiry_date is not None and _as_datetime(medicine.expiry_date) < now
+
+
+def record_batch(medicine, now=None):
+    """Count a newly added batch toward availability, or quarantine it if already expired"""
+    if is_expired(medicine, now):
+        medicine.stock_status = 'expired'
+        return
+    _adjust_availability(int(medicine.hospital_id), medicine.medicine_name, medicine.quantity or 0)
+
+
+def set_batch_quantity(medicine, quantity):
+    """Change a batch's on-hand quantity (e.g. after dispensing) and carry the difference to availability"""
+    delta = quantity - (medicine.quantity or 0)
+    medicine.quantity = quantity
+    if delta and medicine.stock_status != 'expired':
+        _adjust_availability(int(medicine.hospital_id), medicine.medicine_name, delta)
+
+
+def sweep_expired(now=None):
+    """Quarantine batches past their expiry date and deduct them from availability.
+
+    Only batches not yet marked expired are touched, so repeated runs are cheap
+    and never deduct the same batch twice.
+    """
+    now = now or datetime.now()
+
+    expired = MedicineStock.query.filter(
+        MedicineStock.stock_status != 'expired',
+        MedicineStock.expiry_date != None,
+        MedicineStock.expiry_date < now
+    ).all()
+
+    for medicine in expired:
+        medicine.stock_status = 'expired'
+        _adjust_availability(medicine.hospital_id, medicine.medicine_name, -(medicine.quantity or 0))
+
+    db.session.commit()
+    return len(expired)
+
+
+def rebuild_availability():
+    """Recompute every aggregate row from the batch table (seeding and repair only)"""
+    MedicineAvailability.query.delete()
+
+    totals = db.session.query(
+        MedicineStock.hospital_id,
+        MedicineStock.medicine_name,
+        db.func.sum(MedicineStock.quantity)
+    ).filter(
+        MedicineStock.stock_status != 'expired'
+    ).group_by(MedicineStock.hospital_id, MedicineStock.medicine_name).all()
+
+    for hospital_id, medicine_name, quantity in totals:
+        db.session.add(MedicineAvailability(
+            hospital_id=hospital_id,
+            medicine_name=medicine_name,
+            available_quantity=quantity or 0
+        ))
+
+    db.session.flush()
+    return len(totals)
+
+
+def availability(hospital_id=None):
+    """Aggregate usable quantity rows, per hospital then medicine"""
+    query = MedicineAvailability.query
+    if hospital_id:
+        query = query.filter(MedicineAvailability.hospital_id == hospital_id)
+    return query.order_by(MedicineAvailability.hospital_id, MedicineAvailability.medicine_name).all()
+
+
+def near_expiry(hospital_id=None, days=EXPIRY_WINDOWS[-1], now=None):
+    """Non-expired batches whose expiry falls within the next `days` days"""
+    now = now or datetime.now()
+
+    query = MedicineStock.query.filter(
+        MedicineStock.stock_status != 'expired',
+        MedicineStock.expiry_date >= now,
+        MedicineStock.expiry_date < now + timedelta(days=days)
+    )
+    if hospital_id:
+        query = query.filter(MedicineStock.hospital_id == hospital_id)
+
+    return query.order_by(MedicineStock.expiry_date).all()
+
+
+def expiry_buckets(hospital_id=None, now=None):
+    """Group near-expiry batches into EXPIRY_WINDOWS bands, e.g. {30: [...], 60: [...], 90: [...]}"""
+    now = now or datetime.now()
+    buckets = {window: [] for window in EXPIRY_WINDOWS}
+
+    for medicine in near_expiry(hospital_id, EXPIRY_WINDOWS[-1], now):
+        days_left = days_until(medicine.expiry_date, now)
+        window = next(w for w in EXPIRY_WINDOWS if days_left < w)
+        buckets[window].append(medicine)
+
+    return buckets
@@ -0,0 +1,136 @@
+"""
+SAKSHI Equipment Maintenance Scheduler
+Builds per-hospital maintenance work lists from an indexed due-date query and
+escalates overdue critical-care equipment
+"""
+
+from models import db, Equipment
+from counters import get_counter, seed_counter, increment_counter
+from datetime import datetime, timedelta
+import heapq
+
+# Equipment types whose overdue service puts patients at risk
+CRITICAL_EQUIPMENT_TYPES = ('Life Support', 'Emergency', 'Respiratory')
+
+# How far ahead the work lists look
+WORK_LIST_HORIZON_DAYS = 7
+
+# Default service interval when maintenance is signed off
+MAINTENANCE_INTERVAL_DAYS = 90
+
+CRITICAL_COUNTER = 'equipment.critical'
+
+db.Index('ix_equipment_next_maintenance', Equipment.next_maintenance_date)
+db.Index('ix_equipment_hospital_next_maintenance', Equipment.hospital_id, Equipment.next_maintenance_date)
+db.Index('ix_equipment_health_status', Equipment.health_status)
+
+
+def _priority(equipment, now):
+    """Lower sorts first: overdue critical-care, then other overdue, then upcoming"""
+    overdue = equipment.next_maintenance_date < now
+    if overdue and equipment.equipment_type in CRITICAL_EQUIPMENT_TYPES:
+        return 0
+    return 1 if overdue else 2
+
+
+def work_lists(hospital_id=None, horizon_days=WORK_LIST_HORIZON_DAYS, now=None):
+    """Per-hospital maintenance queues for everything due within the horizon.
+
+    Returns {hospital_id: {'overdue': [...], 'due': [...]}}, each list ordered
+    by priority then due date. Only rows inside the due-date range are read.
+    """
+    now = now or datetime.now()
+
+    query = Equipment.query.filter(
+        Equipment.next_maintenance_date != None,
+        Equipment.next_maintenance_date < now + timedelta(days=horizon_days)
+    )
+    if hospital_id:
+        query = query.filter(Equipment.hospital_id == hospital_id)
+
+    heaps = {}
+    for equipment in query.all():
+        heapq.heappush(heaps.setdefault(equipment.hospital_id, []), (
+            _priority(equipment, now),
+            equipment.next_maintenance_date,
+            equipment.id,
+            equipment
+        ))
+
+    lists = {}
+    for h_id, heap in heaps.items():
+        queue = {'overdue': [], 'due': []}
+        while heap:
+            priority, due_date, _, equipment = heapq.heappop(heap)
+            queue['overdue' if priority < 2 else 'due'].append(equipment)
+        lists[h_id] = queue
+
+    return lists
+
+
+def escalate_overdue(now=None):
+    """Mark overdue critical-care equipment as critical and bump the dashboard counter"""
+    now = now or datetime.now()
+    seed_critical_count()
+
+    overdue = Equipment.query.filter(
+        Equipment.next_maintenance_date < now,
+        Equipment.equipment_type.in_(CRITICAL_EQUIPMENT_TYPES),
+        Equipment.health_status != 'critical'
+    ).all()
+
+    for equipment in overdue:
+        equipment.health_status = 'critical'
+
+    if overdue:
+        increment_counter(CRITICAL_COUNTER, len(overdue))
+
+    db.session.commit()
+    return len(overdue)
+
+
+def complete_maintenance(equipment, now=None):
+    """Sign off a service visit and schedule the next one"""
+    now = now or datetime.now()
+
+    if equipment.health_status == 'critical':
+        seed_critical_count()
+        increment_counter(CRITICAL_COUNTER, -1)
+
+    equipment.last_maintenance_date = now
+    equipment.next_maintenance_date = now + timedelta(days=MAINTENANCE_INTERVAL_DAYS)
+    equipment.health_status = 'good'
+
+
+def track_health_change(old_status, new_status):
+    """Keep the critical counter in step when a route changes health_status directly.
+
+    Call before the new status is added to the session so a first-time seed
+    count does not include it twice.
+    """
+    if old_status == new_status:
+        return
+    if new_status == 'critical' or old_status == 'critical':
+        seed_critical_count()
+        increment_counter(CRITICAL_COUNTER, 1 if new_status == 'critical' else -1)
+
+
+def seed_critical_count():
+    """Create the counter from a full count on first use, before a writer adjusts it.
+
+    Runs in the caller's transaction and never commits; INSERT OR IGNORE lets
+    two workers seed at once without a duplicate key.
+    """
+    if get_counter(CRITICAL_COUNTER) is None:
+        seed_counter(CRITICAL_COUNTER, Equipment.query.filter_by(health_status='critical').count())
+
+
+def critical_equipment_count():
+    """Dashboard figure: the maintained counter, or a live count until a writer has seeded it.
+
+    Read-only, so it is safe in replica-routed handlers.
+    """
+    count = get_counter(CRITICAL_COUNTER)
+    if count is None:
+        count = Equipment.query.filter_by(health_status='critical').count()
+    return count
@@ -0,0 +1,303 @@
+"""
+SAKSHI Request Profiler
+Opt-in sampling profiler: while a request runs, a background thread samples
+its stack every few milliseconds and its SQL is timed. The profile is kept
+only if the request was slow or picked by the sample rate, together with
+the route, SQL statistics and the folded stacks behind the flame graph at
+/admin/profiles.
+
+Enabled by environment, off by default; when off nothing is registered, so
+requests pay nothing:
+
+    PROFILE_SLOW_MS=800        # keep profiles of requests slower than this
+    PROFILE_SAMPLE_RATE=0.01   # and/or of this fraction of all requests
+    PROFILE_INTERVAL_MS=5      # stack sampling interval
+"""
+
+from flask import request, current_app
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from models import db
+from collections import Counter
+from datetime import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+SLOW_MS = float(os.environ['PROFILE_SLOW_MS']) if os.environ.get('PROFILE_SLOW_MS') else None
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+
+# Profiles kept; older ones are dropped as new ones are stored
+KEEP_PROFILES = int(os.environ.get('PROFILE_KEEP', 500))
+
+MAX_DEPTH = 64
+TOP_STATEMENTS = 10
+
+# Flame graph boxes narrower than this share of the samples are left out
+MIN_BOX_FRACTION = 0.005
+
+
+class RequestProfile(db.Model):
+    __tablename__ = 'request_profile'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    endpoint = db.Column(db.String(100), index=True)
+    method = db.Column(db.String(10))
+    path = db.Column(db.String(500))
+    status_code = db.Column(db.Integer)
+    reason = db.Column(db.String(10))  # slow, sampled
+    duration_ms = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    interval_ms = db.Column(db.Float, nullable=False)
+    sql_count = db.Column(db.Integer, nullable=False)
+    sql_ms = db.Column(db.Float, nullable=False)
+    sql_top = db.Column(db.Text)  # JSON [[statement, count, ms], ...]
+    stacks = db.Column(db.Text)  # JSON [["root;...;leaf", samples], ...]
+
+
+class _Capture:
+    __slots__ = ('started', 'sampled', 'status_code', 'stacks', 'samples', 'sql_count', 'sql_seconds', 'statements')
+
+    def __init__(self, sampled):
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.status_code = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements = {}  # statement -> [count, seconds]
+
+
+_active = {}   # thread id -> _Capture for requests being profiled
+_labels = {}   # code object -> 'module:function'
+_wake = threading.Event()
+_sampler = None
+_sampler_pid = None
+_start_lock = threading.Lock()
+
+
+def enabled():
+    return SLOW_MS is not None or SAMPLE_RATE > 0
+
+
+def _label(frame):
+    code = frame.f_code
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{frame.f_globals.get('__name__', '?')}:{code.co_name}"
+    return label
+
+
+def _stack(frame):
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def _sample_forever():
+    interval = INTERVAL_MS / 1000
+    while True:
+        if not _active:
+            _wake.clear()
+            # Re-check after clearing, so a request that registered in between is not missed
+            if not _active:
+                _wake.wait()
+        time.sleep(interval)
+
+        frames = sys._current_frames()
+        for thread_id, capture in list(_active.items()):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                capture.stacks[_stack(frame)] += 1
+                capture.samples += 1
+
+
+def _ensure_sampler():
+    """Start the sampler thread in this process (again after a worker fork)"""
+    global _sampler, _sampler_pid
+    if _sampler_pid == os.getpid() and _sampler.is_alive():
+        return
+    with _start_lock:
+        if _sampler_pid != os.getpid() or not _sampler.is_alive():
+            _sampler = threading.Thread(target=_sample_forever, name='request-profiler', daemon=True)
+            _sampler.start()
+            _sampler_pid = os.getpid()
+
+
+def _start_request():
+    sampled = SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+    if SLOW_MS is None and not sampled:
+        return
+    _ensure_sampler()
+    _active[threading.get_ident()] = _Capture(sampled)
+    _wake.set()
+
+
+def _note_status(response):
+    capture = _active.get(threading.get_ident())
+    if capture is not None:
+        if response.is_streamed:
+            # Event streams are long by design and mostly idle; their duration says nothing
+            _active.pop(threading.get_ident(), None)
+        else:
+            capture.status_code = response.status_code
+    return response
+
+
+def _finish_request(exc=None):
+    capture = _active.pop(threading.get_ident(), None)
+    if capture is None:
+        return
+    duration_ms = (time.perf_counter() - capture.started) * 1000
+    slow = SLOW_MS is not None and duration_ms >= SLOW_MS
+    if slow or capture.sampled:
+        # End the request's transaction first (the app context teardown would roll it back anyway),
+        # or uncommitted writes from a failed request keep the insert waiting on SQLite's lock
+        db.session.remove()
+        _store(capture, duration_ms, 'slow' if slow else 'sampled', 500 if exc is not None else capture.status_code)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context, so a failed statement leaves nothing behind
+    if context is not None and threading.get_ident() in _active:
+        context._profiler_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    capture = _active.get(threading.get_ident())
+    started = getattr(context, '_profiler_started', None)
+    if capture is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    capture.sql_count += 1
+    capture.sql_seconds += elapsed
+    stats = capture.statements.setdefault(' '.join(statement.split())[:300], [0, 0.0])
+    stats[0] += 1
+    stats[1] += elapsed
+
+
+def _store(capture, duration_ms, reason, status_code):
+    """Write the profile on its own connection, outside the request's session and transaction"""
+    top = sorted(capture.statements.items(), key=lambda item: item[1][1], reverse=True)[:TOP_STATEMENTS]
+    values = {
+        'created_at': datetime.now(),
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.full_path[:500],
+        'status_code': status_code,
+        'reason': reason,
+        'duration_ms': round(duration_ms, 1),
+        'samples': capture.samples,
+        'interval_ms': INTERVAL_MS,
+        'sql_count': capture.sql_count,
+        'sql_ms': round(capture.sql_seconds * 1000, 1),
+        'sql_top': json.dumps([[statement, count, round(seconds * 1000, 1)] for statement, (count, seconds) in top]),
+        'stacks': json.dumps(capture.stacks.most_common())
+    }
+    table = RequestProfile.__table__
+    try:
+        with db.engine.begin() as conn:
+            profile_id = conn.execute(insert(table).values(**values)).inserted_primary_key[0]
+            conn.execute(table.delete().where(table.c.id <= profile_id - KEEP_PROFILES))
+    except Exception:
+        # Losing a profile must never fail the request it describes
+        current_app.logger.exception('Could not store request profile')
+
+
+def init_app(app):
+    if not enabled():
+        return
+    app.before_request(_start_request)
+    app.after_request(_note_status)
+    app.teardown_request(_finish_request)
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+# ==================== REPORTS ====================
+
+def route_summary():
+    """Stored profiles per route: count, mean and worst duration"""
+    rows = db.session.query(
+        RequestProfile.endpoint,
+        db.func.count(RequestProfile.id),
+        db.func.avg(RequestProfile.duration_ms),
+        db.func.max(RequestProfile.duration_ms),
+        db.func.avg(RequestProfile.sql_ms)
+    ).group_by(RequestProfile.endpoint).order_by(db.func.max(RequestProfile.duration_ms).desc()).all()
+    return [{
+        'endpoint': endpoint,
+        'profiles': count,
+        'avg_ms': round(avg or 0, 1),
+        'max_ms': round(worst or 0, 1),
+        'avg_sql_ms': round(sql or 0, 1)
+    } for endpoint, count, avg, worst, sql in rows]
+
+
+def top_functions(stacks, limit=30):
+    """Functions by samples spent in them (self) and under them (total)"""
+    own, total = Counter(), Counter()
+    for stack, count in stacks:
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+
+    samples = sum(count for _, count in stacks) or 1
+    return [{
+        'function': function,
+        'self': own[function],
+        'total': count,
+        'self_pct': round(100 * own[function] / samples, 1),
+        'total_pct': round(100 * count / samples, 1)
+    } for function, count in sorted(total.items(), key=lambda item: (own[item[0]], item[1]), reverse=True)[:limit]]
+
+
+def flame_boxes(stacks):
+    """Flame graph boxes (depth, left and width as shares of all samples) for the template to draw"""
+    root = {}
+    for stack, count in stacks:
+        node = root
+        for frame in stack.split(';'):
+            entry = node.setdefault(frame, [0, {}])
+            entry[0] += count
+            node = entry[1]
+
+    samples = sum(count for _, count in stacks) or 1
+    boxes = []
+
+    def walk(children, depth, left):
+        for frame, (count, grandchildren) in sorted(children.items()):
+            width = count / samples
+            if width >= MIN_BOX_FRACTION:
+                boxes.append({'depth': depth, 'left': left, 'width': width, 'label': frame, 'samples': count})
+                walk(grandchildren, depth + 1, left)
+            left += width
+
+    walk(root, 0, 0.0)
+    return boxes
+
+
+def report(profile):
+    stacks = json.loads(profile.stacks or '[]')
+    boxes = flame_boxes(stacks)
+    return {
+        'profile': profile,
+        'sql_top': json.loads(profile.sql_top or '[]'),
+        'functions': top_functions(stacks),
+        'boxes': boxes,
+        'depth': max((b['depth'] for b in boxes), default=-1) + 1
+    }
+
+
+def folded(profile):
+    """Stacks in the folded text format read by flamegraph.pl and speedscope"""
+    return ''.join(f'{stack} {count}\n' for stack, count in json.loads(profile.stacks or '[]'))
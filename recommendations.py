@@ -0,0 +1,221 @@
+"""
+SAKSHI Booking Recommendations
+Suggests doctors at booking time by combining each doctor's queue (scheduled
+appointments per slot), their hospital's bed occupancy and the distance from
+the patient's ward or zone
+
+Queues live in memory. Each worker loads them once, then applies appointment
+changes from the change log every few seconds, re-reading only the rows
+that changed. The booking worker also applies its own bookings immediately.
+"""
+
+from models import db, Doctor, Hospital, Appointment
+from changelog import latest_seq, read_changes
+from collections import Counter
+from datetime import datetime, timedelta
+import bed_routing
+import threading
+import time
+
+SLOT_MINUTES = 30
+
+# Appointments one doctor can see in a slot before it counts as full
+SLOT_CAPACITY = 3
+
+# Slots looked at when the patient has not picked a time yet (one working day)
+LOOKAHEAD_SLOTS = 16
+
+# Lower scores are better; each component is scaled to roughly 0-1 first
+WEIGHTS = {'queue': 0.5, 'beds': 0.2, 'distance': 0.3}
+
+# Distance at which the distance component reaches 1
+DISTANCE_SCALE_KM = 20.0
+
+CATCH_UP_SECONDS = 2
+
+# Hospital columns copied into the doctor list; updates to anything else are ignored
+HOSPITAL_COLUMNS = ('name', 'zone', 'ward_number')
+
+_lock = threading.Lock()
+_doctors = {}        # doctor_id -> details incl. hospital zone/ward
+_appointments = {}   # appointment_id -> (doctor_id, slot) for upcoming scheduled appointments
+_queues = {}         # doctor_id -> Counter(slot -> scheduled count)
+_cursor = 0
+_loaded_day = None
+_checked_at = 0.0
+
+
+def slot_of(when):
+    return when.replace(minute=when.minute - when.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+
+def _is_queued(appointment, today_start):
+    return (appointment.status == 'scheduled' and appointment.appointment_date is not None
+            and appointment.appointment_date >= today_start)
+
+
+def _today_start():
+    return datetime.combine(datetime.now().date(), datetime.min.time())
+
+
+def load():
+    """Rebuild doctor details and queues from the database"""
+    global _doctors, _appointments, _queues, _cursor, _loaded_day, _checked_at
+
+    # Read the cursor first: changes racing with the load are simply applied again
+    cursor = latest_seq()
+    today_start = _today_start()
+
+    doctors = {}
+    for doctor, hospital in db.session.query(Doctor, Hospital).join(Hospital, Hospital.id == Doctor.hospital_id):
+        doctors[doctor.id] = {
+            'id': doctor.id,
+            'name': doctor.full_name,
+            'specialization': doctor.specialization,
+            'hospital_id': hospital.id,
+            'hospital_name': hospital.name,
+            'zone': hospital.zone,
+            'ward_number': int(hospital.ward_number) if hospital.ward_number is not None else None
+        }
+
+    appointments, queues = {}, {doctor_id: Counter() for doctor_id in doctors}
+    rows = db.session.query(Appointment.id, Appointment.doctor_id, Appointment.appointment_date).filter(
+        Appointment.status == 'scheduled',
+        Appointment.appointment_date >= today_start
+    ).all()
+    for appointment_id, doctor_id, when in rows:
+        slot = slot_of(when)
+        appointments[appointment_id] = (doctor_id, slot)
+        queues.setdefault(doctor_id, Counter())[slot] += 1
+
+    with _lock:
+        _doctors, _appointments, _queues = doctors, appointments, queues
+        _cursor = cursor
+        _loaded_day = today_start.date()
+        _checked_at = time.monotonic()
+
+
+def _apply(appointment_id, appointment, today_start):
+    """Move one appointment's queue entry to match its current row (None when deleted)"""
+    old = _appointments.pop(appointment_id, None)
+    if old:
+        doctor_id, slot = old
+        _queues[doctor_id][slot] -= 1
+        if _queues[doctor_id][slot] <= 0:
+            del _queues[doctor_id][slot]
+
+    if appointment is not None and _is_queued(appointment, today_start):
+        slot = slot_of(appointment.appointment_date)
+        _appointments[appointment_id] = (appointment.doctor_id, slot)
+        _queues.setdefault(appointment.doctor_id, Counter())[slot] += 1
+
+
+def appointment_changed(appointment):
+    """Apply a committed booking or status change in this worker right away"""
+    with _lock:
+        if _doctors:
+            _apply(appointment.id, appointment, _today_start())
+
+
+def _hospital_moved(change):
+    """Whether a hospital change can affect the cached doctor list (name and location)"""
+    if change.op.endswith(('insert', 'delete')):
+        return True
+    return change.op == 'update' and any(f'"{c}"' in (change.changed_columns or '') for c in HOSPITAL_COLUMNS)
+
+
+def _catch_up():
+    global _cursor, _checked_at
+
+    if not _doctors or _loaded_day != datetime.now().date():
+        load()
+        return
+    if time.monotonic() - _checked_at < CATCH_UP_SECONDS:
+        return
+
+    tables = [Appointment.__tablename__, Doctor.__tablename__, Hospital.__tablename__]
+    changes = read_changes(_cursor, tables=tables)
+    while changes:
+        ids = set()
+        for change in changes:
+            if change.table_name == Hospital.__tablename__ and not _hospital_moved(change):
+                continue  # bed counts, written by every reservation, are bed_routing's concern
+            # Doctor moves, new or relocated hospitals and bulk statements: simplest to start over
+            if change.table_name != Appointment.__tablename__ or change.row_key is None:
+                load()
+                return
+            ids.add(int(change.row_key))
+
+        current = {a.id: a for a in Appointment.query.filter(Appointment.id.in_(ids)).all()}
+        today_start = _today_start()
+        with _lock:
+            for appointment_id in ids:
+                _apply(appointment_id, current.get(appointment_id), today_start)
+            _cursor = changes[-1].seq
+
+        changes = read_changes(_cursor, tables=tables)
+
+    _checked_at = time.monotonic()
+
+
+def _queue_load(doctor_id, slot, now):
+    queue = _queues.get(doctor_id, {})
+    if slot is not None:
+        count = queue.get(slot, 0)
+        return count, count / SLOT_CAPACITY
+
+    start = slot_of(now)
+    slots = [start + timedelta(minutes=SLOT_MINUTES * n) for n in range(LOOKAHEAD_SLOTS)]
+    count = sum(queue.get(s, 0) for s in slots)
+    return count, count / (SLOT_CAPACITY * LOOKAHEAD_SLOTS)
+
+
+def _distance(doctor, ward, zone):
+    """(km or None, 0-1 component)"""
+    if ward is not None:
+        km = bed_routing.distance_km(ward, doctor['hospital_id'])
+        if km is not None:
+            return km, min(km / DISTANCE_SCALE_KM, 1.0)
+        if doctor['ward_number'] == ward:
+            return None, 0.0
+    if zone:
+        return None, 0.3 if doctor['zone'] == zone else 1.0
+    return None, 0.5
+
+
+def recommend(zone=None, ward=None, when=None, specialization=None, limit=5):
+    """Doctors ranked best first, with the components of each score"""
+    _catch_up()
+    now = datetime.now()
+    slot = slot_of(when) if when else None
+
+    with _lock:
+        doctors = [d for d in _doctors.values()
+                   if not specialization or (d['specialization'] or '').lower() == specialization.lower()]
+        queues = {d['id']: _queue_load(d['id'], slot, now) for d in doctors}
+
+    ranked = []
+    for doctor in doctors:
+        queued, queue_component = queues[doctor['id']]
+        occupancy = bed_routing.occupancy(doctor['hospital_id'])
+        km, distance_component = _distance(doctor, ward, zone)
+        score = (WEIGHTS['queue'] * min(queue_component, 1.5)
+                 + WEIGHTS['beds'] * occupancy
+                 + WEIGHTS['distance'] * distance_component)
+        slot_full = slot is not None and queued >= SLOT_CAPACITY
+        ranked.append((slot_full, score, {
+            'doctor_id': doctor['id'],
+            'doctor_name': doctor['name'],
+            'specialization': doctor['specialization'],
+            'hospital_id': doctor['hospital_id'],
+            'hospital_name': doctor['hospital_name'],
+            'zone': doctor['zone'],
+            'queued': queued,
+            'slot_full': slot_full,
+            'bed_occupancy': round(occupancy, 2),
+            'distance_km': km,
+            'score': round(score, 3)
+        }))
+
+    ranked.sort(key=lambda r: r[:2])
+    return [entry for _, _, entry in ranked[:limit]]
@@ -0,0 +1,39 @@
+"""
+SAKSHI Schema Version
+Fingerprints the model metadata and records it in the database so startup
+can skip create_all() and seed checks when the schema is already current
+"""
+
+from models import db
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import hashlib
+
+
+def fingerprint():
+    """Stable hash of every table, column, type and index the models declare, plus extra DDL"""
+    parts = []
+    for table in sorted(db.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(table.name)
+        parts.extend(f'{table.name}.{c.name}:{c.type!r}:{c.nullable}' for c in table.columns)
+        parts.extend(f'{table.name}#{i.name}' for i in sorted(table.indexes, key=lambda i: i.name or ''))
+    parts.extend(sorted(db.metadata.info.get('extra_ddl', [])))
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:16]
+
+
+def is_current():
+    """One indexed read; False when the table is missing or the models changed"""
+    try:
+        row = db.session.execute(text('SELECT fingerprint FROM schema_version WHERE id = 1')).first()
+    except OperationalError:
+        db.session.rollback()
+        return False
+    return row is not None and row[0] == fingerprint()
+
+
+def stamp():
+    db.session.execute(text('CREATE TABLE IF NOT EXISTS schema_version '
+                            '(id INTEGER PRIMARY KEY, fingerprint TEXT NOT NULL, applied_at TEXT NOT NULL)'))
+    db.session.execute(text("INSERT OR REPLACE INTO schema_version (id, fingerprint, applied_at) "
+                            "VALUES (1, :fingerprint, datetime('now'))"), {'fingerprint': fingerprint()})
+    db.session.commit()
@@ -0,0 +1,149 @@
+"""
+SAKSHI Clinical Search
+SQLite FTS5 index over medical record notes and patient names, updated in
+the same transaction as treat_patient, with ranked prefix search scoped to
+the patients a doctor has treated or is scheduled to see
+
+The FTS table is created and dropped alongside the models by create_all() /
+drop_all(); after upgrading an existing database run
+
+    flask rebuild-search-index
+"""
+
+from models import db, MedicalRecord, Patient, Appointment
+from markupsafe import escape
+from sqlalchemy import DDL, event, inspect, text
+from sqlalchemy.orm import Session
+import re
+
+FTS_TABLE = 'medical_record_fts'
+INDEXED_COLUMNS = ('patient_name', 'chief_complaint', 'diagnosis', 'symptoms', 'treatment_plan')
+
+# bm25 weights in column order; the trailing UNINDEXED columns are ignored
+RANK_WEIGHTS = (8.0, 4.0, 6.0, 2.0, 1.0, 0.0, 0.0, 0.0)
+
+REBUILD_BATCH_SIZE = 5000
+
+# Private-use characters snippet() puts around matches, swapped for <mark> after escaping
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+
+FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{', '.join(INDEXED_COLUMNS)}, "
+    "doctor_id UNINDEXED, patient_id UNINDEXED, visit_date UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+event.listen(db.metadata, 'after_create', DDL(FTS_DDL))
+event.listen(db.metadata, 'before_drop', DDL(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+
+# Picked up by schema.fingerprint() so adding or changing the index re-runs create_all
+db.metadata.info.setdefault('extra_ddl', []).append(FTS_DDL)
+
+
+def _row(record, patient_name):
+    return {
+        'rowid': record.id,
+        'patient_name': patient_name or '',
+        'chief_complaint': record.chief_complaint or '',
+        'diagnosis': record.diagnosis or '',
+        'symptoms': record.symptoms or '',
+        'treatment_plan': record.treatment_plan or '',
+        'doctor_id': record.doctor_id,
+        'patient_id': record.patient_id,
+        'visit_date': str(record.visit_date) if record.visit_date else None
+    }
+
+
+_INSERT = text(
+    f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, {', '.join(INDEXED_COLUMNS)}, doctor_id, patient_id, visit_date) "
+    f"VALUES (:rowid, {', '.join(':' + c for c in INDEXED_COLUMNS)}, :doctor_id, :patient_id, :visit_date)"
+)
+
+
+def index_record(record, patient=None):
+    """Add or refresh one record; call before the caller's commit so both land together"""
+    if record.id is None:
+        db.session.flush()
+    patient = patient or Patient.query.get(record.patient_id)
+    db.session.execute(_INSERT, _row(record, patient.full_name if patient else None))
+
+
+_RENAME = text(
+    f"UPDATE {FTS_TABLE} SET patient_name = :name "
+    f"WHERE rowid IN (SELECT id FROM {MedicalRecord.__tablename__} WHERE patient_id = :patient_id)"
+)
+
+
+@event.listens_for(Session, 'after_flush')
+def _reindex_renamed_patients(db_session, flush_context):
+    """Keep patient_name in step with renames, in the renaming transaction"""
+    renames = [{'name': patient.full_name or '', 'patient_id': patient.id}
+               for patient in db_session.dirty
+               if isinstance(patient, Patient) and inspect(patient).attrs.full_name.history.has_changes()]
+    if renames:
+        db_session.connection().execute(_RENAME, renames)
+
+
+def rebuild_index():
+    """Reindex every hot medical record in batches"""
+    db.session.execute(text(FTS_DDL))
+    db.session.execute(text(f'DELETE FROM {FTS_TABLE}'))
+
+    indexed, last_id = 0, 0
+    while True:
+        batch = db.session.query(MedicalRecord, Patient.full_name).join(
+            Patient, Patient.id == MedicalRecord.patient_id
+        ).filter(MedicalRecord.id > last_id).order_by(MedicalRecord.id).limit(REBUILD_BATCH_SIZE).all()
+        if not batch:
+            break
+        db.session.execute(_INSERT, [_row(record, name) for record, name in batch])
+        indexed += len(batch)
+        last_id = batch[-1][0].id
+        db.session.expunge_all()
+
+    db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    db.session.commit()
+    return indexed
+
+
+def to_match_query(query):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix"""
+    words = re.findall(r'\w+', query, flags=re.UNICODE)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    return ' '.join(terms)
+
+
+def _highlight(snippet):
+    """HTML-escape the note text, then turn the match markers into <mark> tags"""
+    return str(escape(snippet or '')).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search(query, doctor_id, limit=20):
+    """Best-ranked records visible to the doctor: ones they wrote, or for patients booked with them"""
+    match = to_match_query(query)
+    if not match:
+        return []
+
+    rows = db.session.execute(text(
+        f"SELECT rowid, patient_id, patient_name, diagnosis, visit_date, "
+        f"snippet({FTS_TABLE}, -1, '{MARK_START}', '{MARK_END}', '…', 12) AS snippet, "
+        f"bm25({FTS_TABLE}, {', '.join(str(w) for w in RANK_WEIGHTS)}) AS rank "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+        f"AND (doctor_id = :doctor_id OR patient_id IN "
+        f"(SELECT patient_id FROM {Appointment.__tablename__} WHERE doctor_id = :doctor_id)) "
+        f"ORDER BY rank LIMIT :limit"
+    ), {'match': match, 'doctor_id': doctor_id, 'limit': limit}).mappings().all()
+
+    return [{
+        'record_id': row['rowid'],
+        'patient_id': row['patient_id'],
+        'patient_name': row['patient_name'],
+        'diagnosis': row['diagnosis'],
+        'visit_date': row['visit_date'],
+        'snippet': _highlight(row['snippet']),
+        'score': round(-row['rank'], 3)
+    } for row in rows]
@@ -0,0 +1,107 @@
+"""
+SAKSHI Security
+Configurable password hashing with rehash-on-login, and a sliding-window
+limiter that rejects brute-force logins before any hash work is done
+"""
+
+from werkzeug.security import generate_password_hash
+from collections import OrderedDict, deque
+import os
+import threading
+import time
+
+# Any werkzeug method string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'.
+# Changing it makes existing hashes upgrade the next time each user logs in.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+
+_method_prefix = {}
+
+
+def _prefix(method):
+    """The '<method>:<params>' werkzeug writes for `method`, with defaults filled in"""
+    if method not in _method_prefix:
+        _method_prefix[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _method_prefix[method]
+
+
+def hash_password(password, method=None):
+    return generate_password_hash(password, method=method or PASSWORD_HASH_METHOD)
+
+
+def needs_rehash(password_hash, method=None):
+    """True if the stored hash was made with different parameters than configured"""
+    if not password_hash:
+        return True
+    return password_hash.split('$', 1)[0] != _prefix(method or PASSWORD_HASH_METHOD)
+
+
+class SlidingWindowLimiter:
+    """Counts events per key over the last `window` seconds.
+
+    Memory is bounded by `max_keys`; the least recently touched key is
+    dropped first.
+    """
+
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._events = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _trim(self, key, now):
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def blocked(self, key, now=None):
+        now = now or time.monotonic()
+        with self._lock:
+            events = self._trim(key, now)
+            return events is not None and len(events) >= self.limit
+
+    def hit(self, key, now=None):
+        now = now or time.monotonic()
+        with self._lock:
+            events = self._trim(key, now)
+            if events is None:
+                events = self._events[key] = deque()
+            events.append(now)
+            self._events.move_to_end(key)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+
+class LoginRateLimiter:
+    """Failed-login limits per username and per client IP"""
+
+    def __init__(self, per_username=5, per_ip=30, window=300):
+        self.usernames = SlidingWindowLimiter(per_username, window)
+        self.ips = SlidingWindowLimiter(per_ip, window)
+
+    def allowed(self, username, ip):
+        return not (self.usernames.blocked(username) or self.ips.blocked(ip))
+
+    def failed(self, username, ip):
+        self.usernames.hit(username)
+        self.ips.hit(ip)
+
+    def succeeded(self, username):
+        self.usernames.reset(username)
+
+
+login_limiter = LoginRateLimiter(
+    per_username=int(os.environ.get('LOGIN_LIMIT_PER_USERNAME', 5)),
+    per_ip=int(os.environ.get('LOGIN_LIMIT_PER_IP', 30)),
+    window=int(os.environ.get('LOGIN_LIMIT_WINDOW_SECONDS', 300))
+)
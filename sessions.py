@@ -0,0 +1,184 @@
+"""
+SAKSHI Server-Side Sessions
+Keeps session data on the server and only a signed session id in the cookie,
+so logout revokes a session immediately and the payload stays small
+"""
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+from collections import OrderedDict
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite')  # sqlite or memory
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', 'sessions.db')
+SESSION_LIFETIME_SECONDS = 12 * 60 * 60
+
+# Active sessions slide their expiry forward, writing to the store at most this often
+SESSION_TOUCH_SECONDS = 5 * 60
+MEMORY_MAX_SESSIONS = 50000
+
+
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.modified = False
+
+
+class MemorySessionStore:
+    """Per-process LRU; only suitable for a single worker"""
+
+    def __init__(self, max_entries=MEMORY_MAX_SESSIONS):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        """(data, expires) or None"""
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            data, expires = entry
+            if expires < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return dict(data), expires
+
+    def set(self, sid, data, ttl):
+        with self._lock:
+            self._data[sid] = (dict(data), time.time() + ttl)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def touch(self, sid, ttl):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is not None:
+                self._data[sid] = (entry[0], time.time() + ttl)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SQLiteSessionStore:
+    """Shared by every worker on the host; one primary-key lookup per request"""
+
+    def __init__(self, path=SESSION_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS session '
+                         '(sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_session_expires ON session (expires)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        """(data, expires) or None"""
+        row = self._connection().execute(
+            'SELECT data, expires FROM session WHERE sid = ? AND expires > ?', (sid, time.time())
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, sid, data, ttl):
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO session (sid, data, expires) VALUES (?, ?, ?)',
+                         (sid, json.dumps(data), time.time() + ttl))
+
+    def touch(self, sid, ttl):
+        with self._connection() as conn:
+            conn.execute('UPDATE session SET expires = ? WHERE sid = ?', (time.time() + ttl, sid))
+
+    def delete(self, sid):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM session WHERE sid = ?', (sid,))
+
+    def purge_expired(self):
+        with self._connection() as conn:
+            return conn.execute('DELETE FROM session WHERE expires <= ?', (time.time(),)).rowcount
+
+
+class ServerSideSessionInterface(SessionInterface):
+
+    def __init__(self, store, lifetime=SESSION_LIFETIME_SECONDS):
+        self.store = store
+        self.lifetime = lifetime
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='sakshi-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                entry = self.store.get(sid)
+                if entry is not None:
+                    return ServerSession(entry[0], sid=sid, expires=entry[1])
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Popped on every save so the flag never outlives the login that set it
+        rotate = session.pop('_rotate', False)
+
+        if not session.modified and not session.new:
+            # Unchanged session: slide the expiry forward, but only write once per touch interval
+            if session.expires is not None and session.expires - time.time() > self.lifetime - SESSION_TOUCH_SECONDS:
+                return
+            self.store.touch(session.sid, self.lifetime)
+        else:
+            # A login rotates the id so a pre-login cookie cannot be fixed on a victim
+            if rotate and not session.new:
+                self.store.delete(session.sid)
+                session.sid = secrets.token_urlsafe(32)
+            self.store.set(session.sid, dict(session), self.lifetime)
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            max_age=self.lifetime,
+            httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            domain=domain,
+            path=path
+        )
+
+
+def create_session_interface(backend=SESSION_BACKEND):
+    store = MemorySessionStore() if backend == 'memory' else SQLiteSessionStore()
+    return ServerSideSessionInterface(store)
@@ -0,0 +1,171 @@
+// Disease Distribution Chart
+const diseaseCtx = document.getElementById('diseaseChart').getContext('2d');
+new Chart(diseaseCtx, {
+    type: 'bar',
+    data: {
+        labels: ['Diabetes', 'Hypertension', 'Respiratory', 'Cardiac', 'Others'],
+        datasets: [{
+            label: 'Number of Cases',
+            data: [245, 189, 156, 98, 125],
+            backgroundColor: [
+                'rgba(220, 38, 38, 0.8)',
+                'rgba(220, 38, 38, 0.6)',
+                'rgba(220, 38, 38, 0.5)',
+                'rgba(220, 38, 38, 0.4)',
+                'rgba(220, 38, 38, 0.3)'
+            ],
+            borderColor: 'rgb(220, 38, 38)',
+            borderWidth: 2
+        }]
+    },
+    options: {
+        responsive: true,
+        maintainAspectRatio: true,
+        plugins: {
+            legend: {
+                display: false
+            }
+        },
+        scales: {
+            y: {
+                beginAtZero: true
+            }
+        }
+    }
+});
+
+// Age Distribution Chart
+const ageCtx = document.getElementById('ageChart').getContext('2d');
+new Chart(ageCtx, {
+    type: 'pie',
+    data: {
+        labels: ['0-18', '19-35', '36-50', '51-65', '65+'],
+        datasets: [{
+            data: [15, 25, 30, 20, 10],
+            backgroundColor: [
+                'rgba(220, 38, 38, 0.9)',
+                'rgba(220, 38, 38, 0.7)',
+                'rgba(220, 38, 38, 0.5)',
+                'rgba(220, 38, 38, 0.4)',
+                'rgba(220, 38, 38, 0.3)'
+            ],
+            borderColor: '#ffffff',
+            borderWidth: 2
+        }]
+    },
+    options: {
+        responsive: true,
+        maintainAspectRatio: true,
+        plugins: {
+            legend: {
+                position: 'bottom'
+            }
+        }
+    }
+});
+
+// Monthly Trend Chart
+const trendCtx = document.getElementById('trendChart').getContext('2d');
+new Chart(trendCtx, {
+    type: 'line',
+    data: {
+        labels: ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+        datasets: [{
+            label: 'New Patients',
+            data: [65, 78, 90, 81, 95, 110, 105, 115, 120, 108, 95, 85],
+            borderColor: 'rgb(220, 38, 38)',
+            backgroundColor: 'rgba(220, 38, 38, 0.1)',
+            tension: 0.4,
+            fill: true
+        }]
+    },
+    options: {
+        responsive: true,
+        maintainAspectRatio: true,
+        plugins: {
+            legend: {
+                display: true,
+                position: 'bottom'
+            }
+        },
+        scales: {
+            y: {
+                beginAtZero: true
+            }
+        }
+    }
+});
+
+// Sector Disease Chart
+const sectorCtx = document.getElementById('sectorDiseaseChart').getContext('2d');
+new Chart(sectorCtx, {
+    type: 'doughnut',
+    data: {
+        labels: ['Common Cold', 'Fever', 'Headache', 'Stomach Issues', 'Skin Problems'],
+        datasets: [{
+            data: [30, 25, 20, 15, 10],
+            backgroundColor: [
+                'rgba(220, 38, 38, 0.9)',
+                'rgba(220, 38, 38, 0.7)',
+                'rgba(220, 38, 38, 0.5)',
+                'rgba(220, 38, 38, 0.4)',
+                'rgba(220, 38, 38, 0.3)'
+            ],
+            borderColor: '#ffffff',
+            borderWidth: 2
+        }]
+    },
+    options: {
+        responsive: true,
+        maintainAspectRatio: true,
+        plugins: {
+            legend: {
+                position: 'bottom'
+            }
+        }
+    }
+});
+
+// Vaccination Chart
+const vaccinationCtx = document.getElementById('vaccinationChart').getContext('2d');
+new Chart(vaccinationCtx, {
+    type: 'bar',
+    data: {
+        labels: ['COVID-19', 'Flu', 'Hepatitis B', 'Tetanus', 'Pneumonia'],
+        datasets: [{
+            label: 'Coverage (%)',
+            data: [85, 72, 68, 90, 65],
+            backgroundColor: 'rgba(220, 38, 38, 0.7)',
+            borderColor: 'rgb(220, 38, 38)',
+            borderWidth: 2
+        }]
+    },
+    options: {
+        responsive: true,
+        maintainAspectRatio: true,
+        plugins: {
+            legend: {
+                display: false
+            }
+        },
+        scales: {
+            y: {
+                beginAtZero: true,
+                max: 100
+            }
+        }
+    }
+});
+
+function updateCharts() {
+    alert('Charts updated based on selected region filter');
+}
+
+function refreshData() {
+    alert('Data refreshed successfully!');
+    location.reload();
+}
+
+function exportData() {
+    alert('Healthcare analytics report exported successfully!');
+}
@@ -0,0 +1,243 @@
+"""
+SAKSHI Field Device Sync
+Delta sync for PHC devices that keep a local SQLite copy of their hospital's
+Patient, Appointment and MedicineStock rows and work offline
+
+Change sequences come from the change log (changelog.py). Devices pull
+changes after the last sequence they saw and push queued writes stamped with the sequence each row
+had when they edited it; a row changed on the server since then is a conflict
+and is returned instead of being overwritten.
+
+Pull responses are columnar ({"columns": [...], "rows": [[...]]}) and
+compressed by http_cache; pushes may be sent with Content-Encoding: gzip.
+"""
+
+from models import db, Patient, Appointment, MedicineStock, Doctor
+from inventory import set_batch_quantity
+from changelog import latest_seq, read_changes, row_seqs
+from sqlalchemy import select
+from datetime import date, datetime
+import json
+
+PULL_LIMIT = 2000
+PUSH_LIMIT = 500
+
+SYNCED = {model.__tablename__: model for model in (Patient, Appointment, MedicineStock)}
+
+# Columns a device may change, per table; anything else in a push is ignored
+WRITABLE = {
+    Patient.__tablename__: ('full_name', 'zone', 'ward_number', 'blood_group', 'allergies',
+                            'chronic_conditions', 'current_medications'),
+    Appointment.__tablename__: ('patient_id', 'doctor_id', 'appointment_date', 'appointment_type',
+                                'symptoms', 'status', 'is_telemedicine'),
+    # stock_status is left to inventory, whose expiry sweep keeps availability in step with it
+    MedicineStock.__tablename__: ('quantity',)
+}
+
+# Tables devices may create rows in while offline
+INSERTABLE = {Appointment.__tablename__}
+
+
+class SyncReceipt(db.Model):
+    """Outcome of each pushed change, so a retried push is answered, not re-applied"""
+    __tablename__ = 'sync_receipt'
+    __table_args__ = (db.UniqueConstraint('device_id', 'change_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False)
+    change_id = db.Column(db.String(64), nullable=False)
+    result = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+
+class SyncRejected(Exception):
+    pass
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _decode(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is bool:
+        return bool(value)
+    return python_type(value)
+
+
+def is_receipt_conflict(error):
+    """Whether an IntegrityError came from a concurrent push saving the same receipts"""
+    return f'{SyncReceipt.__tablename__}.' in str(getattr(error, 'orig', error))
+
+
+def _scope_filter(model, hospital):
+    """Rows a device at this hospital works with"""
+    if model is MedicineStock:
+        return MedicineStock.hospital_id == hospital.id
+    if model is Appointment:
+        return Appointment.doctor_id.in_(select(Doctor.id).where(Doctor.hospital_id == hospital.id))
+    return Patient.zone == hospital.zone
+
+
+def snapshot(hospital, tables=None):
+    """Initial download for a new device, with the cursor to pull from next"""
+    cursor = latest_seq()
+    result = {'cursor': cursor, 'tables': {}}
+    for table in tables or SYNCED:
+        model = SYNCED[table]
+        columns = [c.name for c in model.__table__.columns]
+        objects = model.query.filter(_scope_filter(model, hospital)).order_by(model.id).all()
+        result['tables'][table] = {
+            'columns': columns,
+            'rows': [[_encode(getattr(obj, c)) for c in columns] for obj in objects]
+        }
+    return result
+
+
+def pull(hospital, since, limit=PULL_LIMIT):
+    """Changes after `since`, collapsed to the latest state of each row"""
+    changes = read_changes(since, limit, tables=SYNCED)
+    cursor = changes[-1].seq if changes else since
+
+    # Bulk statements carry no row key; synced tables are only written through the ORM
+    latest = {}
+    for change in changes:
+        if change.row_key is not None:
+            latest[(change.table_name, int(change.row_key))] = change
+
+    tables = {}
+    for table, model in SYNCED.items():
+        upserts = [k[1] for k, c in latest.items() if k[0] == table and c.op != 'delete']
+        deleted = sorted(k[1] for k, c in latest.items() if k[0] == table and c.op == 'delete')
+        if not upserts and not deleted:
+            continue
+
+        columns = [c.name for c in model.__table__.columns]
+        objects = model.query.filter(model.id.in_(upserts), _scope_filter(model, hospital)).all() if upserts else []
+        tables[table] = {
+            'columns': columns + ['_seq'],
+            'rows': [[_encode(getattr(obj, c)) for c in columns] + [latest[(table, obj.id)].seq] for obj in objects],
+            'deleted': deleted
+        }
+
+    return {'cursor': cursor, 'more': len(changes) == limit, 'tables': tables}
+
+
+def _check_not_null(model, values, inserting):
+    """Reject values a NOT NULL column would refuse at flush time"""
+    missing = []
+    for column in model.__table__.columns:
+        if column.nullable or column.primary_key:
+            continue
+        if column.name in values:
+            empty = values[column.name] is None
+        else:
+            # Omitted columns take their default on insert and are left alone on update
+            empty = inserting and column.default is None and column.server_default is None
+        if empty:
+            missing.append(column.name)
+    if missing:
+        raise SyncRejected(f"{', '.join(missing)} cannot be empty")
+
+
+def _check_insert(model, values, hospital):
+    _check_not_null(model, values, inserting=True)
+    if model is Appointment:
+        doctor = Doctor.query.get(values.get('doctor_id'))
+        if doctor is None or doctor.hospital_id != hospital.id:
+            raise SyncRejected("Doctor is not at this device's hospital")
+        if not values.get('patient_id') or not Patient.query.get(values['patient_id']):
+            raise SyncRejected('Unknown patient')
+
+
+def _apply(change, hospital):
+    """Validate fully, then write; nothing is changed for a rejected change"""
+    table = change.get('table')
+    model = SYNCED.get(table)
+    if model is None:
+        raise SyncRejected(f'{table} is not synced')
+
+    values = change.get('values') or {}
+    columns = model.__table__.columns
+    decoded = {k: _decode(columns[k], v) for k, v in values.items() if k in WRITABLE[table]}
+
+    if change.get('op') == 'insert':
+        if table not in INSERTABLE:
+            raise SyncRejected(f'Devices cannot create {table} rows')
+        _check_insert(model, decoded, hospital)
+        obj = model(**decoded)
+        db.session.add(obj)
+        db.session.flush()
+        return {'status': 'applied', 'id': obj.id}
+
+    obj = model.query.filter(model.id == int(change['id']), _scope_filter(model, hospital)).first()
+    if obj is None:
+        raise SyncRejected('Unknown row')
+
+    server_seq = row_seqs(table, [obj.id]).get(obj.id, 0)
+    if server_seq > int(change.get('base_seq', 0)):
+        return {
+            'status': 'conflict',
+            'id': obj.id,
+            'server_seq': server_seq,
+            'server_values': {c.name: _encode(getattr(obj, c.name)) for c in columns}
+        }
+
+    _check_not_null(model, decoded, inserting=False)
+    for key, value in decoded.items():
+        if model is MedicineStock and key == 'quantity':
+            set_batch_quantity(obj, value)
+        else:
+            setattr(obj, key, value)
+    db.session.flush()
+    return {'status': 'applied', 'id': obj.id}
+
+
+def push(device_id, hospital, changes):
+    """Apply queued device writes in one transaction; returns one result per change, in order.
+
+    Each change is {"change_id", "table", "op": "update"|"insert", "id",
+    "base_seq", "values"}. Applied results carry the row's new sequence so
+    the device can advance its per-row base without pulling. Changes are
+    applied in order, so later edits to a row in the same push see the
+    earlier ones' sequence as their base.
+    """
+    if len(changes) > PUSH_LIMIT:
+        raise SyncRejected(f'At most {PUSH_LIMIT} changes per push')
+
+    change_ids = [str(c.get('change_id')) for c in changes]
+    receipts = {r.change_id: json.loads(r.result) for r in SyncReceipt.query.filter(
+        SyncReceipt.device_id == device_id,
+        SyncReceipt.change_id.in_(change_ids)
+    ).all()}
+
+    results = []
+    for change_id, change in zip(change_ids, changes):
+        if change_id in receipts:
+            results.append(dict(receipts[change_id], replayed=True))
+            continue
+
+        try:
+            result = _apply(change, hospital)
+        except (SyncRejected, KeyError, ValueError, TypeError) as e:
+            result = {'status': 'rejected', 'error': str(e)}
+
+        result['change_id'] = change_id
+        if result['status'] == 'applied':
+            result['seq'] = row_seqs(change['table'], [result['id']]).get(result['id'])
+        results.append(result)
+
+        # Conflicts are not final: the device resolves them and pushes again with the same id
+        if result['status'] != 'conflict':
+            db.session.add(SyncReceipt(device_id=device_id, change_id=change_id, result=json.dumps(result)))
+
+    db.session.commit()
+    return results
@@ -0,0 +1,206 @@
+"""
+SAKSHI Field Device Sync Client
+Keeps a local SQLite copy of a hospital's Patient, Appointment and
+MedicineStock rows, queues edits while offline and syncs when a connection
+is available
+
+    python sync_client.py --server https://sakshi.example --hospital 2 \\
+        --username dr.patil --password ... init
+    python sync_client.py ... sync
+
+Local edits go through LocalStore.update()/insert(), which write the local
+row and an outbox entry in one transaction; sync pushes the outbox (gzip),
+applies the per-change results and then pulls server changes.
+"""
+
+from http.cookiejar import CookieJar
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+import argparse
+import gzip
+import json
+import sqlite3
+import uuid
+
+TABLES = ('patient', 'appointment', 'medicine_stock')
+
+
+class LocalStore:
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS row_seq (tbl TEXT, id INTEGER, seq INTEGER, PRIMARY KEY (tbl, id))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS outbox (change_id TEXT PRIMARY KEY, body TEXT NOT NULL, '
+                          'local_id INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS conflicts (change_id TEXT PRIMARY KEY, body TEXT NOT NULL)')
+
+    def state(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_state(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?)', (key, json.dumps(value)))
+
+    def _upsert_rows(self, table, columns, rows, seq_index=None):
+        data_columns = [c for c in columns if c != '_seq']
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({", ".join(data_columns)}, PRIMARY KEY (id))')
+        placeholders = ', '.join('?' for _ in data_columns)
+        for row in rows:
+            values = row[:len(data_columns)]
+            self.conn.execute(f'INSERT OR REPLACE INTO {table} ({", ".join(data_columns)}) VALUES ({placeholders})',
+                              values)
+            if seq_index is not None:
+                self.conn.execute('INSERT OR REPLACE INTO row_seq VALUES (?, ?, ?)',
+                                  (table, row[columns.index('id')], row[seq_index]))
+
+    def load_snapshot(self, snapshot):
+        with self.conn:
+            for table, data in snapshot['tables'].items():
+                self._upsert_rows(table, data['columns'], data['rows'])
+            # Rows without a row_seq entry use the snapshot cursor as their base
+            self.set_state('snapshot_seq', snapshot['cursor'])
+            self.set_state('cursor', snapshot['cursor'])
+
+    def apply_changes(self, page):
+        with self.conn:
+            for table, data in page['tables'].items():
+                self._upsert_rows(table, data['columns'], data['rows'], seq_index=data['columns'].index('_seq'))
+                for row_id in data['deleted']:
+                    self.conn.execute(f'DELETE FROM {table} WHERE id = ?', (row_id,))
+            self.set_state('cursor', page['cursor'])
+
+    def base_seq(self, table, row_id):
+        row = self.conn.execute('SELECT seq FROM row_seq WHERE tbl = ? AND id = ?', (table, row_id)).fetchone()
+        return row[0] if row else self.state('snapshot_seq', 0)
+
+    def update(self, table, row_id, values):
+        """Edit a row locally and queue the change for the server"""
+        with self.conn:
+            assignments = ', '.join(f'{k} = ?' for k in values)
+            self.conn.execute(f'UPDATE {table} SET {assignments} WHERE id = ?', (*values.values(), row_id))
+
+            # The server has not seen a row created offline yet; fold the edit into its queued insert
+            if row_id < 0:
+                change_id, body = self.conn.execute('SELECT change_id, body FROM outbox WHERE local_id = ?',
+                                                    (row_id,)).fetchone()
+                change = json.loads(body)
+                change['values'].update(values)
+                self.conn.execute('UPDATE outbox SET body = ? WHERE change_id = ?', (json.dumps(change), change_id))
+                return
+
+            change = {'change_id': uuid.uuid4().hex, 'table': table, 'op': 'update', 'id': row_id,
+                      'base_seq': self.base_seq(table, row_id), 'values': values}
+            self.conn.execute('INSERT INTO outbox (change_id, body) VALUES (?, ?)',
+                              (change['change_id'], json.dumps(change)))
+
+    def insert(self, table, values):
+        """Create a row locally under a temporary negative id until the server assigns one"""
+        with self.conn:
+            local_id = (self.conn.execute(f'SELECT MIN(MIN(id), 0) FROM {table}').fetchone()[0] or 0) - 1
+            columns = ['id', *values]
+            self.conn.execute(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})',
+                              (local_id, *values.values()))
+            change = {'change_id': uuid.uuid4().hex, 'table': table, 'op': 'insert', 'values': values}
+            self.conn.execute('INSERT INTO outbox (change_id, body, local_id) VALUES (?, ?, ?)',
+                              (change['change_id'], json.dumps(change), local_id))
+
+    def outbox(self):
+        return [(json.loads(body), local_id) for body, local_id in
+                self.conn.execute('SELECT body, local_id FROM outbox ORDER BY rowid')]
+
+    def settle(self, change, local_id, result):
+        """Record the server's answer to one pushed change"""
+        table = change['table']
+        if result['status'] == 'applied':
+            if local_id is not None:
+                self.conn.execute(f'UPDATE {table} SET id = ? WHERE id = ?', (result['id'], local_id))
+            if result.get('seq'):
+                self.conn.execute('INSERT OR REPLACE INTO row_seq VALUES (?, ?, ?)', (table, result['id'], result['seq']))
+        elif result['status'] == 'conflict':
+            # Server wins locally; the conflict is kept for someone to review and re-apply
+            values = result['server_values']
+            assignments = ', '.join(f'{k} = ?' for k in values)
+            self.conn.execute(f'UPDATE {table} SET {assignments} WHERE id = ?', (*values.values(), result['id']))
+            self.conn.execute('INSERT OR REPLACE INTO row_seq VALUES (?, ?, ?)', (table, result['id'], result['server_seq']))
+            self.conn.execute('INSERT OR REPLACE INTO conflicts VALUES (?, ?)',
+                              (change['change_id'], json.dumps({'change': change, 'server': result})))
+        self.conn.execute('DELETE FROM outbox WHERE change_id = ?', (change['change_id'],))
+
+
+class SyncClient:
+
+    def __init__(self, server, hospital_id, store):
+        self.server = server.rstrip('/')
+        self.base = f'{self.server}/api/sync/{hospital_id}'
+        self.store = store
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def login(self, username, password, user_type='doctor'):
+        body = urlencode({'username': username, 'password': password, 'user_type': user_type}).encode()
+        self.opener.open(Request(f'{self.server}/authenticate', data=body))
+
+    def _get(self, path):
+        request = Request(self.base + path, headers={'Accept-Encoding': 'gzip'})
+        with self.opener.open(request) as response:
+            data = response.read()
+            if response.headers.get('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+        return json.loads(data)
+
+    def init(self):
+        self.store.load_snapshot(self._get('/snapshot'))
+        self.pull()
+
+    def push(self, batch_size=200):
+        pending = self.store.outbox()
+        device_id = self.store.state('device_id')
+        if device_id is None:
+            device_id = uuid.uuid4().hex
+            with self.store.conn:
+                self.store.set_state('device_id', device_id)
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            body = gzip.compress(json.dumps({'device_id': device_id, 'changes': [c for c, _ in batch]}).encode())
+            request = Request(f'{self.base}/push', data=body, headers={
+                'Content-Type': 'application/json', 'Content-Encoding': 'gzip', 'Accept-Encoding': 'gzip'
+            })
+            with self.opener.open(request) as response:
+                data = response.read()
+                if response.headers.get('Content-Encoding') == 'gzip':
+                    data = gzip.decompress(data)
+            with self.store.conn:
+                for (change, local_id), result in zip(batch, json.loads(data)['results']):
+                    self.store.settle(change, local_id, result)
+
+    def pull(self):
+        while True:
+            page = self._get(f'/changes?since={self.store.state("cursor", 0)}')
+            self.store.apply_changes(page)
+            if not page['more']:
+                break
+
+    def sync(self):
+        self.push()
+        self.pull()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync a field device with the SAKSHI server')
+    parser.add_argument('--server', required=True)
+    parser.add_argument('--hospital', type=int, required=True)
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--db', default='sakshi_device.db')
+    parser.add_argument('command', choices=('init', 'sync'))
+    args = parser.parse_args()
+
+    client = SyncClient(args.server, args.hospital, LocalStore(args.db))
+    client.login(args.username, args.password)
+    getattr(client, args.command)()
+    print(f"Synced to change {client.store.state('cursor')}, {len(client.store.outbox())} changes still queued")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+SAKSHI Telemedicine Queue
+Per-doctor waiting rooms for telemedicine appointments: check-in, the
+consultation in progress, and each waiting patient's position and ETA
+
+Queue entries are stored in telemedicine_queue. Each worker keeps every
+doctor's queue in memory and reloads it only when the table's version
+counter moves, so the one-second polls of many streaming patients cost one
+counter read each. ETAs use the doctor's average consultation length.
+"""
+
+from models import db, Appointment, MedicalRecord
+from http_cache import data_versions, VERSION_PREFIX
+from sqlalchemy import text, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import threading
+import time
+
+DEFAULT_CONSULTATION_MINUTES = 15
+
+# Measured telemedicine consultations needed before they replace the estimate from record gaps
+MIN_SAMPLES = 5
+
+DURATION_LOOKBACK_DAYS = 30
+DURATION_TTL_SECONDS = 600
+
+
+class QueueError(Exception):
+    pass
+
+
+class TelemedicineQueueEntry(db.Model):
+    __tablename__ = 'telemedicine_queue'
+    __table_args__ = (db.Index('ix_telemedicine_queue_doctor_status', 'doctor_id', 'status', 'checked_in_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey(Appointment.__table__.c.id), nullable=False, unique=True)
+    doctor_id = db.Column(db.Integer, nullable=False)
+    patient_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), default='waiting', nullable=False)  # waiting, in_consultation, done, left
+    checked_in_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+_lock = threading.Lock()
+_queues = {}      # doctor_id -> {'version', 'waiting': [appointment_id, ...], 'current': (appointment_id, started_at)}
+_durations = {}   # doctor_id -> (minutes, computed_at)
+
+
+def _table_version():
+    table = TelemedicineQueueEntry.__tablename__
+    return data_versions([table]).get(VERSION_PREFIX + table, (0, None))[0]
+
+
+def doctor_queue(doctor_id):
+    """The doctor's queue, reloaded from the table only if anything was written since the last load"""
+    version = _table_version()
+    with _lock:
+        queue = _queues.get(doctor_id)
+        if queue and queue['version'] == version:
+            return queue
+
+    entries = TelemedicineQueueEntry.query.filter(
+        TelemedicineQueueEntry.doctor_id == doctor_id,
+        TelemedicineQueueEntry.status.in_(('waiting', 'in_consultation'))
+    ).order_by(TelemedicineQueueEntry.checked_in_at, TelemedicineQueueEntry.id).all()
+
+    current = next(((e.appointment_id, e.started_at) for e in entries if e.status == 'in_consultation'), None)
+    queue = {
+        'version': version,
+        'waiting': [e.appointment_id for e in entries if e.status == 'waiting'],
+        'current': current
+    }
+    with _lock:
+        _queues[doctor_id] = queue
+    return queue
+
+
+def average_minutes(doctor_id):
+    """Average consultation length: measured telemedicine sessions, else gaps between the doctor's records"""
+    with _lock:
+        cached = _durations.get(doctor_id)
+    if cached and time.monotonic() - cached[1] < DURATION_TTL_SECONDS:
+        return cached[0]
+
+    since = datetime.now() - timedelta(days=DURATION_LOOKBACK_DAYS)
+    measured = db.session.query(
+        db.func.count(TelemedicineQueueEntry.id),
+        db.func.avg((db.func.julianday(TelemedicineQueueEntry.finished_at)
+                     - db.func.julianday(TelemedicineQueueEntry.started_at)) * 1440)
+    ).filter(
+        TelemedicineQueueEntry.doctor_id == doctor_id,
+        TelemedicineQueueEntry.status == 'done',
+        TelemedicineQueueEntry.started_at != None,
+        TelemedicineQueueEntry.finished_at >= since
+    ).first()
+
+    if measured[0] >= MIN_SAMPLES and measured[1]:
+        minutes = measured[1]
+    else:
+        # Back-to-back records on the same day approximate how long each visit took
+        minutes = db.session.execute(text(f"""
+            SELECT AVG(gap) FROM (
+                SELECT (julianday(visit_date) - julianday(LAG(visit_date) OVER (
+                    PARTITION BY date(visit_date) ORDER BY visit_date))) * 1440 AS gap
+                FROM {MedicalRecord.__tablename__}
+                WHERE doctor_id = :doctor_id AND visit_date >= :since
+            ) WHERE gap BETWEEN 2 AND 60
+        """), {'doctor_id': doctor_id, 'since': since.isoformat(' ')}).scalar() or DEFAULT_CONSULTATION_MINUTES
+
+    minutes = round(minutes, 1)
+    with _lock:
+        _durations[doctor_id] = (minutes, time.monotonic())
+    return minutes
+
+
+def status(appointment):
+    """Where one telemedicine appointment stands in its doctor's queue"""
+    queue = doctor_queue(appointment.doctor_id)
+    average = average_minutes(appointment.doctor_id)
+
+    if appointment.id in queue['waiting']:
+        state = 'waiting'
+    elif queue['current'] and queue['current'][0] == appointment.id:
+        state = 'in_consultation'
+    else:
+        entry = TelemedicineQueueEntry.query.filter_by(appointment_id=appointment.id).first()
+        state = entry.status if entry else 'not_checked_in'
+
+    result = {
+        'appointment_id': appointment.id,
+        'status': state,
+        'waiting_count': len(queue['waiting']),
+        'doctor_busy': queue['current'] is not None,
+        'average_consultation_minutes': average,
+        'position': None,
+        'eta_minutes': None
+    }
+
+    if appointment.id in queue['waiting']:
+        index = queue['waiting'].index(appointment.id)
+        remaining = 0
+        if queue['current']:
+            elapsed = (datetime.now() - queue['current'][1]).total_seconds() / 60
+            remaining = max(average - elapsed, 1)
+        result['position'] = index + 1
+        result['eta_minutes'] = round(remaining + index * average)
+    return result
+
+
+def check_in(appointment):
+    """Join the doctor's queue; checking in again keeps the original place"""
+    if not appointment.is_telemedicine:
+        raise QueueError('Not a telemedicine appointment')
+    if appointment.status != 'scheduled':
+        raise QueueError(f'Appointment is {appointment.status}')
+    if appointment.appointment_date.date() != datetime.now().date():
+        raise QueueError('Check-in opens on the day of the appointment')
+
+    entry = TelemedicineQueueEntry.query.filter_by(appointment_id=appointment.id).first()
+    if entry is None:
+        db.session.add(TelemedicineQueueEntry(
+            appointment_id=appointment.id,
+            doctor_id=appointment.doctor_id,
+            patient_id=appointment.patient_id
+        ))
+    elif entry.status == 'left':
+        entry.status = 'waiting'
+        entry.checked_in_at = datetime.now()
+    elif entry.status == 'done':
+        raise QueueError('Consultation already finished')
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent first check-in won; its entry keeps the original place
+        db.session.rollback()
+
+
+def leave(appointment):
+    entry = TelemedicineQueueEntry.query.filter_by(appointment_id=appointment.id, status='waiting').first()
+    if entry:
+        entry.status = 'left'
+        db.session.commit()
+
+
+def _finish_current(doctor_id, now):
+    db.session.execute(update(TelemedicineQueueEntry).where(
+        TelemedicineQueueEntry.doctor_id == doctor_id,
+        TelemedicineQueueEntry.status == 'in_consultation'
+    ).values(status='done', finished_at=now))
+
+
+def call_next(doctor_id):
+    """Finish the consultation in progress and start the next waiting patient; returns their appointment id"""
+    now = datetime.now()
+    _finish_current(doctor_id, now)
+
+    for appointment_id in doctor_queue(doctor_id)['waiting']:
+        # Conditional update, so two open doctor tabs cannot start the same patient
+        started = db.session.execute(update(TelemedicineQueueEntry).where(
+            TelemedicineQueueEntry.appointment_id == appointment_id,
+            TelemedicineQueueEntry.status == 'waiting'
+        ).values(status='in_consultation', started_at=now)).rowcount
+        if started:
+            db.session.commit()
+            return appointment_id
+
+    db.session.commit()
+    return None
+
+
+def finish(appointment):
+    """Close the queue entry when the consultation's record is saved"""
+    db.session.execute(update(TelemedicineQueueEntry).where(
+        TelemedicineQueueEntry.appointment_id == appointment.id,
+        TelemedicineQueueEntry.status.in_(('waiting', 'in_consultation'))
+    ).values(status='done', finished_at=datetime.now()))
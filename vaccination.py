@@ -0,0 +1,290 @@
+"""
+SAKSHI Vaccination Doses
+One row per administered dose, recorded singly or in batches from camp
+laptops, with campaign and per-zone tallies kept in counters so coverage
+is read without counting dose rows
+
+Coverage counts people, i.e. first doses; the campaign's dose counter
+counts every dose given.
+"""
+
+from models import db, Patient, VaccinationCampaign
+from counters import get_counters, set_counter, increment_counter
+from sqlalchemy import update
+from collections import Counter
+from datetime import datetime
+import json
+
+# Keeps the IN (...) lookups under SQLite's bound-parameter limit
+MAX_BATCH_SIZE = 500
+
+
+class DoseRejected(Exception):
+    pass
+
+
+class VaccinationDose(db.Model):
+    __tablename__ = 'vaccination_dose'
+    __table_args__ = (
+        db.UniqueConstraint('campaign_id', 'patient_id', 'dose_number', name='uq_vaccination_dose'),
+        db.Index('ix_vaccination_dose_patient', 'patient_id', 'administered_at'),
+        db.Index('ix_vaccination_dose_campaign_zone', 'campaign_id', 'zone')
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey(VaccinationCampaign.__table__.c.id), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey(Patient.__table__.c.id), nullable=False)
+    vaccine_name = db.Column(db.String(100), nullable=False)
+    dose_number = db.Column(db.Integer, default=1, nullable=False)
+    batch_number = db.Column(db.String(50))
+    zone = db.Column(db.String(50), nullable=False)
+    ward_number = db.Column(db.Integer)
+    site = db.Column(db.String(200))
+    administered_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    recorded_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'campaign_id': self.campaign_id,
+            'patient_id': self.patient_id,
+            'vaccine_name': self.vaccine_name,
+            'dose_number': self.dose_number,
+            'batch_number': self.batch_number,
+            'zone': self.zone,
+            'ward_number': self.ward_number,
+            'site': self.site,
+            'administered_at': self.administered_at.isoformat() if self.administered_at else None
+        }
+
+
+def campaign_counter(campaign_id):
+    return f'vaccination.campaign.{campaign_id}'
+
+
+def zone_counter(campaign_id, zone):
+    return f'vaccination.campaign.{campaign_id}.zone.{zone}'
+
+
+def dose_counter(campaign_id):
+    return f'vaccination.campaign.{campaign_id}.doses'
+
+
+def campaign_zones(campaign):
+    return json.loads(campaign.zones or '[]')
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_datetime(value):
+    if not value:
+        return datetime.now()
+    return datetime.fromisoformat(value)
+
+
+def _resolve_patients(entries):
+    ids = {_int(e.get('patient_id')) for e in entries} - {None}
+    codes = {e['qr_code'] for e in entries if e.get('qr_code') and not e.get('patient_id')}
+
+    patients = []
+    if ids:
+        patients += Patient.query.filter(Patient.id.in_(ids)).all()
+    if codes:
+        patients += Patient.query.filter(Patient.qr_code.in_(codes)).all()
+    return {p.id: p for p in patients}, {p.qr_code: p for p in patients}
+
+
+def _existing_keys(keys):
+    """(campaign_id, patient_id, dose_number) triples already on record"""
+    existing = set()
+    for campaign_id in {k[0] for k in keys}:
+        patient_ids = {k[1] for k in keys if k[0] == campaign_id}
+        rows = db.session.query(
+            VaccinationDose.patient_id, VaccinationDose.dose_number
+        ).filter(
+            VaccinationDose.campaign_id == campaign_id,
+            VaccinationDose.patient_id.in_(patient_ids)
+        ).all()
+        existing.update((campaign_id, patient_id, dose) for patient_id, dose in rows)
+    return existing
+
+
+def _append_to_patient(patient, dose):
+    records = json.loads(patient.vaccination_records or '[]')
+    records.append({
+        'vaccine': dose.vaccine_name,
+        'dose': dose.dose_number,
+        'date': dose.administered_at.strftime('%Y-%m-%d'),
+        'campaign_id': dose.campaign_id,
+        'zone': dose.zone
+    })
+    patient.vaccination_records = json.dumps(records)
+
+
+def record_doses(entries, recorded_by=None):
+    """Validate and store a batch of doses in one transaction.
+
+    Returns one result per entry in input order: {'status': 'recorded',
+    'dose': ...}, {'status': 'duplicate'} or {'status': 'rejected', 'error': ...}.
+    Bad entries never fail the rest of the batch.
+    """
+    if len(entries) > MAX_BATCH_SIZE:
+        raise DoseRejected(f'At most {MAX_BATCH_SIZE} doses per batch')
+
+    campaign_ids = {_int(e.get('campaign_id')) for e in entries} - {None}
+    campaigns = {c.id: c for c in VaccinationCampaign.query.filter(VaccinationCampaign.id.in_(campaign_ids)).all()}
+    by_id, by_code = _resolve_patients(entries)
+
+    results = [None] * len(entries)
+    accepted = []
+    for i, entry in enumerate(entries):
+        try:
+            campaign = campaigns.get(_int(entry.get('campaign_id')))
+            if not campaign:
+                raise DoseRejected('Unknown campaign')
+            if campaign.status != 'ongoing':
+                raise DoseRejected(f'Campaign is {campaign.status}')
+
+            patient = by_id.get(_int(entry['patient_id'])) if entry.get('patient_id') else by_code.get(entry.get('qr_code'))
+            if not patient:
+                raise DoseRejected('Unknown patient')
+
+            zone = entry.get('zone') or patient.zone
+            if not isinstance(zone, str) or zone not in campaign_zones(campaign):
+                raise DoseRejected(f'{zone} is not covered by this campaign')
+
+            # The patient's own ward only applies when the dose was given in their zone
+            ward_number = entry.get('ward_number')
+            if ward_number is None and zone == patient.zone:
+                ward_number = patient.ward_number
+            if ward_number is not None:
+                ward_number = _int(ward_number)
+                if ward_number is None or ward_number < 1:
+                    raise DoseRejected('ward_number must be a positive whole number')
+
+            dose_number = _int(entry.get('dose_number', 1))
+            if dose_number is None or dose_number < 1:
+                raise DoseRejected('dose_number must be a positive whole number')
+
+            dose = VaccinationDose(
+                campaign_id=campaign.id,
+                patient_id=patient.id,
+                vaccine_name=entry.get('vaccine_name') or campaign.vaccine_name,
+                dose_number=dose_number,
+                batch_number=entry.get('batch_number'),
+                zone=zone,
+                ward_number=ward_number,
+                site=entry.get('site'),
+                administered_at=_parse_datetime(entry.get('administered_at')),
+                recorded_by=recorded_by
+            )
+            accepted.append((i, dose, patient))
+        except (DoseRejected, ValueError, TypeError, KeyError) as e:
+            results[i] = {'status': 'rejected', 'error': str(e)}
+
+    # Retried uploads and repeated rows inside one batch are reported, not re-counted
+    keys = {(d.campaign_id, d.patient_id, d.dose_number) for _, d, _ in accepted}
+    seen = _existing_keys(keys) if keys else set()
+
+    campaign_deltas = Counter()
+    zone_deltas = Counter()
+    dose_deltas = Counter()
+    for i, dose, patient in accepted:
+        key = (dose.campaign_id, dose.patient_id, dose.dose_number)
+        if key in seen:
+            results[i] = {'status': 'duplicate'}
+            continue
+        seen.add(key)
+
+        db.session.add(dose)
+        _append_to_patient(patient, dose)
+        dose_deltas[dose.campaign_id] += 1
+        if dose.dose_number == 1:
+            campaign_deltas[dose.campaign_id] += 1
+            zone_deltas[(dose.campaign_id, dose.zone)] += 1
+        results[i] = {'status': 'recorded', 'dose': dose}
+
+    for campaign_id, delta in campaign_deltas.items():
+        db.session.execute(update(VaccinationCampaign).where(VaccinationCampaign.id == campaign_id).values(
+            vaccinated_count=VaccinationCampaign.vaccinated_count + delta
+        ))
+        increment_counter(campaign_counter(campaign_id), delta)
+    for (campaign_id, zone), delta in zone_deltas.items():
+        increment_counter(zone_counter(campaign_id, zone), delta)
+    for campaign_id, delta in dose_deltas.items():
+        increment_counter(dose_counter(campaign_id), delta)
+
+    db.session.commit()
+
+    for result in results:
+        if result['status'] == 'recorded':
+            result['dose'] = result['dose'].to_dict()
+    return results
+
+
+def coverage(campaign):
+    """Per-zone and overall coverage, read from counters only.
+
+    Each zone's target is an equal share of the campaign's target population.
+    """
+    zones = campaign_zones(campaign)
+    names = [campaign_counter(campaign.id), dose_counter(campaign.id)] + [zone_counter(campaign.id, z) for z in zones]
+    values = get_counters(names)
+
+    zone_target = campaign.target_population / len(zones) if zones and campaign.target_population else 0
+    by_zone = []
+    for zone in zones:
+        vaccinated = values[zone_counter(campaign.id, zone)]
+        by_zone.append({
+            'zone': zone,
+            'vaccinated': vaccinated,
+            'target': round(zone_target),
+            'coverage_percent': round(vaccinated / zone_target * 100, 1) if zone_target else None
+        })
+
+    total = values[campaign_counter(campaign.id)]
+    return {
+        'campaign_id': campaign.id,
+        'campaign_name': campaign.campaign_name,
+        'vaccinated': total,
+        'doses': values[dose_counter(campaign.id)],
+        'target': campaign.target_population,
+        'coverage_percent': round(total / campaign.target_population * 100, 1) if campaign.target_population else None,
+        'zones': by_zone
+    }
+
+
+def rebuild_counters():
+    """Recompute campaign, zone and dose counters from dose rows.
+
+    Tallies recorded on the campaign before per-dose tracking existed are
+    spread evenly over its zones so totals stay in line with vaccinated_count.
+    """
+    first_doses = db.session.query(
+        VaccinationDose.campaign_id, VaccinationDose.zone, db.func.count(VaccinationDose.id)
+    ).filter(VaccinationDose.dose_number == 1).group_by(VaccinationDose.campaign_id, VaccinationDose.zone).all()
+    counted = Counter()
+    for campaign_id, zone, count in first_doses:
+        counted[(campaign_id, zone)] = count
+    doses = dict(db.session.query(
+        VaccinationDose.campaign_id, db.func.count(VaccinationDose.id)
+    ).group_by(VaccinationDose.campaign_id).all())
+
+    for campaign in VaccinationCampaign.query.all():
+        zones = campaign_zones(campaign)
+        people = sum(counted[(campaign.id, z)] for z in zones)
+        legacy = max((campaign.vaccinated_count or 0) - people, 0)
+
+        for n, zone in enumerate(zones):
+            share = legacy // len(zones) + (1 if n < legacy % len(zones) else 0)
+            set_counter(zone_counter(campaign.id, zone), counted[(campaign.id, zone)] + share)
+        set_counter(campaign_counter(campaign.id), people + legacy)
+        set_counter(dose_counter(campaign.id), doses.get(campaign.id, 0) + legacy)
+
+    db.session.commit()
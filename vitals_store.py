@@ -0,0 +1,338 @@
+"""
+SAKSHI Vitals Store
+Columnar per-patient vitals history: one row per patient holding packed
+arrays of reading times and values (temperature, systolic, diastolic, pulse,
+SpO2), so a trend chart reads one row instead of every visit
+
+Readings are merged in from medical records and standalone vitals readings
+via the change log. Archived visits keep their readings here, so deletes
+are not applied. A nightly job
+stacks recent readings of the whole population into matrices and flags
+abnormal trends, such as falling SpO2, with numpy.
+
+    flask refresh-vitals              # every few minutes from cron
+    flask flag-vitals-trends          # nightly
+"""
+
+from models import db, MedicalRecord
+from changelog import consume
+from encounters import VitalsReading, parse_blood_pressure
+from datetime import date, datetime, timedelta
+import numpy as np
+
+CONSUMER = 'vitals-store'
+
+CHANNELS = ('temperature', 'systolic', 'diastolic', 'pulse_rate', 'oxygen_saturation')
+
+EPOCH = datetime(1970, 1, 1)
+
+# Stored little-endian so the blobs read the same on any host
+_TIME = np.dtype('<i8')
+_VALUE = np.dtype('<f4')
+
+MERGE_CHUNK = 500
+
+# Tables readings are merged from
+SOURCES = {model.__tablename__: model for model in (MedicalRecord, VitalsReading)}
+
+# Trend detection looks at each patient's last readings inside the lookback
+TREND_READINGS = 6
+TREND_LOOKBACK_DAYS = 90
+TREND_CHUNK = 5000
+MIN_TREND_READINGS = 3
+
+# (flag, channel, direction, fitted change across the window, latest value bound)
+# direction -1: fell by at least the change and the latest is below the bound; +1: rose and is at or above it
+TREND_RULES = (
+    ('falling_spo2', 'oxygen_saturation', -1, 3.0, 95.0),
+    ('rising_blood_pressure', 'systolic', 1, 15.0, 140.0),
+    ('rising_temperature', 'temperature', 1, 1.5, 100.4),
+    ('rising_pulse', 'pulse_rate', 1, 20.0, 100.0)
+)
+
+
+class PatientVitals(db.Model):
+    __tablename__ = 'patient_vitals'
+
+    patient_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    readings = db.Column(db.Integer, default=0, nullable=False)
+    record_ids = db.Column(db.LargeBinary, nullable=False)  # standalone readings are stored as -reading id
+    taken_at = db.Column(db.LargeBinary, nullable=False)  # epoch seconds of each visit
+    temperature = db.Column(db.LargeBinary, nullable=False)  # NaN where not measured
+    systolic = db.Column(db.LargeBinary, nullable=False)
+    diastolic = db.Column(db.LargeBinary, nullable=False)
+    pulse_rate = db.Column(db.LargeBinary, nullable=False)
+    oxygen_saturation = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class VitalsTrendFlag(db.Model):
+    __tablename__ = 'vitals_trend_flag'
+    __table_args__ = (db.Index('ix_vitals_trend_flag_day_patient', 'flagged_on', 'patient_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    flagged_on = db.Column(db.Date, nullable=False)
+    patient_id = db.Column(db.Integer, nullable=False)
+    flag = db.Column(db.String(30), nullable=False)
+    channel = db.Column(db.String(20), nullable=False)
+    latest = db.Column(db.Float, nullable=False)
+    change = db.Column(db.Float, nullable=False)
+    readings = db.Column(db.Integer, nullable=False)
+
+
+def _epoch(when):
+    return int((when - EPOCH).total_seconds())
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _series_id(item):
+    """Record id, or negated reading id, so the two sources never collide in one series"""
+    return -item.id if isinstance(item, VitalsReading) else item.id
+
+
+def _taken_at(item):
+    return item.taken_at if isinstance(item, VitalsReading) else item.visit_date
+
+
+def _reading(record):
+    """One record's vitals in CHANNELS order, NaN where missing"""
+    pressure = parse_blood_pressure(record.blood_pressure if isinstance(record.blood_pressure, str) else None)
+    systolic, diastolic = pressure if pressure else (np.nan, np.nan)
+    return (_number(record.temperature), systolic, diastolic,
+            _number(record.pulse_rate), _number(record.oxygen_saturation))
+
+
+def decode(row):
+    """(record ids, times, {channel: values}) as numpy arrays"""
+    values = {c: np.frombuffer(getattr(row, c), dtype=_VALUE) for c in CHANNELS}
+    return np.frombuffer(row.record_ids, dtype=_TIME), np.frombuffer(row.taken_at, dtype=_TIME), values
+
+
+def _encode(row, ids, times, values):
+    row.readings = len(ids)
+    row.record_ids = ids.astype(_TIME).tobytes()
+    row.taken_at = times.astype(_TIME).tobytes()
+    for channel in CHANNELS:
+        setattr(row, channel, values[channel].astype(_VALUE).tobytes())
+
+
+def merge_records(records):
+    """Upsert medical records' or vitals readings' values into their patients' series, in the caller's transaction"""
+    by_patient = {}
+    for record in records:
+        if _taken_at(record) is not None:
+            by_patient.setdefault(record.patient_id, []).append(record)
+
+    rows = {r.patient_id: r for r in PatientVitals.query.filter(PatientVitals.patient_id.in_(list(by_patient)))}
+    for patient_id, patient_records in by_patient.items():
+        new_ids = np.array([_series_id(r) for r in patient_records], dtype=_TIME)
+        new_times = np.array([_epoch(_taken_at(r)) for r in patient_records], dtype=_TIME)
+        new_values = np.array([_reading(r) for r in patient_records], dtype=_VALUE).reshape(-1, len(CHANNELS))
+
+        # Visits without any vitals (or edited to have none) carry no reading
+        measured = ~np.isnan(new_values).all(axis=1)
+
+        row = rows.get(patient_id)
+        if row is None:
+            row = PatientVitals(patient_id=patient_id)
+            db.session.add(row)
+            ids, times = np.empty(0, _TIME), np.empty(0, _TIME)
+            values = {c: np.empty(0, _VALUE) for c in CHANNELS}
+        else:
+            ids, times, values = decode(row)
+
+        keep = ~np.isin(ids, new_ids)
+        ids = np.concatenate([ids[keep], new_ids[measured]])
+        times = np.concatenate([times[keep], new_times[measured]])
+        values = {c: np.concatenate([values[c][keep], new_values[measured, i]]) for i, c in enumerate(CHANNELS)}
+
+        order = np.lexsort((ids, times))
+        _encode(row, ids[order], times[order], {c: v[order] for c, v in values.items()})
+
+
+def _merge_ids(model, row_ids):
+    row_ids = sorted(row_ids)
+    for start in range(0, len(row_ids), MERGE_CHUNK):
+        merge_records(model.query.filter(model.id.in_(row_ids[start:start + MERGE_CHUNK])).all())
+
+
+def merge_all():
+    """Merge every hot medical record and vitals reading, a chunk of patients per commit; returns patients touched"""
+    patient_ids = sorted({p for model in SOURCES for (p,) in db.session.query(model.patient_id).distinct()})
+    for start in range(0, len(patient_ids), MERGE_CHUNK):
+        chunk = patient_ids[start:start + MERGE_CHUNK]
+        merge_records([item for model in SOURCES for item in model.query.filter(model.patient_id.in_(chunk)).all()])
+        db.session.commit()
+    return len(patient_ids)
+
+
+def _merge_batch(changes):
+    # Bulk inserts and updates don't say which rows they hit; merging everything is idempotent
+    writes = [c for c in changes if not c.op.endswith('delete')]
+    if any(c.row_key is None for c in writes):
+        merge_all()
+        return
+    for table, model in SOURCES.items():
+        _merge_ids(model, {int(c.row_key) for c in writes if c.table_name == table})
+
+
+def refresh(full=False):
+    """Bring the store up to date with medical record and vitals reading changes since the last run"""
+    tables = list(SOURCES)
+    if full:
+        # Move the cursor first, so records written during the merge are picked up next run
+        consume(CONSUMER, lambda changes: None, tables=tables)
+        merge_all()
+    else:
+        consume(CONSUMER, _merge_batch, tables=tables, limit=MERGE_CHUNK)
+    db.session.commit()
+
+
+def series(patient_id, start=None, end=None, points=200):
+    """A patient's vitals in [start, end] as columns, averaged into at most `points` time buckets"""
+    row = PatientVitals.query.get(patient_id)
+    result = {'patient_id': patient_id, 'channels': list(CHANNELS), 'downsampled': False, 'timestamps': []}
+    result.update({c: [] for c in CHANNELS})
+    if row is None or not row.readings:
+        return result
+
+    _, times, values = decode(row)
+    window = np.ones(len(times), dtype=bool)
+    if start is not None:
+        window &= times >= _epoch(start)
+    if end is not None:
+        window &= times < _epoch(end)
+    times = times[window]
+    values = {c: v[window] for c, v in values.items()}
+
+    if len(times) > points:
+        edges = np.linspace(times[0], times[-1], points + 1)
+        bucket = np.clip(np.searchsorted(edges, times, side='right') - 1, 0, points - 1)
+        occupied = np.bincount(bucket, minlength=points) > 0
+        times = (np.bincount(bucket, weights=times, minlength=points) / np.maximum(np.bincount(bucket, minlength=points), 1))[occupied]
+        for channel, v in values.items():
+            present = ~np.isnan(v)
+            sums = np.bincount(bucket, weights=np.where(present, v, 0), minlength=points)
+            counts = np.bincount(bucket, weights=present, minlength=points)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values[channel] = (sums / counts)[occupied]
+        result['downsampled'] = True
+
+    result['timestamps'] = [int(t) for t in times]
+    for channel, v in values.items():
+        result[channel] = [None if np.isnan(x) else round(float(x), 1) for x in v]
+    return result
+
+
+def _recent_matrix(rows, now):
+    """Last TREND_READINGS readings per patient inside the lookback, right-aligned and NaN padded.
+
+    Returns patient ids, days-before-now (P x W) and {channel: values (P x W)}.
+    """
+    since = _epoch(now - timedelta(days=TREND_LOOKBACK_DAYS))
+    now_seconds = _epoch(now)
+    width = TREND_READINGS
+
+    patient_ids = np.array([row.patient_id for row in rows], dtype=_TIME)
+    days = np.full((len(rows), width), np.nan)
+    matrix = {c: np.full((len(rows), width), np.nan, dtype=np.float64) for c in CHANNELS}
+    for i, row in enumerate(rows):
+        _, times, values = decode(row)
+        recent = np.flatnonzero(times >= since)[-width:]
+        if not len(recent):
+            continue
+        days[i, width - len(recent):] = (times[recent] - now_seconds) / 86400.0
+        for channel in CHANNELS:
+            matrix[channel][i, width - len(recent):] = values[channel][recent]
+    return patient_ids, days, matrix
+
+
+def _trend(days, values):
+    """Per-row least-squares fit over the valid cells: (readings, fitted change across the window, latest)"""
+    valid = ~np.isnan(values) & ~np.isnan(days)
+    readings = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(valid, days, 0)
+        v = np.where(valid, values, 0)
+        t_mean = t.sum(axis=1) / readings
+        v_mean = v.sum(axis=1) / readings
+        dt = np.where(valid, days - t_mean[:, None], 0)
+        dv = np.where(valid, values - v_mean[:, None], 0)
+        slope = (dt * dv).sum(axis=1) / (dt * dt).sum(axis=1)
+        span = np.where(valid, days, -np.inf).max(axis=1) - np.where(valid, days, np.inf).min(axis=1)
+
+    last = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    latest = np.where(readings > 0, values[np.arange(len(values)), last], np.nan)
+    return readings, slope * span, latest
+
+
+def flag_trends(now=None):
+    """Recompute today's trend flags for every patient; returns how many were raised"""
+    now = now or datetime.now()
+    today = now.date()
+    db.session.execute(VitalsTrendFlag.__table__.delete().where(VitalsTrendFlag.flagged_on == today))
+
+    raised, last_id = 0, 0
+    while True:
+        rows = PatientVitals.query.filter(PatientVitals.patient_id > last_id).order_by(
+            PatientVitals.patient_id
+        ).limit(TREND_CHUNK).all()
+        if not rows:
+            break
+        last_id = rows[-1].patient_id
+
+        patient_ids, days, matrix = _recent_matrix(rows, now)
+        flags = []
+        for flag, channel, direction, change, bound in TREND_RULES:
+            readings, fitted, latest = _trend(days, matrix[channel])
+            with np.errstate(invalid='ignore'):
+                if direction < 0:
+                    hit = (fitted <= -change) & (latest < bound)
+                else:
+                    hit = (fitted >= change) & (latest >= bound)
+            hit &= readings >= MIN_TREND_READINGS
+            for i in np.flatnonzero(hit):
+                flags.append({
+                    'flagged_on': today,
+                    'patient_id': int(patient_ids[i]),
+                    'flag': flag,
+                    'channel': channel,
+                    'latest': round(float(latest[i]), 1),
+                    'change': round(float(fitted[i]), 1),
+                    'readings': int(readings[i])
+                })
+
+        if flags:
+            db.session.execute(VitalsTrendFlag.__table__.insert(), flags)
+        raised += len(flags)
+        db.session.expunge_all()
+
+    db.session.commit()
+    return raised
+
+
+def latest_flags(patient_ids=None, day=None):
+    """Flags from the given day (default the latest nightly run), optionally for some patients only"""
+    day = day or db.session.query(db.func.max(VitalsTrendFlag.flagged_on)).scalar()
+    if day is None:
+        return {'flagged_on': None, 'flags': []}
+    query = VitalsTrendFlag.query.filter(VitalsTrendFlag.flagged_on == day)
+    if patient_ids is not None:
+        query = query.filter(VitalsTrendFlag.patient_id.in_(patient_ids))
+    return {
+        'flagged_on': day.isoformat() if isinstance(day, date) else day,
+        'flags': [{
+            'patient_id': f.patient_id,
+            'flag': f.flag,
+            'channel': f.channel,
+            'latest': f.latest,
+            'change': f.change,
+            'readings': f.readings
+        } for f in query.order_by(VitalsTrendFlag.patient_id, VitalsTrendFlag.flag)]
+    }
@@ -0,0 +1,32 @@
+"""
+SAKSHI WSGI Entry Point
+Production factory for multi-worker servers
+
+    gunicorn -c gunicorn.conf.py 'wsgi:create_app()'
+
+Every worker calls create_app(); schema creation and seeding run under an
+exclusive file lock, so only the first worker does the work and the rest
+take the schema-version fast path once it is released.
+"""
+
+from app import app, init_db, warm_templates
+import fcntl
+import os
+
+INIT_LOCK_PATH = os.environ.get('INIT_LOCK_PATH', os.path.join(app.instance_path, 'init.lock'))
+
+
+def initialize():
+    os.makedirs(os.path.dirname(INIT_LOCK_PATH), exist_ok=True)
+    with open(INIT_LOCK_PATH, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            init_db()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    warm_templates()
+
+
+def create_app():
+    initialize()
+    return app